@@ -1,33 +1,113 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash
+from flask import Flask, Request, render_template, request, jsonify, send_file, redirect, url_for, flash, session
 from werkzeug.utils import secure_filename
 import os
+import hmac
 import tempfile
 import shutil
 import zipfile
+import time
+import uuid
 from datetime import datetime
 from openrouter_client import OpenRouterClient
 from generate_files import FileGenerator
+from template_warmer import TemplateWarmer
+from context_packer import ProjectIndex
+from upload_workspace import ZipWorkspace, CappedFile, UploadError
+from model_router import ModelRouter, AUTO_MODEL
+from fair_scheduler import FairScheduler, QueueFullError, key_fingerprint
+from project_registry import ProjectRegistry
+from blob_store import BlobStore
+from search_index import SearchIndex
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
 
+# HTTP transport for OpenRouterClient (None = default). The load-test harness
+# swaps in a stub so only our own overhead is measured.
+app.config.setdefault('OPENROUTER_TRANSPORT', None)
+
+# "markdown" (code blocks) or "json" (structured file manifest); a form field can override it
+app.config.setdefault('OUTPUT_FORMAT', os.getenv('OUTPUT_FORMAT', 'markdown'))
+
+# Parse generated files and send targeted repair requests for any that fail
+app.config.setdefault('VALIDATE_GENERATED', os.getenv('VALIDATE_GENERATED', '1').lower() not in ('0', 'false', 'no'))
+
+# Hardlink identical files across projects to one content-addressed blob
+app.config.setdefault('DEDUPLICATE_FILES', os.getenv('DEDUPLICATE_FILES', '1').lower() not in ('0', 'false', 'no'))
+
+# Lets instructors search every session's projects by sending it in an
+# X-Search-Token header; unset, /search only covers the caller's own projects
+app.config.setdefault('SEARCH_ADMIN_TOKEN', os.getenv('SEARCH_ADMIN_TOKEN', ''))
+
 # Configuration
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'generated_projects')
 ALLOWED_EXTENSIONS = {'zip'}
 
+# Upload limits, checked while streaming and against the zip central directory
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(50 * 1024 * 1024)))
+MAX_ZIP_ENTRIES = int(os.getenv('MAX_ZIP_ENTRIES', '2000'))
+MAX_UNCOMPRESSED_SIZE = int(os.getenv('MAX_UNCOMPRESSED_SIZE', str(200 * 1024 * 1024)))
+
 # Ensure directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Available models with descriptions
+# Sessions -> projects -> file manifests, shared by every worker process
+project_registry = ProjectRegistry(os.getenv('PROJECT_REGISTRY', os.path.join(OUTPUT_FOLDER, 'registry.sqlite3')))
+
+# Full-text index over generated projects, kept current as files are written.
+# Rebuild from disk with `python search_index.py rebuild generated_projects`.
+search_index = SearchIndex(os.getenv('SEARCH_INDEX', os.path.join(OUTPUT_FOLDER, 'search.sqlite3')))
+
+def index_written_files(output_dir, files):
+    output_dir = os.path.abspath(output_dir)
+    if os.path.dirname(output_dir) == os.path.abspath(OUTPUT_FOLDER):
+        search_index.index_files(os.path.basename(output_dir), output_dir, files)
+
+FileGenerator.add_write_listener(index_written_files)
+
+# Content-addressed store the project directories are deduplicated into.
+# Collect unused blobs with `python blob_store.py gc generated_projects`.
+blob_store = BlobStore(os.getenv('BLOB_STORE', os.path.join(OUTPUT_FOLDER, 'blobs')))
+
+def deduplicate_project(project_dir):
+    if not app.config['DEDUPLICATE_FILES']:
+        return
+    try:
+        blob_store.add_project(os.path.basename(project_dir), project_dir)
+    except Exception as e:
+        print(f"Warning: Failed to deduplicate {project_dir}: {e}")
+
+# Available models with descriptions. "tier" ranks capability (higher is more
+# capable) and "max_concurrency" caps in-flight requests when routing "auto".
 MODELS = [
-    {"id": "openai/gpt-4", "name": "GPT-4 (Most Capable)"},
-    {"id": "mistralai/mixtral-8x7b-instruct", "name": "Mixtral (Fast & Free)"},
-    {"id": "google/gemini-pro", "name": "Gemini Pro (Good Balance)"},
-    {"id": "anthropic/claude-2", "name": "Claude 2 (Helpful & Detailed)"}
+    {"id": "openai/gpt-4", "name": "GPT-4 (Most Capable)", "tier": 3, "max_concurrency": 8},
+    {"id": "mistralai/mixtral-8x7b-instruct", "name": "Mixtral (Fast & Free)", "tier": 1, "max_concurrency": 16},
+    {"id": "google/gemini-pro", "name": "Gemini Pro (Good Balance)", "tier": 2, "max_concurrency": 12},
+    {"id": "anthropic/claude-2", "name": "Claude 2 (Helpful & Detailed)", "tier": 3, "max_concurrency": 8},
+    {"id": AUTO_MODEL, "name": "Auto (Fastest model for the chosen tier)"}
 ]
 
+# Learns per-model latency from our own traffic and resolves the "auto" model
+model_router = ModelRouter([m for m in MODELS if m['id'] != AUTO_MODEL])
+
+# Models to fail over to, in order, when a model errors or its circuit is open
+FALLBACK_CHAINS = {
+    "openai/gpt-4": ["google/gemini-pro", "mistralai/mixtral-8x7b-instruct"],
+    "anthropic/claude-2": ["openai/gpt-4", "google/gemini-pro"],
+    "google/gemini-pro": ["mistralai/mixtral-8x7b-instruct"],
+    "mistralai/mixtral-8x7b-instruct": ["google/gemini-pro"]
+}
+
+# Fair-share admission for generations: per-API-key in-flight limit, per-key
+# queues served round-robin, and a 429 once a key's queue is full
+generation_scheduler = FairScheduler(
+    per_key_limit=int(os.getenv('GENERATION_PER_KEY_LIMIT', '2')),
+    global_limit=int(os.getenv('GENERATION_GLOBAL_LIMIT', '8')),
+    max_queue_per_key=int(os.getenv('GENERATION_MAX_QUEUE', '4'))
+)
+
 # Common backend project templates
 BACKEND_TEMPLATES = [
     {
@@ -64,9 +144,43 @@ RESOURCES = [
     {"title": "Web Security Fundamentals", "url": "https://owasp.org/www-project-top-ten/", "category": "Security"}
 ]
 
+# Optional background pre-warming of template generations. Uses the server's own
+# OPENROUTER_API_KEY, so it is off unless explicitly enabled.
+template_warmer = None
+if os.getenv('PREWARM_TEMPLATES', '').lower() in ('1', 'true', 'yes') and os.getenv('OPENROUTER_API_KEY'):
+    template_warmer = TemplateWarmer(
+        templates=BACKEND_TEMPLATES,
+        models=[m['id'] for m in MODELS if m['id'] != AUTO_MODEL],
+        client_factory=OpenRouterClient,
+        budget=int(os.getenv('PREWARM_BUDGET', '8')),
+        refresh_interval=float(os.getenv('PREWARM_INTERVAL', str(6 * 3600)))
+    )
+    template_warmer.start()
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+class StreamingUploadRequest(Request):
+    """Write /upload's multipart file parts straight to UPLOAD_FOLDER instead of memory/spooled temp files"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.endpoint != 'upload':
+            # Other routes take no uploads; keep Werkzeug's default handling there
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        fd, path = tempfile.mkstemp(suffix='.part', dir=UPLOAD_FOLDER)
+        os.close(fd)
+        part = CappedFile(path, MAX_UPLOAD_SIZE)
+        self.upload_parts = getattr(self, 'upload_parts', []) + [part]
+        return part
+
+app.request_class = StreamingUploadRequest
+
+@app.teardown_request
+def discard_upload_parts(exc=None):
+    """Remove spooled parts that were not moved into a workspace, however the request ended"""
+    for part in getattr(request, 'upload_parts', []):
+        part.discard()
+
 def create_zip(source_folder, output_filename):
     """Create a zip file from a folder"""
     with zipfile.ZipFile(output_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -107,12 +221,19 @@ def index():
         model = request.form.get('model', MODELS[0]['id'])
         api_key = request.form.get('api_key', '').strip()
         template_id = request.form.get('template', '')
+        routing = {'min_tier': request.form.get('tier', 1, type=int)} if model == AUTO_MODEL else {}
+        output_format = request.form.get('output_format', app.config['OUTPUT_FORMAT'])
+        if output_format not in ('markdown', 'json'):
+            output_format = 'markdown'
         
         # If a template was selected, use its prompt
+        warm_files = None
         if template_id and template_id != 'custom':
             template = next((t for t in BACKEND_TEMPLATES if t['id'] == template_id), None)
             if template:
                 prompt = template['prompt']
+                if template_warmer:
+                    warm_files = template_warmer.get(template_id, model)
                 
         # If no prompt and no template, show error
         if not prompt:
@@ -128,37 +249,66 @@ def index():
             flash('Please enter a prompt', 'error')
             return redirect(url_for('index'))
         
-        if not api_key:
+        if not api_key and not warm_files:
             flash('Please enter your OpenRouter API key', 'error')
             return redirect(url_for('index'))
         
-        # Create a temporary directory for the project
+        # Create a temporary directory for the project. The random suffix keeps
+        # concurrent generations in the same second from sharing a directory.
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        project_dir = os.path.join(OUTPUT_FOLDER, f'project_{timestamp}')
+        project_name = f'project_{timestamp}_{uuid.uuid4().hex[:8]}'
+        project_dir = os.path.join(OUTPUT_FOLDER, project_name)
         os.makedirs(project_dir, exist_ok=True)
+        registered = False
         
         try:
-            # Initialize client and generate files
-            client = OpenRouterClient(api_key)
-            file_generator = FileGenerator()
-            
-            # Generate files
-            generated_files = file_generator.generate_from_prompt(
-                prompt=prompt,
-                output_dir=project_dir,
-                client=client
-            )
+            if warm_files:
+                # Serve a pre-generated template straight from the warm pool
+                generated_files = FileGenerator.write_files(
+                    files=warm_files,
+                    output_dir=project_dir,
+                    overwrite=True
+                )
+            else:
+                # Initialize client and generate files
+                client = OpenRouterClient(
+                    api_key,
+                    router=model_router,
+                    fallbacks=FALLBACK_CHAINS,
+                    transport=app.config['OPENROUTER_TRANSPORT']
+                )
+                file_generator = FileGenerator()
+                
+                # Generate files
+                with generation_scheduler.slot(key_fingerprint(api_key)):
+                    result = file_generator.generate_from_prompt(
+                        prompt=prompt,
+                        output_dir=project_dir,
+                        client=client,
+                        model=model,
+                        output_format=output_format,
+                        validate=app.config['VALIDATE_GENERATED'],
+                        **routing
+                    )
+                if not result.get('success'):
+                    raise Exception(result.get('error', 'Generation failed'))
+                generated_files = result['files']
             
             if not generated_files:
+                shutil.rmtree(project_dir, ignore_errors=True)
                 flash('No files were generated', 'error')
                 return redirect(url_for('index'))
             
             # Create a zip file of the project
-            zip_filename = os.path.join(OUTPUT_FOLDER, f'project_{timestamp}.zip')
+            zip_filename = os.path.join(OUTPUT_FOLDER, f'{project_name}.zip')
             create_zip(project_dir, zip_filename)
             
-            # Store the zip filename in the session
-            session['download_file'] = os.path.basename(zip_filename)
+            # The cookie only carries an opaque session id; the project lives in the registry
+            session_id = session.setdefault('session_id', uuid.uuid4().hex)
+            project_registry.register(session_id, project_name, project_dir, generated_files, zip_filename)
+            registered = True
+            # After zipping, so the archive does not record the blobs' read-only mode
+            deduplicate_project(project_dir)
             
             # Get the first file's content for preview
             preview_file = generated_files[0]
@@ -170,28 +320,52 @@ def index():
                                  preview_filename=os.path.basename(preview_file),
                                  file_count=len(generated_files))
             
+        except QueueFullError as e:
+            shutil.rmtree(project_dir, ignore_errors=True)
+            flash(f'{e}. Your request would be #{e.position} in the queue; please retry shortly.', 'error')
+            page = render_template('index.html', models=MODELS, default_model=MODELS[0])
+            return page, 429, {'Retry-After': str(e.retry_after)}
+        except TimeoutError:
+            # Waited the whole scheduler timeout without getting a slot
+            shutil.rmtree(project_dir, ignore_errors=True)
+            flash('The server is busy; please retry shortly.', 'error')
+            page = render_template('index.html', models=MODELS, default_model=MODELS[0])
+            return page, 503, {'Retry-After': '30'}
         except Exception as e:
+            if not registered:
+                shutil.rmtree(project_dir, ignore_errors=True)
             flash(f'Error generating code: {str(e)}', 'error')
             return redirect(url_for('index'))
     
     # GET request - show the form
     return render_template('index.html', models=MODELS, default_model=MODELS[0])
 
+def current_project():
+    """The latest project registered for this browser session, or None"""
+    session_id = session.get('session_id')
+    return project_registry.latest(session_id) if session_id else None
+
+def session_project(project_id):
+    """A project registered for this browser session, or None (also for other sessions' projects)"""
+    session_id = session.get('session_id')
+    project = project_registry.get(project_id) if session_id else None
+    return project if project and project['session_id'] == session_id else None
+
 @app.route('/download')
-def download():
-    """Download the generated project zip file"""
-    if 'download_file' not in session:
+@app.route('/download/<project_id>')
+def download(project_id=None):
+    """Download a generated project zip file (by default the latest one)"""
+    project = current_project() if project_id is None else session_project(project_id)
+    if not project or not project['zip_path']:
         flash('No file to download', 'error')
         return redirect(url_for('index'))
     
-    zip_filename = os.path.join(OUTPUT_FOLDER, session['download_file'])
-    
-    if not os.path.exists(zip_filename):
+    if not os.path.exists(project['zip_path']):
         flash('File not found', 'error')
         return redirect(url_for('index'))
     
     return send_file(
-        zip_filename,
+        project['zip_path'],
         as_attachment=True,
         download_name=f"generated_project_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
     )
@@ -199,31 +373,196 @@ def download():
 @app.route('/preview/<path:filename>')
 def preview_file(filename):
     """Preview a specific file from the generated project"""
-    if 'download_file' not in session:
+    project = current_project()
+    if not project:
         return "No project available", 404
     
-    # Get the project directory from the zip filename
-    project_zip = os.path.join(OUTPUT_FOLDER, session['download_file'])
-    project_dir = os.path.splitext(project_zip)[0]
-    
-    # Build the full path to the requested file
-    filepath = os.path.join(project_dir, filename)
-    
-    # Check if the file exists and is within the project directory
-    if not os.path.exists(filepath) or not os.path.abspath(filepath).startswith(os.path.abspath(project_dir)):
+    # Only files in the project's manifest can be previewed, which also rules out path traversal
+    if not project_registry.get_file(project['id'], filename):
         return "File not found", 404
     
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
+        with open(os.path.join(project['project_dir'], filename), 'r', encoding='utf-8') as f:
             content = f.read()
         
         return render_template('preview.html', 
                              filename=filename, 
                              content=content,
-                             file_count=0)  # We don't have the file count here
+                             file_count=project['file_count'])
+    except FileNotFoundError:
+        return "File not found", 404
     except UnicodeDecodeError:
         return "Cannot preview binary file", 400
 
+@app.route('/upload', methods=['POST'])
+def upload():
+    """Upload an existing project as a zip for refinement
+    
+    Accepts either a multipart form with a 'file' field or a raw
+    application/zip body. The archive is streamed to disk in chunks and only
+    its central directory is read; entries are extracted on demand later.
+    """
+    if request.content_length and request.content_length > MAX_UPLOAD_SIZE:
+        return jsonify({"error": f"Upload exceeds the size limit ({MAX_UPLOAD_SIZE} bytes)"}), 413
+    
+    limits = {
+        "max_size": MAX_UPLOAD_SIZE,
+        "max_entries": MAX_ZIP_ENTRIES,
+        "max_uncompressed_size": MAX_UNCOMPRESSED_SIZE
+    }
+    
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload_file = request.files.get('file')
+            if not upload_file or not upload_file.filename:
+                return jsonify({"error": "No file uploaded"}), 400
+            if not allowed_file(secure_filename(upload_file.filename)):
+                return jsonify({"error": "Only .zip uploads are supported"}), 400
+            upload_file.stream.close()
+            workspace = ZipWorkspace.create(UPLOAD_FOLDER, upload_file.stream.name, **limits)
+        elif request.mimetype in ('application/zip', 'application/octet-stream'):
+            workspace = ZipWorkspace.create(UPLOAD_FOLDER, request.stream, **limits)
+        else:
+            return jsonify({"error": "Expected multipart/form-data or application/zip"}), 415
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    
+    files = workspace.list_files()
+    return jsonify({
+        "project_id": workspace.project_id,
+        "file_count": len(files),
+        "total_size": sum(size for _, size in files)
+    }), 201
+
+@app.route('/refine/<project_id>', methods=['POST'])
+def refine(project_id):
+    """Apply a change request to an uploaded project, sending only the relevant files upstream"""
+    prompt = request.form.get('prompt', '').strip()
+    model = request.form.get('model', MODELS[0]['id'])
+    api_key = request.form.get('api_key', '').strip()
+    routing = {'min_tier': request.form.get('tier', 1, type=int)} if model == AUTO_MODEL else {}
+    
+    if not prompt or not api_key:
+        return jsonify({"error": "prompt and api_key are required"}), 400
+    
+    try:
+        workspace = ZipWorkspace(UPLOAD_FOLDER, project_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    project_dir = os.path.join(OUTPUT_FOLDER, f'project_{timestamp}_{uuid.uuid4().hex[:8]}')
+    
+    try:
+        with generation_scheduler.slot(key_fingerprint(api_key)):
+            result = FileGenerator.refine_from_prompt(
+                prompt=prompt,
+                output_dir=project_dir,
+                client=OpenRouterClient(
+                    api_key,
+                    router=model_router,
+                    fallbacks=FALLBACK_CHAINS,
+                    transport=app.config['OPENROUTER_TRANSPORT']
+                ),
+                index=ProjectIndex.from_workspace(workspace),
+                validate=app.config['VALIDATE_GENERATED'],
+                model=model,
+                **routing
+            )
+    except QueueFullError as e:
+        return jsonify({"error": str(e), "queue_position": e.position}), 429, {'Retry-After': str(e.retry_after)}
+    except TimeoutError:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        return jsonify({"error": "Timed out waiting for a generation slot"}), 503, {'Retry-After': '30'}
+    except Exception as e:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        app.logger.error(f"Error refining project: {str(e)}")
+        return jsonify({"error": str(e)}), 502
+    
+    if not result['success']:
+        shutil.rmtree(project_dir, ignore_errors=True)
+        return jsonify({"success": False, "error": result['error']}), 500
+    
+    # The refined project is the upload with the changed files replaced
+    def relpath(path):
+        return os.path.relpath(path, project_dir).replace(os.sep, '/')
+    changed = sorted(relpath(path) for path in result['files'])
+    copied = workspace.copy_to(project_dir, skip=changed)
+    index_written_files(project_dir, {
+        path: text for path, text in workspace.iter_text_files() if path not in changed
+    })
+    files = sorted(result['files'] + [str(path) for path in copied])
+    
+    project_name = os.path.basename(project_dir)
+    zip_filename = os.path.join(OUTPUT_FOLDER, f'{project_name}.zip')
+    create_zip(project_dir, zip_filename)
+    session_id = session.setdefault('session_id', uuid.uuid4().hex)
+    project_registry.register(session_id, project_name, project_dir, files, zip_filename)
+    deduplicate_project(project_dir)
+    
+    # Only project-relative paths leave the server
+    metadata = {key: result['metadata'][key] for key in
+                ('mode', 'indexed_files', 'context_files', 'context_tokens', 'file_count')}
+    validation = result['metadata'].get('validation')
+    if validation:
+        metadata['validation'] = dict(
+            validation,
+            invalid={relpath(path): error for path, error in validation['invalid'].items()},
+            repaired=[relpath(path) for path in validation['repaired']],
+            errors={relpath(path): error for path, error in validation['errors'].items()}
+        )
+    return jsonify({
+        "success": True,
+        "project_id": project_name,
+        "files": [relpath(path) for path in files],
+        "changed_files": changed,
+        "download_url": url_for('download', project_id=project_name),
+        "metadata": metadata
+    }), 200
+
+@app.route('/search')
+def search():
+    """Find generated projects and files matching a free-text query
+    
+    Only the caller's own projects are searched, unless the request carries
+    the configured SEARCH_ADMIN_TOKEN.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "q is required"}), 400
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    admin_token = app.config['SEARCH_ADMIN_TOKEN']
+    if admin_token and hmac.compare_digest(request.headers.get('X-Search-Token', '').encode(), admin_token.encode()):
+        project_ids = None
+    else:
+        session_id = session.get('session_id')
+        project_ids = project_registry.project_ids(session_id) if session_id else []
+    
+    start = time.perf_counter()
+    results = search_index.search(query, limit=limit, project_ids=project_ids) if project_ids != [] else []
+    return jsonify({
+        "query": query,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2)
+    })
+
+@app.route('/stats')
+def stats():
+    """Expose generation performance counters"""
+    return jsonify({
+        "single_flight": OpenRouterClient.coalescing_stats(),
+        "model_router": model_router.stats(),
+        "circuit_breakers": OpenRouterClient.circuit_stats(),
+        "prompt_cache": OpenRouterClient.prompt_cache_stats(),
+        "structured_output": FileGenerator.manifest_stats(),
+        "template_warmer": template_warmer.stats() if template_warmer else None,
+        "scheduler": generation_scheduler.stats(),
+        "project_registry": project_registry.stats(),
+        "search_index": search_index.stats(),
+        "blob_store": blob_store.stats()
+    })
+
 # Create templates directory if it doesn't exist
 templates_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
 os.makedirs(templates_dir, exist_ok=True)
@@ -0,0 +1,269 @@
+"""
+Content-addressed storage for generated project files
+
+Usage:
+    python blob_store.py import [output_dir] [--store path]
+    python blob_store.py gc [output_dir] [--store path] [--dry-run]
+    python blob_store.py stats [output_dir] [--store path]
+"""
+import os
+import sys
+import stat
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from context_packer import SKIP_DIRS
+from project_registry import file_sha256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS refs (
+    project_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES blobs (digest),
+    PRIMARY KEY (project_id, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_by_digest ON refs (digest);
+"""
+
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+
+class BlobStore:
+    """
+    Deduplicates project files into blobs keyed by their SHA-256
+
+    Each project file is hardlinked to its blob, so identical files (template
+    scaffolding, requirements.txt, boilerplate READMEs) share one inode on
+    disk and one copy in the page cache, while projects stay plain
+    directories that zipping, previews and refinement read as before.
+    Blobs are made read-only so nothing can modify every project sharing
+    them in place; FileGenerator replaces files instead of rewriting them.
+
+    References are counted per (project, path) in SQLite. gc() drops
+    references whose project file was deleted or replaced, then removes
+    blobs nothing refers to. Where hardlinks are unavailable (e.g. the store
+    is on another filesystem) files are left as private copies.
+    """
+
+    def __init__(self, root: Union[str, Path], busy_timeout: float = 5.0):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.path = str(self.root / "index.sqlite3")
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / digest[2:]
+
+    def _link(self, path: Path, digest: str) -> str:
+        """
+        Make `path` a hardlink of its blob, creating the blob from it if new
+
+        Returns:
+            "new", "linked" (now shares an existing blob), "same" (already
+            linked) or "copy" (hardlinks unavailable; left as is)
+        """
+        blob = self.blob_path(digest)
+        if not blob.exists():
+            blob.parent.mkdir(exist_ok=True)
+            try:
+                os.link(path, blob)
+            except FileExistsError:
+                pass  # another process stored it first
+            except OSError:
+                return "copy"
+            else:
+                os.chmod(blob, _READ_ONLY)
+                return "new"
+        if os.path.samefile(path, blob):
+            return "same"
+        tmp = path.with_name(f".{path.name}.blob-{os.getpid()}-{threading.get_ident()}")
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            return "copy"
+        os.replace(tmp, path)
+        return "linked"
+
+    def add_project(self, project_id: str, project_dir: Union[str, Path],
+                    files: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Deduplicate a project's files into the store
+
+        Args:
+            project_id: Project the files belong to (the directory name)
+            project_dir: Directory holding the project
+            files: Absolute paths to add; defaults to every file in project_dir
+
+        Returns:
+            Counts of files, new blobs, files linked to an existing blob and
+            bytes those links saved
+        """
+        project_dir = Path(project_dir).absolute()
+        if files is None:
+            files = []
+            for dirpath, dirnames, filenames in os.walk(project_dir):
+                dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+                files.extend(os.path.join(dirpath, f) for f in filenames if not f.startswith('.'))
+        # Hash outside the write lock; it is the expensive part
+        entries = []
+        for path in files:
+            path = Path(path)
+            if path.is_symlink() or not path.is_file():
+                continue
+            relpath = path.relative_to(project_dir).as_posix()
+            entries.append((path, relpath, file_sha256(path), path.stat().st_size))
+
+        counts = {"files": len(entries), "new_blobs": 0, "linked": 0, "bytes_saved": 0}
+        conn = self._connect()
+        # Held while linking so gc() cannot delete a blob we are about to link to
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for path, relpath, digest, size in entries:
+                outcome = self._link(path, digest)
+                if outcome == "copy":
+                    continue
+                if outcome == "new":
+                    counts["new_blobs"] += 1
+                elif outcome == "linked":
+                    counts["linked"] += 1
+                    counts["bytes_saved"] += size
+                previous = conn.execute(
+                    "SELECT digest FROM refs WHERE project_id = ? AND path = ?", (project_id, relpath)
+                ).fetchone()
+                if previous and previous[0] == digest:
+                    continue
+                if previous:
+                    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?", previous)
+                conn.execute(
+                    "INSERT INTO blobs VALUES (?, ?, 1) "
+                    "ON CONFLICT (digest) DO UPDATE SET refcount = refcount + 1",
+                    (digest, size)
+                )
+                conn.execute("INSERT OR REPLACE INTO refs VALUES (?, ?, ?)", (project_id, relpath, digest))
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return counts
+
+    def release_project(self, project_id: str) -> int:
+        """Drop a project's references (call before or after deleting it); returns how many"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT digest FROM refs WHERE project_id = ?", (project_id,)).fetchall()
+        conn.executemany("UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?", rows)
+        conn.execute("DELETE FROM refs WHERE project_id = ?", (project_id,))
+        conn.execute("COMMIT")
+        return len(rows)
+
+    def gc(self, output_dir: Union[str, Path], dry_run: bool = False) -> Dict[str, int]:
+        """
+        Remove blobs no project uses any more
+
+        References whose file under output_dir/<project_id>/ is gone or no
+        longer shares the blob's inode are dropped first. A blob is only
+        deleted when its count is zero and the store holds its last link.
+
+        Returns:
+            Counts of stale references dropped, blobs removed and bytes freed
+        """
+        output_dir = Path(output_dir)
+        counts = {"stale_refs": 0, "blobs_removed": 0, "bytes_freed": 0}
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for project_id, relpath, digest in conn.execute("SELECT project_id, path, digest FROM refs").fetchall():
+                path = output_dir / project_id / relpath
+                try:
+                    alive = os.path.samefile(path, self.blob_path(digest))
+                except OSError:
+                    alive = False
+                if not alive:
+                    counts["stale_refs"] += 1
+                    conn.execute("DELETE FROM refs WHERE project_id = ? AND path = ?", (project_id, relpath))
+                    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE digest = ?", (digest,))
+
+            for digest, size in conn.execute("SELECT digest, size FROM blobs WHERE refcount <= 0").fetchall():
+                blob = self.blob_path(digest)
+                try:
+                    if blob.stat().st_nlink > 1:
+                        continue  # still linked from a file we have no reference for
+                    if not dry_run:
+                        blob.unlink()
+                except FileNotFoundError:
+                    pass
+                conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                counts["blobs_removed"] += 1
+                counts["bytes_freed"] += size
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # A dry run goes through the same bookkeeping and then discards it
+        conn.execute("ROLLBACK" if dry_run else "COMMIT")
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        """Unique and logical bytes; dedup_ratio is logical / unique (1.0 = no sharing)"""
+        conn = self._connect()
+        blobs, unique_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        refs, logical_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(b.size), 0) FROM refs r JOIN blobs b ON b.digest = r.digest"
+        ).fetchone()
+        return {
+            "path": str(self.root),
+            "blobs": blobs,
+            "references": refs,
+            "unique_bytes": unique_bytes,
+            "logical_bytes": logical_bytes,
+            "dedup_ratio": round(logical_bytes / unique_bytes, 3) if unique_bytes else 1.0
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Deduplicate generated projects")
+    parser.add_argument("command", choices=["import", "gc", "stats"])
+    parser.add_argument("output_dir", nargs="?", default="generated_projects")
+    parser.add_argument("--store", help="blob store directory (default: <output_dir>/blobs)")
+    parser.add_argument("--dry-run", action="store_true", help="gc: report without deleting")
+    args = parser.parse_args(argv)
+
+    store = BlobStore(args.store or os.path.join(args.output_dir, "blobs"))
+    if args.command == "import":
+        totals = {"files": 0, "new_blobs": 0, "linked": 0, "bytes_saved": 0}
+        root = Path(args.output_dir)
+        for project_dir in sorted(p for p in root.iterdir() if p.is_dir() and p.absolute() != store.root.absolute()):
+            for key, value in store.add_project(project_dir.name, project_dir).items():
+                totals[key] += value
+        print(f"{totals['files']} files: {totals['new_blobs']} new blobs, "
+              f"{totals['linked']} linked, {totals['bytes_saved']} bytes saved")
+    elif args.command == "gc":
+        counts = store.gc(args.output_dir, dry_run=args.dry_run)
+        print(f"{counts['stale_refs']} stale references, {counts['blobs_removed']} blobs "
+              f"({counts['bytes_freed']} bytes) {'would be ' if args.dry_run else ''}removed")
+    for key, value in store.stats().items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import defaultdict, deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+from pathlib import Path
+
+import requests
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recorded interaction matches a request"""
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Stable key for a request payload (credentials never form part of it)"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class RecordingResponse:
+    """Wraps a live streamed response and captures each line with its arrival time"""
+
+    def __init__(self, response: requests.Response, cassette: 'Cassette', entry: Dict[str, Any], start: float):
+        self._response = response
+        self._cassette = cassette
+        self._entry = entry
+        self._start = start
+        self.status_code = response.status_code
+        self.encoding = response.encoding
+
+    def raise_for_status(self) -> None:
+        try:
+            self._response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            # Error responses are worth replaying too
+            self._entry["body"] = self._response.text
+            self._cassette._append(self._entry)
+            raise
+
+    def iter_lines(self, decode_unicode: bool = False) -> Iterator[Union[str, bytes]]:
+        self._response.encoding = self.encoding
+        lines = self._entry["lines"]
+        try:
+            for line in self._response.iter_lines(decode_unicode=decode_unicode):
+                text = line.decode("utf-8") if isinstance(line, bytes) else line
+                lines.append([round(time.monotonic() - self._start, 4), text])
+                yield line
+        finally:
+            self._cassette._append(self._entry)
+
+    def close(self) -> None:
+        self._response.close()
+
+
+class ReplayResponse:
+    """Serves a recorded interaction back, reproducing its chunk timing"""
+
+    def __init__(self, entry: Dict[str, Any], speed: float):
+        self._entry = entry
+        self._speed = speed
+        self.status_code = entry["status"]
+        self.encoding = "utf-8"
+        self._start = time.monotonic()
+
+    def _wait_until(self, offset: float) -> None:
+        if self._speed <= 0:
+            return
+        delay = offset / self._speed - (time.monotonic() - self._start)
+        if delay > 0:
+            time.sleep(delay)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            response = requests.Response()
+            response.status_code = self.status_code
+            response._content = self._entry.get("body", "").encode("utf-8")
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} Error (replayed)", response=response
+            )
+
+    def iter_lines(self, decode_unicode: bool = False) -> Iterator[Union[str, bytes]]:
+        for offset, line in self._entry["lines"]:
+            self._wait_until(offset)
+            yield line if decode_unicode else line.encode("utf-8")
+
+    def close(self) -> None:
+        pass
+
+
+class Cassette:
+    """
+    Record/replay layer for OpenRouterClient's HTTP transport
+
+    In record mode every request/response pair, including the arrival time of
+    each streamed line, is appended to a gzip-compressed JSON-lines file. In
+    replay mode those interactions are served back without network access,
+    at the original pace or scaled by `speed` (2.0 = twice as fast, 0 = no
+    delays). Repeated identical requests replay their recordings in order and
+    then cycle.
+
+    Use `cassette.post` as the client's transport.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    def __init__(self, path: Union[str, Path], mode: str = REPLAY, speed: float = 1.0):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._interactions: Dict[str, deque] = defaultdict(deque)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        if mode == self.REPLAY:
+            for entry in self.load(self.path):
+                self._interactions[entry["key"]].append(entry)
+
+    @staticmethod
+    def load(path: Union[str, Path]) -> List[Dict[str, Any]]:
+        """Read every interaction from a cassette file"""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if entry.get("_written"):
+            return
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Each append is its own gzip member; readers see one continuous stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+            self.recorded += 1
+        entry["_written"] = True
+
+    def post(self, url: str, headers: Dict[str, str], json: Dict[str, Any], **kwargs):
+        """Drop-in replacement for requests.post as used by OpenRouterClient"""
+        key = request_key(json)
+        if self.mode == self.REPLAY:
+            with self._lock:
+                recordings = self._interactions.get(key)
+                if not recordings:
+                    self.misses += 1
+                    raise CassetteMiss(f"No recorded interaction for model {json.get('model')}")
+                entry = recordings[0]
+                recordings.rotate(-1)
+                self.hits += 1
+            response = ReplayResponse(entry, self.speed)
+            response._wait_until(entry.get("headers_at", 0.0))
+            return response
+
+        start = time.monotonic()
+        response = requests.post(url, headers=headers, json=json, **kwargs)
+        entry = {
+            "key": key,
+            "request": json,
+            "status": response.status_code,
+            "headers_at": round(time.monotonic() - start, 4),
+            "recorded_at": time.time(),
+            "lines": []
+        }
+        return RecordingResponse(response, self, entry, start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "path": str(self.path),
+                "interactions": sum(len(v) for v in self._interactions.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded
+            }
+
+
+_env_cassette: Optional[Cassette] = None
+_env_lock = threading.Lock()
+
+
+def transport_from_env() -> Optional[Callable]:
+    """
+    Return a cassette transport configured by environment variables, if any
+
+    OPENROUTER_CASSETTE        path to the cassette file (enables the layer)
+    OPENROUTER_CASSETTE_MODE   "record" or "replay" (default "replay")
+    OPENROUTER_CASSETTE_SPEED  replay speed multiplier (default 1.0, 0 = no delays)
+    """
+    global _env_cassette
+    path = os.getenv("OPENROUTER_CASSETTE")
+    if not path:
+        return None
+    with _env_lock:
+        if _env_cassette is None:
+            _env_cassette = Cassette(
+                path,
+                mode=os.getenv("OPENROUTER_CASSETTE_MODE", Cassette.REPLAY),
+                speed=float(os.getenv("OPENROUTER_CASSETTE_SPEED", "1.0"))
+            )
+    return _env_cassette.post
@@ -0,0 +1,141 @@
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker
+
+    closed     requests flow; consecutive failures are counted
+    open       requests are rejected immediately until reset_timeout elapses
+    half_open  a limited number of probe requests are let through; one success
+               closes the circuit, one failure opens it again
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.transitions = Counter()
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning("Circuit for %s: %s -> %s", self.name, self._state, state)
+        self.transitions[f"{self._state}->{state}"] += 1
+        self._state = state
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == self.HALF_OPEN:
+            self._half_open_calls = 0
+        elif state == self.CLOSED:
+            self._failures = 0
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+
+    def allow_request(self) -> bool:
+        """Return True if a request may be sent now (reserves a probe slot when half-open)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.OPEN:
+                self.rejected += 1
+                return False
+            if self._state == self.HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected += 1
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def release_probe(self) -> None:
+        """
+        Give back a slot reserved by allow_request() without recording an outcome
+
+        For requests that end without telling us anything about the model
+        (cancelled by the caller, or a local error); otherwise a half-open
+        circuit would wait forever for the probe's verdict.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state == self.HALF_OPEN:
+                self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+                "transitions": dict(self.transitions)
+            }
+
+
+class CircuitBreakerRegistry:
+    """Lazily creates one CircuitBreaker per model with shared settings"""
+
+    def __init__(self, **breaker_kwargs):
+        self.breaker_kwargs = breaker_kwargs
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(name, **self.breaker_kwargs)
+                self._breakers[name] = breaker
+            return breaker
+
+    def is_open(self, name: str) -> bool:
+        """True if requests to `name` are currently being rejected outright"""
+        with self._lock:
+            breaker = self._breakers.get(name)
+        return breaker is not None and breaker.state == CircuitBreaker.OPEN
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.stats() for name, breaker in breakers.items()}
@@ -0,0 +1,252 @@
+import os
+import re
+import math
+from pathlib import Path
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple, Union
+
+# File types worth sending to the model; everything else is skipped at index time.
+# Matched on the suffix, so dotfiles such as .env (which may hold secrets) never are.
+TEXT_EXTENSIONS = {
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.html', '.css', '.json', '.yaml', '.yml',
+    '.toml', '.ini', '.cfg', '.md', '.txt', '.sql', '.sh', '.vue'
+}
+
+SKIP_DIRS = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'dist', 'build'}
+
+IDENTIFIER_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+SYMBOL_RE = re.compile(
+    r'^\s*(?:async\s+)?(?:def|class|function)\s+([A-Za-z_][A-Za-z0-9_]*)'
+    r'|^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_][A-Za-z0-9_]*)\s*=',
+    re.MULTILINE
+)
+ROUTE_RE = re.compile(r'''@\w+\.(?:route|get|post|put|patch|delete)\(\s*['"]([^'"]+)''')
+IMPORT_RE = re.compile(
+    r'^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))'
+    r'''|require\(\s*['"]([^'"]+)['"]\s*\)|from\s+['"]([^'"]+)['"]''',
+    re.MULTILINE
+)
+
+STOPWORDS = {
+    'the', 'and', 'for', 'with', 'that', 'this', 'from', 'into', 'add', 'make',
+    'use', 'should', 'please', 'can', 'all', 'are', 'not', 'but', 'when', 'then',
+    'self', 'def', 'class', 'import', 'return', 'none', 'true', 'false'
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate (no tokenizer download, no API call)
+
+    Code averages roughly four characters per token for BPE tokenizers; the
+    estimate errs slightly high so packed prompts stay under the real limit.
+    """
+    return len(text) // 4 + text.count('\n') // 4 + 1
+
+
+def _terms(text: str) -> List[str]:
+    """Split identifiers (including snake_case and camelCase) into lowercase terms"""
+    terms = []
+    for word in IDENTIFIER_RE.findall(text):
+        parts = re.findall(r'[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])', word) or [word]
+        for part in parts + ([word] if len(parts) > 1 else []):
+            part = part.lower()
+            if len(part) > 2 and part not in STOPWORDS:
+                terms.append(part)
+    return terms
+
+
+@dataclass
+class IndexedFile:
+    path: str
+    content: str
+    tokens: int
+    symbols: List[str] = field(default_factory=list)
+    imports: List[str] = field(default_factory=list)
+    terms: Counter = field(default_factory=Counter)
+
+
+class ProjectIndex:
+    """
+    Index an existing project so the files relevant to a change request can be
+    selected and packed into a token budget
+    """
+
+    def __init__(self):
+        self.files: Dict[str, IndexedFile] = {}
+        self._document_frequency: Counter = Counter()
+
+    @classmethod
+    def from_files(cls, files: Dict[str, str]) -> 'ProjectIndex':
+        """Build an index from a {path: content} dict"""
+        index = cls()
+        for path, content in files.items():
+            index.add_file(path, content)
+        return index
+
+    @classmethod
+    def from_directory(cls, root: Union[str, Path], max_file_size: int = 200_000) -> 'ProjectIndex':
+        """Build an index from the text files under a directory"""
+        root = Path(root)
+        index = cls()
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+            for filename in filenames:
+                filepath = Path(dirpath) / filename
+                if filepath.suffix.lower() not in TEXT_EXTENSIONS:
+                    continue
+                if filepath.stat().st_size > max_file_size:
+                    continue
+                try:
+                    content = filepath.read_text(encoding='utf-8')
+                except UnicodeDecodeError:
+                    continue
+                index.add_file(filepath.relative_to(root).as_posix(), content)
+        return index
+
+    @classmethod
+    def from_workspace(cls, workspace, max_file_size: int = 200_000) -> 'ProjectIndex':
+        """Build an index from an uploaded ZipWorkspace, reading entries one at a time"""
+        index = cls()
+        for path, content in workspace.iter_text_files(TEXT_EXTENSIONS, max_size=max_file_size):
+            if not any(part in SKIP_DIRS for part in path.split('/')[:-1]):
+                index.add_file(path, content)
+        return index
+
+    def add_file(self, path: str, content: str) -> None:
+        """Index a single file, replacing any previous version"""
+        if path in self.files:
+            self._document_frequency.subtract(set(self.files[path].terms))
+
+        symbols = [a or b for a, b in SYMBOL_RE.findall(content)]
+        symbols += ROUTE_RE.findall(content)
+        imports = [next(g for g in groups if g) for groups in IMPORT_RE.findall(content)]
+        terms = Counter(_terms(content))
+        terms.update(_terms(path.replace('/', ' ').replace('.', ' ')))
+
+        self.files[path] = IndexedFile(
+            path=path,
+            content=content,
+            tokens=estimate_tokens(content),
+            symbols=symbols,
+            imports=imports,
+            terms=terms
+        )
+        self._document_frequency.update(set(terms))
+
+    def rank(self, request: str) -> List[Tuple[str, float]]:
+        """
+        Rank indexed files by relevance to a change request
+
+        Matches against file paths and defined symbols weigh most, then imports,
+        then TF-IDF over the identifiers in the body. Files imported by a strong
+        match get a share of its score so their interfaces come along.
+
+        Returns:
+            List of (path, score) tuples, best first
+        """
+        query = set(_terms(request))
+        if not query:
+            return [(path, 0.0) for path in self.files]
+
+        total = len(self.files) or 1
+        scores = {}
+        for path, indexed in self.files.items():
+            path_terms = set(_terms(path.replace('/', ' ').replace('.', ' ')))
+            symbol_terms = set(_terms(' '.join(indexed.symbols)))
+            import_terms = set(_terms(' '.join(indexed.imports)))
+
+            score = 4.0 * len(query & path_terms)
+            score += 3.0 * len(query & symbol_terms)
+            score += 1.5 * len(query & import_terms)
+            for term in query:
+                count = indexed.terms.get(term, 0)
+                if count:
+                    idf = math.log(1 + total / self._document_frequency[term])
+                    score += (1 + math.log(count)) * idf
+            scores[path] = score
+
+        # Propagate relevance along imports: a matching file pulls in its local dependencies
+        modules = {Path(p).with_suffix('').as_posix().replace('/', '.'): p for p in self.files}
+        for path, score in list(scores.items()):
+            if score <= 0:
+                continue
+            for name in self.files[path].imports:
+                target = modules.get(name.lstrip('.')) or modules.get(name.split('.')[-1])
+                if target and target != path:
+                    scores[target] += 0.25 * score
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def outline(self, path: str) -> str:
+        """One-line summary of a file used when its full content does not fit"""
+        indexed = self.files[path]
+        symbols = ', '.join(indexed.symbols[:20]) or 'no top-level symbols'
+        return f"{path} ({indexed.tokens} tokens): {symbols}"
+
+    def pack(
+        self,
+        request: str,
+        token_budget: int = 6000,
+        max_files: Optional[int] = None,
+        min_score: float = 0.0
+    ) -> Dict[str, object]:
+        """
+        Select the most relevant files that fit in a token budget
+
+        Args:
+            request: The change request
+            token_budget: Estimated tokens available for file contents
+            max_files: Optional cap on the number of full files included
+            min_score: Files scoring at or below this are never sent in full
+
+        Returns:
+            Dict containing:
+                - files: {path: content} of files sent in full
+                - outline: one-line summaries of relevant files that did not fit
+                - tokens: estimated tokens used
+                - skipped: number of indexed files left out entirely
+        """
+        packed: Dict[str, str] = {}
+        outline: List[str] = []
+        used = 0
+
+        for path, score in self.rank(request):
+            if score <= min_score:
+                break
+            indexed = self.files[path]
+            # Path header plus fence overhead
+            cost = indexed.tokens + estimate_tokens(path) + 4
+            if used + cost <= token_budget and (max_files is None or len(packed) < max_files):
+                packed[path] = indexed.content
+                used += cost
+                continue
+            line = self.outline(path)
+            line_cost = estimate_tokens(line)
+            if used + line_cost <= token_budget:
+                outline.append(line)
+                used += line_cost
+
+        return {
+            "files": packed,
+            "outline": outline,
+            "tokens": used,
+            "skipped": len(self.files) - len(packed) - len(outline)
+        }
+
+
+def build_refine_prompt(request: str, packed: Dict[str, object]) -> str:
+    """Render a packed context into a prompt asking for changed files only"""
+    sections = [f"Change request:\n{request}\n"]
+    if packed["files"]:
+        sections.append("Relevant files from the existing project:\n")
+        for path, content in packed["files"].items():
+            sections.append(f"{path}:\n```\n{content}\n```\n")
+    if packed["outline"]:
+        sections.append("Other related files (not shown in full):\n" + "\n".join(packed["outline"]) + "\n")
+    sections.append(
+        "Return ONLY the files that need to change or be created, each in full, "
+        "using the same 'path:' followed by a code block format."
+    )
+    return "\n".join(sections)
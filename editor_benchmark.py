@@ -0,0 +1,134 @@
+"""
+Keystroke-to-repaint latency of EnhancedTextEditor against file size
+
+For each file size, loads a synthetic Python file, then types characters in
+the middle of it and measures the time from the edit until the event loop is
+idle again (highlighting done, widget redrawn). "incremental" is the editor's
+own dirty-range highlighting; "full" re-highlights the whole buffer per
+keystroke, as the editor used to.
+
+With --headless, only the lexer is timed (no Tk needed): a cold pass over
+the whole file and a warm pass served from its per-line token cache.
+
+Usage:
+    python editor_benchmark.py --lines 500 1000 3000 10000 --keys 50
+    python editor_benchmark.py --headless
+
+The editor benchmark needs a display (run under xvfb-run on a headless machine).
+"""
+import sys
+import time
+import argparse
+from typing import Dict, List, Optional
+
+from load_test import percentile
+
+SAMPLE = '''class Handler{n}(object):
+    """Handle request {n}"""
+
+    def process(self, value, retries=3):
+        # retry a few times before giving up
+        for attempt in range(retries):
+            if value > {n} and attempt != 2:
+                return "ok: %s" % value
+        return None
+
+'''
+
+
+def synthetic_source(lines: int) -> str:
+    """Python source of roughly `lines` lines"""
+    block = SAMPLE.count("\n")
+    return "".join(SAMPLE.format(n=i) for i in range(max(1, lines // block)))
+
+
+def measure(root, editor, keys: int, full: bool) -> List[float]:
+    """Seconds from each typed character until the event loop is idle"""
+    middle = int(editor.index("end").split(".")[0]) // 2
+    editor.mark_set("insert", f"{middle}.end")
+    editor.see("insert")
+    root.update()
+
+    latencies = []
+    for i in range(keys):
+        start = time.perf_counter()
+        editor.insert("insert", "x" if i % 10 else "\n")
+        if full:
+            editor.highlight_syntax()
+        root.update_idletasks()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(sizes: List[int], keys: int) -> List[Dict[str, float]]:
+    import tkinter as tk
+    from enhanced_editor import EnhancedTextEditor
+
+    root = tk.Tk()
+    root.geometry("900x700")
+    results = []
+    try:
+        for lines in sizes:
+            for mode in ("incremental", "full"):
+                editor = EnhancedTextEditor(root)
+                editor.pack(fill=tk.BOTH, expand=True)
+                editor.insert("1.0", synthetic_source(lines))
+                root.update()
+                latencies = sorted(measure(root, editor, keys, full=(mode == "full")))
+                results.append({
+                    "lines": lines,
+                    "mode": mode,
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p90_ms": percentile(latencies, 90) * 1000,
+                    "max_ms": latencies[-1] * 1000
+                })
+                editor.frame.destroy()
+    finally:
+        root.destroy()
+    return results
+
+
+def run_headless(sizes: List[int]) -> List[Dict[str, float]]:
+    from syntax_lexer import PythonLexer
+
+    results = []
+    for lines in sizes:
+        source = synthetic_source(lines)
+        lexer = PythonLexer()
+        timings = {}
+        for mode in ("cold", "warm"):
+            start = time.perf_counter()
+            tokens = sum(len(t) for _, t, _ in lexer.tokenize(source))
+            timings[mode] = time.perf_counter() - start
+        results.append({
+            "lines": lines,
+            "tokens": tokens,
+            "cold_ms": timings["cold"] * 1000,
+            "warm_ms": timings["warm"] * 1000,
+            "lines_per_s": lines / timings["cold"] if timings["cold"] else 0.0
+        })
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark editor keystroke latency")
+    parser.add_argument("--lines", type=int, nargs="+", default=[500, 1000, 3000, 10000],
+                        help="file sizes to test, in lines")
+    parser.add_argument("--keys", type=int, default=50, help="keystrokes per measurement")
+    parser.add_argument("--headless", action="store_true", help="benchmark the lexer alone, without Tk")
+    args = parser.parse_args(argv)
+
+    if args.headless:
+        print(f"{'lines':>7}{'tokens':>9}{'cold ms':>10}{'warm ms':>10}{'lines/s':>11}")
+        for r in run_headless(args.lines):
+            print(f"{r['lines']:>7}{r['tokens']:>9}{r['cold_ms']:>10.2f}{r['warm_ms']:>10.2f}{r['lines_per_s']:>11.0f}")
+        return 0
+
+    print(f"{'lines':>7}  {'mode':<12}{'p50ms':>9}{'p90ms':>9}{'maxms':>9}")
+    for r in run(args.lines, args.keys):
+        print(f"{r['lines']:>7}  {r['mode']:<12}{r['p50_ms']:>9.2f}{r['p90_ms']:>9.2f}{r['max_ms']:>9.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
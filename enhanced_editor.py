@@ -1,39 +1,97 @@
+import queue
 import tkinter as tk
 from tkinter import ttk, scrolledtext
-from typing import Optional, Dict, Any
-import re
+from typing import Optional, Dict, Any, List, Union
+from syntax_lexer import PythonLexer, TOKEN_TAGS
+from line_gutter import IdleScheduler, LineNumberGutter
+from symbol_index import BackgroundSymbolIndexer, Symbol
+
+# Placeholder lexer state for lines that have not been lexed yet
+_UNKNOWN = object()
+
+# Lines fetched from the widget per round trip while re-lexing past an edit
+_LEX_CHUNK = 200
+
+# Documents longer than this many lines only highlight around the viewport
+LARGE_DOCUMENT_LINES = 5000
+
+# Lines lexed per after() tick when filling in line states of a large document
+_FILL_CHUNK = 5000
+
+# Approximate memory the undo history may hold
+MAX_UNDO_BYTES = 16 * 1024 * 1024
+
+# Quiet time after the last edit before the symbol outline is rebuilt
+OUTLINE_DELAY_MS = 500
+
+def insert_chunked(widget, text, chunk_size=64 * 1024, on_done=None):
+    """
+    Append text to a Text widget in chunks scheduled with after(), so a
+    multi-megabyte insert never blocks the event loop for long
+    
+    Returns:
+        A callable that cancels the remaining chunks
+    """
+    job = {"id": None}
+    
+    def step(pos):
+        end = pos + chunk_size
+        if end < len(text):
+            # Break at a newline so each chunk adds whole lines
+            newline = text.rfind('\n', pos, end)
+            end = newline + 1 if newline > pos else end
+        widget.insert("end-1c", text[pos:end])
+        if end < len(text):
+            job["id"] = widget.after(1, step, end)
+        else:
+            job["id"] = None
+            if on_done:
+                on_done()
+    
+    def cancel():
+        if job["id"] is not None:
+            widget.after_cancel(job["id"])
+            job["id"] = None
+    
+    step(0)
+    return cancel
 
 class EnhancedTextEditor(scrolledtext.ScrolledText):
     """Enhanced text editor with line numbers and syntax highlighting"""
     
     def __init__(self, master=None, **kwargs):
+        # Large-document options (not Text options)
+        self.large_document_lines = kwargs.pop('large_document_lines', LARGE_DOCUMENT_LINES)
+        self.max_undo_bytes = kwargs.pop('max_undo_bytes', MAX_UNDO_BYTES)
+        self.viewport_margin = kwargs.pop('viewport_margin', 100)
+        self.outline_delay_ms = kwargs.pop('outline_delay_ms', OUTLINE_DELAY_MS)
+        
         # Configure default options
         kwargs.setdefault('wrap', 'none')
         kwargs.setdefault('font', ('Consolas', 12))
         kwargs.setdefault('undo', True)
         kwargs.setdefault('autoseparators', True)
-        kwargs.setdefault('maxundo', -1)
-        
-        # Create main frame
-        self.frame = ttk.Frame(master)
-        
-        # Create line numbers widget
-        self.line_numbers = tk.Text(
-            self.frame,
-            width=4,
-            padx=3,
-            takefocus=0,
-            border=0,
-            background='#f0f0f0',
-            foreground='#666666',
-            state='disabled',
-            wrap='none'
-        )
-        self.line_numbers.pack(side=tk.LEFT, fill=tk.Y)
+        # Finite from the start; _account_undo tunes it to max_undo_bytes
+        kwargs.setdefault('maxundo', 1000)
+        
+        # Outer container holding the gutter and the scrolled text
+        container = ttk.Frame(master)
+        
+        # Initialize the scrolled text widget (ScrolledText wraps it in its own inner frame)
+        super().__init__(container, **{k: v for k, v in kwargs.items() if k != 'master'})
+        self.text_frame = self.frame
+        self.frame = container
+        # ScrolledText points the geometry methods at its inner frame; lay out the container instead
+        geometry = (vars(tk.Pack).keys() | vars(tk.Grid).keys() | vars(tk.Place).keys()) - vars(tk.Text).keys()
+        for name in geometry:
+            if name[0] != '_' and name not in ('config', 'configure'):
+                setattr(self, name, getattr(container, name))
         
-        # Initialize the scrolled text widget
-        super().__init__(self.frame, **{k: v for k, v in kwargs.items() if k != 'master'})
-        self.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # Line numbers, redrawn at most once per frame through the shared scheduler
+        self.scheduler = IdleScheduler(self)
+        self.line_numbers = LineNumberGutter(container, self, scheduler=self.scheduler)
+        self.line_numbers.pack(side=tk.LEFT, fill=tk.Y)
+        self.text_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         
         # Configure tags for syntax highlighting
         self.tag_configure("keyword", foreground="#569cd6")
@@ -45,43 +103,292 @@ class EnhancedTextEditor(scrolledtext.ScrolledText):
         self.tag_configure("operator", foreground="#d4d4d4")
         self.tag_configure("current_line", background="#f5f5f5")
         
+        # Line range [first, last] edited since the last highlight pass
+        self._dirty: Optional[List[int]] = None
+        # _line_states[n] is the lexer state at the end of line n (index 0: start of text)
+        self.lexer = PythonLexer()
+        self._line_states: List[Any] = [None]
+        self._fill_job = None
+        self._painted_window = None
+        self._cancel_load = None
+        self._undo_enabled = bool(kwargs['undo'])
+        self._undo_depth = kwargs['maxundo']
+        self._undo_bytes = 0
+        self._undo_ops = 0
+        
+        # Symbol outline, parsed off the Tk thread (see _submit_outline)
+        self.symbols: List[Symbol] = []
+        self.symbol_error: Optional[str] = None
+        self._symbol_lookup: Dict[str, int] = {}
+        self._edit_version = 0
+        self._indexed_version = -1
+        self._indexer: Optional[BackgroundSymbolIndexer] = None
+        self._symbol_results = queue.Queue()
+        self._outline_job = None
+        self._symbol_poll_job = None
+        self._install_change_hook()
+        
+        # Scrolling redraws the gutter and, in a large document, highlights
+        # the lines that come into view
+        self.configure(yscrollcommand=self._on_yscroll)
+        
         # Bind events
         self.bind('<KeyRelease>', self.on_key_release)
         self.bind('<Button-1>', self.on_click)
         self.bind('<MouseWheel>', self.on_mousewheel)
-        self.bind('<Configure>', self.on_configure)
         
         # Initialize line numbers
         self.update_line_numbers()
     
-    def pack(self, **kwargs):
-        """Pack the frame instead of the text widget"""
-        return self.frame.pack(**kwargs)
+    def _install_change_hook(self):
+        """
+        Route the widget's Tcl command through _dispatch so every insert and
+        delete (typing, paste, undo, programmatic edits) marks its lines dirty
+        """
+        self._orig_command = self._w + "_orig"
+        self.tk.call("rename", self._w, self._orig_command)
+        self.tk.createcommand(self._w, self._dispatch)
     
-    def grid(self, **kwargs):
-        """Grid the frame instead of the text widget"""
-        return self.frame.grid(**kwargs)
+    def _dispatch(self, operation, *args):
+        if operation not in ("insert", "delete", "replace"):
+            return self.tk.call((self._orig_command, operation) + args)
+        
+        first = int(self.tk.call(self._orig_command, "index", args[0]).split('.')[0])
+        lines_before = int(self.tk.call(self._orig_command, "index", "end").split('.')[0])
+        if self._undo_enabled:
+            self._account_undo(operation, args)
+        result = self.tk.call((self._orig_command, operation) + args)
+        delta = int(self.tk.call(self._orig_command, "index", "end").split('.')[0]) - lines_before
+        
+        # Keep cached line states aligned with the lines they belong to
+        states = self._line_states
+        if first < len(states):
+            states[first] = _UNKNOWN
+            if delta > 0:
+                states[first + 1:first + 1] = [_UNKNOWN] * delta
+            elif delta < 0:
+                del states[first + 1:first + 1 - delta]
+        self._mark_dirty(first, delta)
+        self._schedule_outline()
+        # Edits that do not move the view (e.g. typing in a short file) still renumber
+        self.line_numbers.schedule_redraw()
+        return result
     
-    def place(self, **kwargs):
-        """Place the frame instead of the text widget"""
-        return self.frame.place(**kwargs)
+    def _account_undo(self, operation, args):
+        """
+        Keep the undo history within max_undo_bytes by tuning maxundo to the
+        average size of an edit seen so far (Tk only bounds it by count)
+        """
+        size = 0
+        if operation in ("delete", "replace"):
+            size += len(self.tk.call(self._orig_command, "get", *args[:2]))
+        if operation == "insert":
+            size += sum(len(chars) for chars in args[1::2])
+        elif operation == "replace":
+            size += sum(len(chars) for chars in args[2::2])
+        self._undo_bytes += size
+        self._undo_ops += 1
+        
+        depth = max(100, self.max_undo_bytes * self._undo_ops // max(self._undo_bytes, 1))
+        if abs(depth - self._undo_depth) > self._undo_depth // 10:
+            self._undo_depth = depth
+            self.tk.call(self._orig_command, "configure", "-maxundo", depth)
     
-    def pack_forget(self):
-        """Forget the frame"""
-        return self.frame.pack_forget()
+    def load_text(self, text, chunk_size=64 * 1024, on_done=None):
+        """
+        Replace the content with `text`, inserting it in chunks via after()
+        
+        The load itself is not recorded in the undo history.
+        """
+        if self._cancel_load:
+            self._cancel_load()
+        self.configure(undo=False)
+        self._undo_enabled = False
+        self.delete("1.0", tk.END)
+        self._line_states = [None]
+        
+        def finished():
+            self._cancel_load = None
+            self.edit_reset()
+            self.configure(undo=True)
+            self._undo_enabled = True
+            self._undo_bytes = self._undo_ops = 0
+            if on_done:
+                on_done()
+        
+        self._cancel_load = insert_chunked(self, text, chunk_size, finished)
+    
+    def is_large_document(self, line_count=None):
+        if line_count is None:
+            line_count = self._line_count()
+        return line_count > self.large_document_lines
+    
+    def visible_lines(self):
+        """First and last line numbers currently on screen"""
+        first = int(self.index("@0,0").split('.')[0])
+        last = int(self.index(f"@0,{self.winfo_height()}").split('.')[0])
+        return first, last
+    
+    def _on_yscroll(self, first, last):
+        self.vbar.set(first, last)
+        self.line_numbers.schedule_redraw()
+        if self.is_large_document():
+            self.scheduler.schedule("highlight", self._flush_highlight)
+    
+    def _mark_dirty(self, first, delta):
+        """Record an edit at line `first` that changed the line count by `delta`"""
+        last = first + max(delta, 0)
+        if self._dirty is None:
+            self._dirty = [first, last]
+        else:
+            lo, hi = self._dirty
+            # Lines after the edit moved by delta
+            if first <= hi:
+                hi = max(hi + delta, first)
+            self._dirty = [min(lo, first), max(hi, last)]
+        
+        # Debounce: a burst of edits is highlighted once, at idle time
+        self.scheduler.schedule("highlight", self._flush_highlight)
     
-    def grid_forget(self):
-        """Forget the frame"""
-        return self.frame.grid_forget()
+    def _flush_highlight(self):
+        if self._dirty is not None:
+            first, last = self._dirty
+            self._dirty = None
+            self.highlight_lines(first, last)
+        if self.is_large_document():
+            self.highlight_viewport()
+            if self._fill_job is None:
+                self._fill_job = self.after(1, self._fill_states)
     
-    def place_forget(self):
-        """Forget the frame"""
-        return self.frame.place_forget()
+    def _schedule_outline(self):
+        """Rebuild the symbol outline once edits have settled"""
+        self._edit_version += 1
+        if self._outline_job is not None:
+            self.after_cancel(self._outline_job)
+        self._outline_job = self.after(self.outline_delay_ms, self._submit_outline)
+    
+    def _submit_outline(self):
+        self._outline_job = None
+        if self._indexer is None:
+            self._indexer = BackgroundSymbolIndexer(
+                lambda *result: self._symbol_results.put(result)
+            )
+        # Only the text is copied here; parsing happens on the indexer's thread
+        self._indexer.submit(self._edit_version, self.get("1.0", "end-1c"))
+        if self._symbol_poll_job is None:
+            self._symbol_poll_job = self.after(50, self._poll_symbols)
+    
+    def _poll_symbols(self):
+        self._symbol_poll_job = None
+        latest = None
+        while True:
+            try:
+                latest = self._symbol_results.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            version, symbols, error = latest
+            self._indexed_version = version
+            # Results for text that has since changed are dropped; a newer parse is on its way
+            if version == self._edit_version:
+                self._apply_symbols(symbols, error)
+        if self._indexed_version < self._edit_version and self._outline_job is None:
+            self._symbol_poll_job = self.after(50, self._poll_symbols)
+    
+    def _apply_symbols(self, symbols, error):
+        self.symbol_error = error
+        if symbols is None:
+            # Keep the last good outline while the buffer does not parse
+            self.event_generate("<<SymbolsChanged>>")
+            return
+        if self.symbols:
+            self.mark_unset(*(f"symbol:{i}" for i in range(len(self.symbols))))
+        self.symbols = symbols
+        self._symbol_lookup = {}
+        for i, symbol in enumerate(symbols):
+            # Marks move with the text, so jumps stay exact as edits come in
+            self.mark_set(f"symbol:{i}", f"{symbol.line}.{symbol.col}")
+            self.mark_gravity(f"symbol:{i}", tk.LEFT)
+            self._symbol_lookup.setdefault(symbol.qualname, i)
+        self.event_generate("<<SymbolsChanged>>")
+    
+    def goto_symbol(self, symbol: Union[str, int]) -> bool:
+        """
+        Move the cursor to a symbol from the outline
+        
+        Args:
+            symbol: Qualified name (e.g. "UserModel.save") or position in self.symbols
+            
+        Returns:
+            False if there is no such symbol
+        """
+        i = self._symbol_lookup.get(symbol) if isinstance(symbol, str) else symbol
+        if i is None or not 0 <= i < len(self.symbols):
+            return False
+        index = self.index(f"symbol:{i}")
+        self.mark_set("insert", index)
+        self.see(index)
+        self.highlight_current_line()
+        return True
+    
+    def highlight_viewport(self):
+        """Re-tag the lines in and around the viewport when it has moved"""
+        top, bottom = self.visible_lines()
+        window = (max(1, top - self.viewport_margin), min(self._line_count(), bottom + self.viewport_margin))
+        if window != self._painted_window:
+            self._painted_window = window
+            # Unchanged lines come straight from the lexer's cache
+            self.highlight_lines(*window)
+    
+    def _fill_states(self):
+        """
+        Lex a large document's line states a chunk per tick, without tagging,
+        so a jump anywhere in it starts from the correct string state
+        """
+        self._fill_job = None
+        line_count = self._line_count()
+        if not self.is_large_document(line_count):
+            return
+        self._sync_states(line_count)
+        states = self._line_states
+        try:
+            line = states.index(_UNKNOWN, 1)
+        except ValueError:
+            return
+        
+        state = states[line - 1]
+        end = min(line_count, line + _FILL_CHUNK - 1)
+        for text in self.get(f"{line}.0", f"{end}.end").split('\n'):
+            _, state = self.lexer.lex_line(text, state)
+            states[line] = state
+            line += 1
+        
+        if line <= line_count:
+            self._fill_job = self.after(1, self._fill_states)
+        else:
+            # Repaint the viewport now that every line starts in the right state
+            self._painted_window = None
+            self.highlight_viewport()
+    
+    def destroy(self):
+        if self._cancel_load:
+            self._cancel_load()
+        self.scheduler.cancel()
+        for job in (self._fill_job, self._outline_job, self._symbol_poll_job):
+            if job is not None:
+                self.after_cancel(job)
+        self._fill_job = self._outline_job = self._symbol_poll_job = None
+        if self._indexer is not None:
+            self._indexer.close()
+        super().destroy()
+        try:
+            self.tk.deletecommand(self._w)
+        except tk.TclError:
+            pass
     
     def on_key_release(self, event=None):
         """Handle key release events"""
-        self.update_line_numbers()
-        self.highlight_syntax()
+        # Highlighting and line numbers follow edits and scrolling on their own
         self.highlight_current_line()
         
         # Auto-indent on newline
@@ -90,7 +397,6 @@ class EnhancedTextEditor(scrolledtext.ScrolledText):
     
     def on_click(self, event=None):
         """Handle mouse click events"""
-        self.update_line_numbers()
         self.highlight_current_line()
     
     def on_mousewheel(self, event):
@@ -99,37 +405,11 @@ class EnhancedTextEditor(scrolledtext.ScrolledText):
             self.yview_scroll(1, "units")
         elif event.num == 4 or event.delta > 0:
             self.yview_scroll(-1, "units")
-        self.update_line_numbers()
         return "break"
     
-    def on_configure(self, event=None):
-        """Handle window configuration changes"""
-        self.update_line_numbers()
-    
     def update_line_numbers(self):
-        """Update the line numbers in the sidebar"""
-        # Get current view
-        first_visible = self.yview()[0]
-        last_visible = self.yview()[1]
-        
-        # Get total number of lines
-        total_lines = int(self.index(tk.END).split('.')[0])
-        
-        # Calculate visible lines
-        first_line = int(first_visible * total_lines) + 1
-        last_line = int(last_visible * total_lines) + 1
-        
-        # Generate line numbers
-        line_numbers = '\n'.join(str(i) for i in range(first_line, last_line + 1))
-        
-        # Update line numbers widget
-        self.line_numbers.config(state=tk.NORMAL)
-        self.line_numbers.delete(1.0, tk.END)
-        self.line_numbers.insert(1.0, line_numbers)
-        self.line_numbers.config(state=tk.DISABLED)
-        
-        # Update scroll region
-        self.line_numbers.yview_moveto(first_visible)
+        """Request a line number redraw (coalesced; see LineNumberGutter)"""
+        self.line_numbers.schedule_redraw()
     
     def highlight_current_line(self, event=None):
         """Highlight the current line"""
@@ -161,30 +441,75 @@ class EnhancedTextEditor(scrolledtext.ScrolledText):
         return "break"
     
     def highlight_syntax(self, event=None):
-        """Apply syntax highlighting to the text"""
-        # Clear existing tags
-        for tag in ["keyword", "string", "number", "comment", "function", "class", "operator"]:
-            self.tag_remove(tag, "1.0", tk.END)
-        
-        # Get the text
-        text = self.get("1.0", tk.END)
-        
-        # Simple syntax highlighting (can be enhanced with a proper lexer)
-        self.highlight_pattern(r"\b(and|as|assert|break|class|continue|def|del|elif|else|except|finally|for|from|global|if|import|in|is|lambda|nonlocal|not|or|pass|raise|return|try|while|with|yield|True|False|None)\b", "keyword")
-        self.highlight_pattern(r'"[^"]*"|\'[^\']*\'', "string")
-        self.highlight_pattern(r'\b\d+\b', "number")
-        self.highlight_pattern(r'#[^\n]*', "comment")
-        self.highlight_pattern(r'\b(def|class)\s+(\w+)', "function", group=2)
-        self.highlight_pattern(r'(\+|\-|\*|/|//|%|\*\*|==|!=|<=|>=|<|>|=|\+=|\-=|\*=|/=|//=|%=|\*\*=|&=|\|=|\^=|>>=|<<=)', "operator")
-    
-    def highlight_pattern(self, pattern, tag, group=0):
-        """Highlight a regex pattern in the text"""
-        text = self.get("1.0", tk.END)
-        
-        # Find all matches
-        import re
-        matches = [(m.start(group), m.end(group)) for m in re.finditer(pattern, text, re.MULTILINE)]
-        
-        # Apply tags to matches
-        for start, end in matches:
-            self.tag_add(tag, f"1.0+{start}c", f"1.0+{end}c")
+        """Apply syntax highlighting to the whole text"""
+        self._line_states = [None]
+        self.highlight_lines(1, self._line_count())
+    
+    def _line_count(self):
+        return int(self.index("end-1c").split('.')[0])
+    
+    def _sync_states(self, line_count):
+        """Trim or pad the line state cache to the current line count"""
+        states = self._line_states
+        del states[line_count + 1:]
+        states.extend([_UNKNOWN] * (line_count + 1 - len(states)))
+    
+    def highlight_lines(self, first, last):
+        """
+        Re-highlight lines first..last
+        
+        Lexing continues past `last` until a line ends in the same state as
+        before the edit, so opening or closing a multi-line string re-lexes
+        exactly the lines whose meaning changed. Each tag is then applied
+        with a single tag_add call.
+        """
+        line_count = self._line_count()
+        self._sync_states(line_count)
+        states = self._line_states
+        
+        # Large documents only lex what is on screen (plus a margin); lines
+        # left unlexed keep an unknown state and are picked up when scrolled to
+        stop = line_count
+        floor = 1
+        if self.is_large_document(line_count):
+            top, bottom = self.visible_lines()
+            lo = max(1, top - self.viewport_margin)
+            stop = min(line_count, bottom + self.viewport_margin)
+            if last < lo or first > stop:
+                return
+            first = max(first, lo)
+            last = min(last, stop)
+            floor = max(1, lo - self.viewport_margin)
+        
+        first = max(1, min(first, line_count))
+        last = max(first, min(last, line_count))
+        while first > floor and states[first - 1] is _UNKNOWN:
+            first -= 1
+        state = states[first - 1]
+        if state is _UNKNOWN:
+            # Too far from anything lexed; assume the line starts outside a string
+            state = None
+        
+        ranges: Dict[str, List[str]] = {tag: [] for tag in TOKEN_TAGS}
+        line = first
+        resynced = False
+        while line <= stop and not resynced:
+            chunk_end = max(last, min(line + _LEX_CHUNK - 1, stop))
+            for text in self.get(f"{line}.0", f"{chunk_end}.end").split('\n'):
+                tokens, end_state = self.lexer.lex_line(text, state)
+                for tag, start, end in tokens:
+                    ranges[tag].extend((f"{line}.{start}", f"{line}.{end}"))
+                resynced = line >= last and states[line] == end_state
+                states[line] = state = end_state
+                if resynced:
+                    break
+                line += 1
+        end_line = min(line, stop)
+        if not resynced and end_line < line_count:
+            # What follows may now be lexed differently; re-lex it when it is shown
+            states[end_line + 1:] = [_UNKNOWN] * (line_count - end_line)
+        
+        for tag in TOKEN_TAGS:
+            self.tag_remove(tag, f"{first}.0", f"{end_line}.end")
+            if ranges[tag]:
+                self.tag_add(tag, *ranges[tag])
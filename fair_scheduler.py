@@ -0,0 +1,174 @@
+import time
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when a key's queue is full; carries what the caller needs for a 429"""
+
+    def __init__(self, message: str, position: int, retry_after: int = 5):
+        super().__init__(message)
+        self.position = position
+        self.retry_after = retry_after
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Short non-reversible id for an API key, safe to log and expose in stats"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+class _Ticket:
+    __slots__ = ("key", "granted")
+
+    def __init__(self, key: str):
+        self.key = key
+        self.granted = False
+
+
+class FairScheduler:
+    """
+    Per-key concurrency quotas with weighted round-robin dequeuing
+
+    Each key (an API key fingerprint) may have at most `per_key_limit`
+    generations in flight, and the server at most `global_limit`. Work beyond
+    that waits in a per-key FIFO queue; when a slot frees up, keys take turns,
+    each getting up to `weight` grants per turn, so one heavy user can never
+    push everyone else to the back. A key whose queue is already
+    `max_queue_per_key` deep is rejected immediately.
+    """
+
+    def __init__(
+        self,
+        per_key_limit: int = 2,
+        global_limit: int = 8,
+        max_queue_per_key: int = 4,
+        weights: Optional[Dict[str, int]] = None
+    ):
+        """
+        Args:
+            per_key_limit: Maximum in-flight requests per key
+            global_limit: Maximum in-flight requests across all keys
+            max_queue_per_key: Maximum queued (not yet running) requests per key
+            weights: Grants per round-robin turn for specific keys (default 1)
+        """
+        self.per_key_limit = per_key_limit
+        self.global_limit = global_limit
+        self.max_queue_per_key = max_queue_per_key
+        self.weights = dict(weights or {})
+        self._condition = threading.Condition()
+        self._queues: Dict[str, deque] = {}
+        self._ring: deque = deque()  # keys with queued tickets, in turn order
+        self._credits: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._running = 0
+        self._granted = 0
+        self._queued = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def _dispatch(self) -> None:
+        """Grant queued tickets while capacity allows (caller holds the lock)"""
+        granted = False
+        while self._running < self.global_limit and self._ring:
+            for _ in range(len(self._ring)):
+                key = self._ring[0]
+                if self._in_flight.get(key, 0) < self.per_key_limit:
+                    break
+                self._ring.rotate(-1)
+            else:
+                break  # every waiting key is at its own limit
+
+            queue = self._queues[key]
+            ticket = queue.popleft()
+            ticket.granted = True
+            granted = True
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+            self._running += 1
+            self._granted += 1
+
+            self._credits[key] = self._credits.get(key, self.weights.get(key, 1)) - 1
+            if not queue:
+                self._ring.popleft()
+                del self._queues[key]
+                self._credits.pop(key, None)
+            elif self._credits[key] <= 0:
+                self._credits.pop(key)
+                self._ring.rotate(-1)
+        if granted:
+            self._condition.notify_all()
+
+    def _cancel(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.key)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.key]
+                self._ring.remove(ticket.key)
+                self._credits.pop(ticket.key, None)
+
+    @contextmanager
+    def slot(self, key: str, timeout: float = 300.0) -> Iterator[None]:
+        """
+        Hold an execution slot for `key` for the duration of the block
+
+        Args:
+            key: Identity to schedule fairly against (see key_fingerprint)
+            timeout: Seconds to wait in the queue
+
+        Raises:
+            QueueFullError: If the key already has max_queue_per_key requests waiting
+            TimeoutError: If no slot is granted within `timeout`
+        """
+        ticket = _Ticket(key)
+        with self._condition:
+            queue = self._queues.get(key)
+            if queue is not None and len(queue) >= self.max_queue_per_key:
+                self._rejected += 1
+                raise QueueFullError(
+                    f"Too many queued requests for this API key "
+                    f"({self._in_flight.get(key, 0)} running, {len(queue)} queued)",
+                    position=len(queue) + 1
+                )
+            if queue is None:
+                queue = self._queues[key] = deque()
+                self._ring.append(key)
+            queue.append(ticket)
+            self._dispatch()
+
+            if not ticket.granted:
+                self._queued += 1
+                deadline = time.monotonic() + timeout
+                while not ticket.granted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._cancel(ticket)
+                        self._timeouts += 1
+                        raise TimeoutError("Timed out waiting for a generation slot")
+                    self._condition.wait(remaining)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight[key] -= 1
+                if not self._in_flight[key]:
+                    del self._in_flight[key]
+                self._running -= 1
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and cumulative counters"""
+        with self._condition:
+            return {
+                "running": self._running,
+                "global_limit": self.global_limit,
+                "per_key_limit": self.per_key_limit,
+                "keys_in_flight": len(self._in_flight),
+                "waiting": sum(len(q) for q in self._queues.values()),
+                "granted": self._granted,
+                "queued": self._queued,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts
+            }
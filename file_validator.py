@@ -0,0 +1,164 @@
+import os
+import json
+import threading
+import multiprocessing
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import yaml
+except ImportError:  # YAML checking is skipped without PyYAML
+    yaml = None
+
+# Elements whose missing end tag is a real bug rather than permitted HTML shorthand
+# (html, head and body may omit their end tags, so they are not listed)
+_MUST_CLOSE = {
+    'div', 'span', 'script', 'style', 'form', 'table',
+    'ul', 'ol', 'section', 'article', 'nav', 'header', 'footer', 'main',
+    'select', 'textarea', 'button', 'a', 'title', 'template'
+}
+_VOID = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+    'param', 'source', 'track', 'wbr'
+}
+
+# Below this many files, or this much source, the process pool costs more
+# than it saves; a typical generated project is checked inline
+_POOL_THRESHOLD = 4
+_POOL_MIN_BYTES = 256 * 1024
+
+# Shared by every validate_files call; started on first use
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+VALIDATED_EXTENSIONS = {'.py', '.json', '.html', '.htm'} | ({'.yaml', '.yml'} if yaml else set())
+
+
+class _TagBalanceChecker(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[tuple] = []
+        self.errors: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in _VOID:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_endtag(self, tag):
+        if tag in _VOID:
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                unclosed = [t for t in self.stack[i + 1:] if t[0] in _MUST_CLOSE]
+                if unclosed:
+                    name, line = unclosed[-1]
+                    self.errors.append(f"line {line}: <{name}> not closed before </{tag}>")
+                del self.stack[i:]
+                return
+        self.errors.append(f"line {self.getpos()[0]}: unexpected </{tag}>")
+
+
+def validate_source(filename: str, content: str) -> Optional[str]:
+    """
+    Check a file's syntax based on its extension
+
+    Args:
+        filename: Name used to pick the checker and in error messages
+        content: File content
+
+    Returns:
+        An error message, or None if the file is valid or has no checker
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    try:
+        if ext == '.py':
+            compile(content, filename, 'exec', dont_inherit=True)
+        elif ext == '.json':
+            json.loads(content)
+        elif ext in ('.yaml', '.yml') and yaml is not None:
+            list(yaml.safe_load_all(content))
+        elif ext in ('.html', '.htm'):
+            checker = _TagBalanceChecker()
+            checker.feed(content)
+            checker.close()
+            errors = checker.errors + [
+                f"line {line}: <{tag}> never closed"
+                for tag, line in checker.stack if tag in _MUST_CLOSE
+            ]
+            if errors:
+                return "; ".join(errors[:5])
+    except SyntaxError as e:
+        return f"line {e.lineno}: {e.msg}"
+    except json.JSONDecodeError as e:
+        return f"line {e.lineno}: {e.msg}"
+    except Exception as e:
+        # yaml.YAMLError and anything else a checker raises
+        return str(e).strip() or e.__class__.__name__
+    return None
+
+
+def validate_path(path: str) -> Optional[str]:
+    """Validate a file on disk (see validate_source)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except UnicodeDecodeError:
+        return None
+    return validate_source(path, content)
+
+
+def _get_pool(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The shared validation pool (max_workers only applies when it is first started)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Not fork: forking the threaded Flask server can deadlock the child
+            # on a lock some other thread held at the time
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+        return _pool
+
+
+def _total_size(paths: List[str]) -> int:
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def validate_files(paths: Iterable[str], max_workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Validate files in parallel across processes
+
+    Parsing is CPU-bound and holds the GIL, so large projects are spread over
+    a long-lived process pool; small ones are checked inline.
+
+    Args:
+        paths: File paths to check (files without a checker are skipped)
+        max_workers: Process pool size (defaults to the CPU count)
+
+    Returns:
+        Dict of {path: error message} for files that failed
+    """
+    global _pool
+    paths = [p for p in paths if os.path.splitext(p)[1].lower() in VALIDATED_EXTENSIONS]
+    if (len(paths) >= _POOL_THRESHOLD and (os.cpu_count() or 1) > 1
+            and _total_size(paths) >= _POOL_MIN_BYTES):
+        pool = _get_pool(max_workers)
+        try:
+            results = list(pool.map(validate_path, paths, chunksize=max(1, len(paths) // 32)))
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time and check these inline
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+        else:
+            return {path: error for path, error in zip(paths, results) if error}
+
+    results = map(validate_path, paths)
+    return {path: error for path, error in zip(paths, results) if error}
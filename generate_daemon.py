@@ -0,0 +1,368 @@
+"""
+Long-lived local daemon for the generate_files.py CLI
+
+A script calling `python generate_files.py "<prompt>"` in a loop pays for
+interpreter startup, the generator's imports, a fresh client and a new TLS
+connection every time. The daemon keeps all of that warm and takes jobs
+over a Unix domain socket; the client side of this module imports nothing
+beyond the standard library, so forwarding a job costs a few milliseconds.
+When no daemon is running, jobs run in-process as before.
+
+Usage:
+    python generate_daemon.py serve [--socket PATH] [--idle-timeout SECONDS]
+    python generate_daemon.py status|stop [--socket PATH]
+    python generate_daemon.py run "<prompt>" [output_dir] [--start-daemon]
+
+The socket defaults to $GENERATE_FILES_SOCKET, else generate_files.sock in
+$XDG_RUNTIME_DIR, else a 0700 per-user directory in the temp directory. It
+is only accessible to the user who started the daemon, and the client only
+sends a job (which carries the API key) to a socket owned by that user.
+"""
+import os
+import sys
+import json
+import stat
+import time
+import socket
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SOCKET = os.getenv("GENERATE_FILES_SOCKET") or (
+    os.path.join(os.environ["XDG_RUNTIME_DIR"], "generate_files.sock") if os.getenv("XDG_RUNTIME_DIR")
+    # Not tempfile.gettempdir(): importing tempfile costs more than the rest of the client
+    else os.path.join(os.getenv("TMPDIR", "/tmp"), f"generate_files-{os.getuid()}", "daemon.sock")
+)
+
+
+class DaemonUnavailable(OSError):
+    """Raised by request() when no usable daemon is listening on the socket (nothing was sent)"""
+
+
+class UntrustedSocket(DaemonUnavailable):
+    """Raised when the socket or its directory belongs to another user"""
+
+
+def _check_directory(directory: str) -> None:
+    """
+    Raises:
+        UntrustedSocket: If another user could replace a socket in directory
+    """
+    st = os.stat(directory)
+    # Ours, or a root-owned directory others cannot rename entries in (e.g. sticky /tmp)
+    if st.st_uid != os.getuid() and not (
+        st.st_uid == 0 and (st.st_mode & stat.S_ISVTX or not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH))
+    ):
+        raise UntrustedSocket(f"{directory} is writable by another user; not using a daemon socket there")
+
+
+def _check_owner(socket_path: str) -> None:
+    """
+    Raises:
+        DaemonUnavailable: If there is no socket
+        UntrustedSocket: If the socket or its directory belongs to another user
+    """
+    try:
+        owner = os.lstat(socket_path).st_uid
+        _check_directory(os.path.dirname(os.path.abspath(socket_path)))
+    except FileNotFoundError as e:
+        raise DaemonUnavailable(f"No daemon listening on {socket_path}") from e
+    if owner != os.getuid():
+        raise UntrustedSocket(f"{socket_path} is owned by another user; not sending the job")
+
+
+def request(message: Dict[str, Any], socket_path: str = DEFAULT_SOCKET,
+            timeout: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Send one request to the daemon and wait for its reply
+
+    Raises:
+        DaemonUnavailable: If no daemon this user owns is listening
+        ConnectionError: If the connection broke once the request was sent;
+            the daemon may still be working on it
+    """
+    _check_owner(socket_path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+            raise DaemonUnavailable(f"No daemon listening on {socket_path}") from e
+        sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise ConnectionError(f"Daemon on {socket_path} closed the connection before replying")
+    return json.loads(line)
+
+
+def run_job(job: Dict[str, Any], client=None) -> Dict[str, Any]:
+    """
+    Run a generation job and return a JSON-serializable summary
+
+    Args:
+        job: {"prompt", "output_dir", "options"}, where options are passed
+            to FileGenerator.generate_from_prompt
+        client: OpenRouterClient to use; a new one is created if omitted
+    """
+    from generate_files import FileGenerator
+    if client is None:
+        from openrouter_client import OpenRouterClient
+        client = OpenRouterClient(job.get("api_key"))
+
+    result = FileGenerator.generate_from_prompt(
+        job["prompt"], job.get("output_dir", "."), client, **job.get("options", {})
+    )
+    metadata = result.get("metadata", {})
+    return {
+        "success": result.get("success", False),
+        "error": result.get("error"),
+        "files": result.get("files", []),
+        "metadata": {
+            key: metadata[key] for key in ("template", "file_count", "output_format", "validation")
+            if key in metadata
+        }
+    }
+
+
+class GenerationDaemon:
+    """
+    Serves generation jobs on a Unix domain socket
+
+    One OpenRouterClient is kept per API key, sending through a shared
+    requests.Session so upstream TLS connections are reused across jobs.
+    Class-level state (single-flight, circuit breakers, prompt cache
+    statistics) persists for the life of the daemon as well. Each
+    connection is handled on its own thread; the daemon exits after
+    idle_timeout seconds without a request.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, idle_timeout: float = 900.0):
+        import requests
+        from cassette import transport_from_env
+
+        self.socket_path = socket_path
+        self.idle_timeout = idle_timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("https://", adapter)
+        self.transport = transport_from_env() or self.session.post
+        self._clients: Dict[Optional[str], Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._last_activity = time.monotonic()
+        self._started = time.time()
+        self._active = 0
+        self.jobs = 0
+        self.failures = 0
+
+    def client(self, api_key: Optional[str]):
+        with self._lock:
+            client = self._clients.get(api_key)
+            if client is None:
+                from openrouter_client import OpenRouterClient
+                client = OpenRouterClient(api_key, transport=self.transport)
+                self._clients[api_key] = client
+            return client
+
+    def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        op = message.get("op")
+        if op == "ping":
+            return {"ok": True, "status": self.status()}
+        if op == "shutdown":
+            self._stop.set()
+            return {"ok": True}
+        if op != "generate":
+            return {"ok": False, "error": f"Unknown op: {op!r}"}
+
+        with self._lock:
+            self._active += 1
+        try:
+            result = run_job(message, self.client(message.get("api_key")))
+            with self._lock:
+                self.jobs += 1
+            return {"ok": True, "result": result}
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            return {"ok": False, "error": str(e)}
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._last_activity = time.monotonic()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "uptime": round(time.time() - self._started, 1),
+                "jobs": self.jobs,
+                "failures": self.failures,
+                "active": self._active,
+                "clients": len(self._clients)
+            }
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        with conn, conn.makefile("rb") as lines:
+            for line in lines:
+                with self._lock:
+                    self._last_activity = time.monotonic()
+                try:
+                    reply = self.handle(json.loads(line))
+                except ValueError as e:
+                    reply = {"ok": False, "error": f"Malformed request: {e}"}
+                conn.sendall(json.dumps(reply).encode("utf-8") + b"\n")
+
+    def _idle(self) -> bool:
+        with self._lock:
+            return self._active == 0 and time.monotonic() - self._last_activity > self.idle_timeout
+
+    def serve_forever(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        try:
+            _check_directory(directory)
+            if os.path.lexists(self.socket_path):
+                request({"op": "ping"}, self.socket_path, timeout=2)
+        except UntrustedSocket as e:
+            raise RuntimeError(str(e)) from e
+        except (DaemonUnavailable, OSError, ValueError):
+            if os.path.lexists(self.socket_path):
+                os.unlink(self.socket_path)  # left behind by a daemon that died
+        else:
+            if os.path.lexists(self.socket_path):
+                raise RuntimeError(f"A daemon is already listening on {self.socket_path}")
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Jobs carry API keys: only the owner may connect
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(old_umask)
+        server.listen(64)
+        server.settimeout(1.0)
+        print(f"Listening on {self.socket_path} (pid {os.getpid()})")
+        try:
+            while not self._stop.is_set() and not self._idle():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            self.session.close()
+
+
+def start_daemon(socket_path: str = DEFAULT_SOCKET) -> None:
+    """Start a daemon in the background, detached from this process"""
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--socket", socket_path, "serve"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+
+def generate(prompt: str, output_dir: str = ".", socket_path: str = DEFAULT_SOCKET,
+             start: bool = False, **options) -> Dict[str, Any]:
+    """
+    Run a job on the daemon if one is listening, else in this process
+
+    Args:
+        prompt: The prompt to generate code from
+        output_dir: Directory to write files to (resolved here, not in the daemon)
+        socket_path: Daemon socket
+        start: Start a daemon for later calls when none is running
+        **options: Passed to FileGenerator.generate_from_prompt
+
+    Returns:
+        The run_job summary, with "via" set to "daemon" or "in-process"
+
+    Raises:
+        ConnectionError: If the daemon went away mid-job; the job is not
+            retried in-process, as the daemon may still be running it
+        RuntimeError: If the daemon reported an error
+    """
+    job = {
+        "op": "generate",
+        "prompt": prompt,
+        "output_dir": os.path.abspath(output_dir),
+        "api_key": os.getenv("OPENROUTER_API_KEY"),
+        "options": options
+    }
+    try:
+        reply = request(job, socket_path)
+    except UntrustedSocket as e:
+        print(f"Warning: {e}")
+        return dict(run_job(job), via="in-process")
+    except DaemonUnavailable:
+        # Only when the job never reached a daemon
+        if start:
+            start_daemon(socket_path)
+        return dict(run_job(job), via="in-process")
+    if not reply.get("ok"):
+        raise RuntimeError(reply.get("error", "Daemon request failed"))
+    return dict(reply["result"], via="daemon")
+
+
+def run_cli(argv: List[str], socket_path: str = DEFAULT_SOCKET, start: bool = False) -> int:
+    """The generate_files.py command line: <prompt> [output_dir]"""
+    if not argv:
+        print("Usage: python generate_files.py <prompt> [output_dir]")
+        return 1
+    try:
+        result = generate(argv[0], argv[1] if len(argv) > 1 else ".", socket_path, start=start)
+    except (ConnectionError, RuntimeError) as e:
+        print(f"Error: {e}")
+        return 1
+    if not result["success"]:
+        print(f"Error: {result['error']}")
+        return 1
+    print(f"Created {len(result['files'])} files:")
+    for file in result["files"]:
+        print(f"- {file}")
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    # Imported here: generate_files.py forwards through run_cli, which needs none of it
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run generate_files.py jobs through a warm daemon")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="Unix socket path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="run the daemon in the foreground")
+    serve.add_argument("--idle-timeout", type=float, default=900.0, help="exit after this many idle seconds")
+    sub.add_parser("status", help="show the running daemon's counters")
+    sub.add_parser("stop", help="ask the running daemon to exit")
+    run = sub.add_parser("run", help="generate files, through the daemon if one is running")
+    run.add_argument("prompt")
+    run.add_argument("output_dir", nargs="?", default=".")
+    run.add_argument("--start-daemon", action="store_true", help="start a daemon if none is running")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        GenerationDaemon(args.socket, idle_timeout=args.idle_timeout).serve_forever()
+        return 0
+    if args.command == "run":
+        return run_cli([args.prompt, args.output_dir], args.socket, start=args.start_daemon)
+    try:
+        reply = request({"op": "ping" if args.command == "status" else "shutdown"}, args.socket, timeout=5)
+    except DaemonUnavailable as e:
+        print(e)
+        return 1
+    print(json.dumps(reply.get("status", reply), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
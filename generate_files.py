@@ -1,11 +1,42 @@
+if __name__ == "__main__":
+    # `python generate_files.py <prompt> [output_dir]`: hand the job to a running
+    # generate_daemon.py (or run it in-process) before the imports below, which
+    # cost far more than forwarding it
+    import sys
+    from generate_daemon import run_cli
+
+    sys.exit(run_cli(sys.argv[1:]))
+
 import os
 import re
 import json
+import posixpath
 import shutil
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from dataclasses import dataclass, field
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from manifest_parser import ManifestParser, MANIFEST_RESPONSE_FORMAT
+from file_validator import validate_files, validate_source
+
+def normalize_relpath(path: str) -> Optional[str]:
+    """
+    Normalise a model-supplied file path to a safe relative POSIX path
+
+    Returns:
+        The normalised path, or None if it is empty, absolute, has a drive
+        letter or would climb out of the output directory
+    """
+    path = str(path).strip().replace('\\', '/').lstrip('/')
+    if not path or re.match(r'^[A-Za-z]:', path):
+        return None
+    path = posixpath.normpath(path)
+    if path in ('.', '..') or path.startswith('../'):
+        return None
+    return path
 
 class TemplateType(str, Enum):
     PYTHON = "python"
@@ -43,6 +74,48 @@ class FileGenerator:
         # Add more templates as needed
     }
     
+    # System prompt shared by every single-call generation
+    SYSTEM_PROMPT = """You are an expert AI coding assistant that generates complete, production-ready code.
+        
+        Instructions:
+        1. Generate complete, runnable code
+        2. Include all necessary imports and dependencies
+        3. Follow best practices for the language/framework
+        4. Add appropriate error handling and documentation
+        5. Format your response with each file in a code block
+        
+        Format each file like this:
+        
+        filename.py:
+        ```python
+        # Code here
+        ```
+        
+        For directories, use forward slashes (e.g., 'src/utils/helpers.py')
+        """
+    
+    # System prompt for the structured (JSON manifest) output mode
+    MANIFEST_SYSTEM_PROMPT = """You are an expert AI coding assistant that generates complete, production-ready code.
+        
+        Instructions:
+        1. Generate complete, runnable code
+        2. Include all necessary imports and dependencies
+        3. Follow best practices for the language/framework
+        4. Add appropriate error handling and documentation
+        
+        Respond with ONLY a JSON object of the form:
+        {"files": {"path/to/file.py": "<complete file content>", ...}}
+        
+        Use forward slashes in paths (e.g., 'src/utils/helpers.py').
+        """
+    
+    # Per-model outcomes of structured output parsing
+    _manifest_stats = defaultdict(lambda: {"requests": 0, "json_ok": 0, "parse_failures": 0, "unsupported": 0})
+    _manifest_lock = threading.Lock()
+    
+    # Callables notified as listener(output_dir, {filename: content}) after write_files
+    _write_listeners: List = []
+    
     @classmethod
     def get_available_templates(cls) -> List[str]:
         """Get list of available template names"""
@@ -59,6 +132,11 @@ class FileGenerator:
         
         return cls.TEMPLATES.get(template_type, [])
     
+    @classmethod
+    def add_write_listener(cls, listener) -> None:
+        """Register a callable run after every write_files, e.g. to keep an index current"""
+        cls._write_listeners.append(listener)
+    
     @classmethod
     def create_directory(cls, path: Union[str, Path]) -> None:
         """Create directory if it doesn't exist"""
@@ -95,6 +173,22 @@ class FileGenerator:
                 
         return files
     
+    @staticmethod
+    def _write_text(path: Path, content: str) -> None:
+        """
+        Write a file by replacing it rather than rewriting it in place, so a
+        file hardlinked to a shared blob (see blob_store) is never modified
+        for every project that shares it
+        """
+        tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+    
     @classmethod
     def write_files(
         cls, 
@@ -117,6 +211,12 @@ class FileGenerator:
         """
         output_dir = Path(output_dir)
         created_files = []
+        written = {}
+        
+        # Reject the whole batch before writing anything
+        for filename in files:
+            if normalize_relpath(filename) is None:
+                raise ValueError(f"Unsafe file path: {filename!r}")
         
         # Ensure output directory exists
         output_dir.mkdir(parents=True, exist_ok=True)
@@ -135,10 +235,16 @@ class FileGenerator:
             filepath.parent.mkdir(parents=True, exist_ok=True)
             
             # Write file content
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
+            cls._write_text(filepath, content)
                 
             created_files.append(str(filepath.absolute()))
+            written[filename] = content
+        
+        for listener in cls._write_listeners:
+            try:
+                listener(output_dir, written)
+            except Exception as e:
+                print(f"Warning: write listener failed: {e}")
             
         return created_files
         
@@ -182,8 +288,7 @@ class FileGenerator:
                     content = content.replace(f'{{{{ {key} }}}}', str(value))
                 
                 current_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(current_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                cls._write_text(current_path, content)
                 created_files.append(str(current_path.absolute()))
         
         for template in templates:
@@ -199,6 +304,8 @@ class FileGenerator:
         client=None,
         template: Optional[Union[str, TemplateType]] = None,
         context: Optional[Dict[str, Any]] = None,
+        output_format: str = "markdown",
+        validate: bool = False,
         **generation_kwargs
     ) -> Dict[str, Any]:
         """
@@ -210,6 +317,10 @@ class FileGenerator:
             client: OpenRouterClient instance
             template: Optional template to use
             context: Additional context for template rendering
+            output_format: "markdown" (code blocks) or "json" (structured
+                file manifest, see generate_manifest)
+            validate: Check the written files and repair any that fail to
+                parse (see validate_and_repair)
             **generation_kwargs: Additional arguments for generate_code
             
         Returns:
@@ -225,47 +336,489 @@ class FileGenerator:
         output_dir = Path(output_dir)
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        # Create a more detailed system prompt
-        system_prompt = """You are an expert AI coding assistant that generates complete, production-ready code.
+        # Template instructions go first, as a prefix shared with other requests
+        prompt_prefix, prompt = cls.template_prompt(prompt, template, context)
         
-        Instructions:
-        1. Generate complete, runnable code
-        2. Include all necessary imports and dependencies
-        3. Follow best practices for the language/framework
-        4. Add appropriate error handling and documentation
-        5. Format your response with each file in a code block
+        if output_format == "json":
+            files, response = cls.generate_manifest(prompt, client, prompt_prefix=prompt_prefix, **generation_kwargs)
+        else:
+            # Generate code
+            response = client.generate_code(
+                prompt=prompt,
+                prompt_prefix=prompt_prefix,
+                system_prompt=cls.SYSTEM_PROMPT,
+                **generation_kwargs
+            )
+            
+            # Extract and write files
+            files = cls.extract_code_blocks(response)
         
-        Format each file like this:
+        # Create from template first if specified
+        if template:
+            try:
+                template_files = cls.create_from_template(
+                    template_type=template,
+                    output_dir=output_dir,
+                    context=context,
+                    overwrite=False,
+                    skip_existing=True
+                )
+            except Exception as e:
+                print(f"Warning: Failed to create from template: {e}")
         
-        filename.py:
-        ```python
-        # Code here
-        ```
+        # Write generated files
+        try:
+            created_files = cls.write_files(
+                files=files,
+                output_dir=output_dir,
+                overwrite=True
+            )
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "files": [],
+                "metadata": {"template": str(template) if template else None},
+                "raw_response": response
+            }
         
-        For directories, use forward slashes (e.g., 'src/utils/helpers.py')
+        metadata = {
+            "template": str(template) if template else None,
+            "file_count": len(created_files),
+            "output_format": output_format,
+            "generation_params": generation_kwargs
+        }
+        if validate:
+            metadata["validation"] = cls.validate_and_repair(
+                created_files, client, output_dir=output_dir, **generation_kwargs
+            )
+        
+        return {
+            "success": True,
+            "files": created_files,
+            "metadata": metadata,
+            "raw_response": response
+        }
+
+    @classmethod
+    def template_prompt(
+        cls,
+        prompt: str,
+        template: Optional[Union[str, TemplateType]] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, str]:
         """
+        Split a templated request into (prefix, prompt) for prompt caching
         
-        # Add template context to prompt if provided
-        if template:
-            template_info = f"\n\nUse the {template} template as a starting point."
-            if context:
-                template_info += f" Context: {json.dumps(context, indent=2)}"
-            prompt = template_info + "\n\n" + prompt
+        The prefix holds only the template instruction, which is the same for
+        every request using that template, so together with the system prompt
+        it forms a stable, cacheable prefix. The request-specific parts, the
+        prompt and then the template context, follow it.
+        
+        Returns:
+            (prefix, prompt); the prefix is empty without a template
+        """
+        if not template:
+            return "", prompt
+        prefix = f"Use the {template} template as a starting point."
+        if context:
+            prompt += f"\n\nTemplate context: {json.dumps(context, indent=2, sort_keys=True)}"
+        return prefix, prompt
+    
+    @classmethod
+    def generate_manifest(cls, prompt: str, client, prompt_prefix: Optional[str] = None, **generation_kwargs):
+        """
+        Generate files as a structured JSON manifest
+        
+        The model is asked for {"files": {path: content}} via response_format
+        and the stream is parsed incrementally, so files are recovered even
+        from a truncated response. Markdown code-block parsing is used only
+        if the model does not support structured output or returns no
+        parseable manifest.
+        
+        Args:
+            prompt: The prompt to generate code from
+            client: OpenRouterClient instance
+            prompt_prefix: Stable text sent before the prompt (see template_prompt)
+            **generation_kwargs: Additional arguments for generate_code
+            
+        Returns:
+            Tuple of ({filename: content}, raw response)
+        """
+        model = generation_kwargs.get("model", "default")
+        parser = ManifestParser()
         
-        # Generate code
+        try:
+            response = client.generate_code(
+                prompt=prompt,
+                prompt_prefix=prompt_prefix,
+                system_prompt=cls.MANIFEST_SYSTEM_PROMPT,
+                response_format=MANIFEST_RESPONSE_FORMAT,
+                on_token=parser.feed,
+                **generation_kwargs
+            )
+        except Exception as e:
+            if getattr(e, "status_code", None) != 400:
+                raise
+            # Model rejected response_format; ask for the markdown convention instead
+            cls._record_manifest(model, "unsupported")
+            response = client.generate_code(
+                prompt=prompt,
+                prompt_prefix=prompt_prefix,
+                system_prompt=cls.SYSTEM_PROMPT,
+                **generation_kwargs
+            )
+            return cls.extract_code_blocks(response), response
+        
+        if parser.files:
+            cls._record_manifest(model, "json_ok")
+            return dict(parser.files), response
+        
+        cls._record_manifest(model, "parse_failures")
+        return cls.extract_code_blocks(response), response
+    
+    @classmethod
+    def _record_manifest(cls, model: str, outcome: str) -> None:
+        with cls._manifest_lock:
+            stats = cls._manifest_stats[model]
+            stats["requests"] += 1
+            stats[outcome] += 1
+    
+    @classmethod
+    def manifest_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Per-model structured output outcomes and parse failure rate"""
+        with cls._manifest_lock:
+            return {
+                model: dict(stats, failure_rate=round(
+                    (stats["parse_failures"] + stats["unsupported"]) / stats["requests"], 3
+                ))
+                for model, stats in cls._manifest_stats.items()
+            }
+
+    @classmethod
+    def parse_file_plan(cls, content: str) -> List[Dict[str, str]]:
+        """
+        Parse a file plan returned by the planning call
+        
+        Args:
+            content: Model response containing a JSON array (optionally fenced)
+            
+        Returns:
+            List of {"path": ..., "responsibility": ..., "interface": ...} entries
+        """
+        match = re.search(r'```(?:json)?\s*\n([\s\S]*?)```', content)
+        if match:
+            content = match.group(1)
+        
+        # Tolerate prose around the array
+        start, end = content.find('['), content.rfind(']')
+        if start == -1 or end <= start:
+            raise ValueError("File plan does not contain a JSON array")
+        
+        entries = json.loads(content[start:end + 1])
+        
+        plan = []
+        seen = set()
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get("path"):
+                continue
+            path = normalize_relpath(entry["path"])
+            if path is None:
+                print(f"Warning: Ignoring unsafe path in file plan: {entry['path']!r}")
+                continue
+            if path in seen:
+                continue
+            seen.add(path)
+            plan.append({
+                "path": path,
+                "responsibility": str(entry.get("responsibility", "")).strip(),
+                "interface": str(entry.get("interface", "")).strip()
+            })
+        return plan
+    
+    @classmethod
+    def plan_files(
+        cls,
+        prompt: str,
+        client,
+        max_files: int = 20,
+        **generation_kwargs
+    ) -> List[Dict[str, str]]:
+        """
+        Ask the model for a file plan without generating any file bodies
+        
+        Args:
+            prompt: The project description
+            client: OpenRouterClient instance
+            max_files: Upper bound on the number of planned files
+            **generation_kwargs: Additional arguments for generate_code
+            
+        Returns:
+            List of planned files (see parse_file_plan)
+        """
+        system_prompt = f"""You are a software architect planning a project before any code is written.
+        
+        Respond with ONLY a JSON array (at most {max_files} entries) where each entry has:
+        - "path": the file path, using forward slashes (e.g. 'src/utils/helpers.py')
+        - "responsibility": one sentence describing what the file does
+        - "interface": the public names the file exposes (classes, functions, routes,
+          config keys) with signatures, so other files can be written against them
+        
+        Do not include any file contents."""
+        
+        # The plan is short; don't let callers' large budgets leak into it
+        generation_kwargs.setdefault("max_tokens", 1500)
         response = client.generate_code(
             prompt=prompt,
             system_prompt=system_prompt,
             **generation_kwargs
         )
+        return cls.parse_file_plan(response)[:max_files]
+    
+    @classmethod
+    def extract_single_file(cls, content: str) -> str:
+        """Extract the body of a single-file response, stripping the code fence if present"""
+        match = re.search(r'```[a-zA-Z0-9_+-]*\n([\s\S]*?)(?:```|$)', content)
+        if match:
+            return match.group(1)
+        return content
+    
+    @classmethod
+    def generate_planned_file(
+        cls,
+        prompt: str,
+        entry: Dict[str, str],
+        plan: List[Dict[str, str]],
+        client,
+        **generation_kwargs
+    ) -> str:
+        """
+        Generate the contents of one planned file against the shared plan
+        
+        Args:
+            prompt: The original project description
+            entry: The plan entry for the file to generate
+            plan: The full file plan, used as shared interface context
+            client: OpenRouterClient instance
+            **generation_kwargs: Additional arguments for generate_code
+            
+        Returns:
+            str: The file contents
+        """
+        system_prompt = """You are an expert AI coding assistant writing ONE file of a larger project.
+        
+        Instructions:
+        1. Write only the requested file, complete and runnable
+        2. Import from the other project files exactly as described in the plan
+        3. Follow best practices for the language/framework
+        4. Respond with a single code block containing the file, and nothing else"""
+        
+        # Identical for every file of the project, so it is sent as a cacheable prefix
+        shared_context = (
+            f"Project description:\n{prompt}\n\n"
+            f"Project file plan (shared by all files):\n{json.dumps(plan, indent=2)}"
+        )
+        file_prompt = (
+            f"Write the file '{entry['path']}'.\n"
+            f"Responsibility: {entry['responsibility']}\n"
+            f"Interface: {entry['interface']}"
+        )
+        
+        response = client.generate_code(
+            prompt=file_prompt,
+            prompt_prefix=shared_context,
+            system_prompt=system_prompt,
+            **generation_kwargs
+        )
+        return cls.extract_single_file(response)
+
+    @classmethod
+    def repair_file(cls, path: Union[str, Path], error: str, client, **generation_kwargs) -> str:
+        """
+        Ask the model to fix one file that failed validation
+
+        Only the failing file and its error are sent, never the whole project.
+
+        Args:
+            path: Path of the broken file
+            error: Validation error message
+            client: OpenRouterClient instance
+            **generation_kwargs: Additional arguments for generate_code
+
+        Returns:
+            str: The repaired file contents
+        """
+        path = Path(path)
+        content = path.read_text(encoding='utf-8')
+
+        system_prompt = """You are an expert AI coding assistant fixing ONE file that fails to parse.
+
+        Instructions:
+        1. Fix the reported error and any other syntax errors in the file
+        2. Keep the file's behaviour, structure and formatting otherwise unchanged
+        3. Respond with a single code block containing the complete corrected file, and nothing else"""
+
+        repair_prompt = (
+            f"The file '{path.name}' fails to parse:\n{error}\n\n"
+            f"Current contents:\n```\n{content}\n```"
+        )
+
+        response = client.generate_code(
+            prompt=repair_prompt,
+            system_prompt=system_prompt,
+            **generation_kwargs
+        )
+        return cls.extract_single_file(response)
+
+    @classmethod
+    def validate_and_repair(
+        cls,
+        paths: List[str],
+        client,
+        output_dir: Optional[Union[str, Path]] = None,
+        max_workers: int = 4,
+        **generation_kwargs
+    ) -> Dict[str, Any]:
+        """
+        Validate written files and repair only the ones that fail to parse
+
+        Python, JSON, YAML and HTML files are checked in a process pool (see
+        file_validator). Each failing file gets one targeted repair request;
+        the repair is written back only if it parses.
+
+        Args:
+            paths: Paths of the written files
+            client: OpenRouterClient instance
+            output_dir: Directory the files were written to; repairs are
+                written back through write_files relative to it
+            max_workers: Maximum number of concurrent repair requests
+            **generation_kwargs: Additional arguments for generate_code
+
+        Returns:
+            Dict with the number of files checked, the initial errors, the
+            paths repaired and the errors that remain
+        """
+        # Repairs are small, separate requests; streaming callbacks and
+        # structured output belong to the original generation
+        generation_kwargs.pop("on_token", None)
+        generation_kwargs.pop("response_format", None)
+
+        errors = validate_files(paths)
+        repaired = []
+        remaining = {}
+        if errors:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(errors)))) as executor:
+                futures = {
+                    path: executor.submit(cls.repair_file, path, error, client, **generation_kwargs)
+                    for path, error in errors.items()
+                }
+                for path, future in futures.items():
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        remaining[path] = f"{errors[path]} (repair failed: {e})"
+                        continue
+                    error = validate_source(path, content)
+                    if error:
+                        remaining[path] = error
+                        continue
+                    if output_dir is not None:
+                        relpath = os.path.relpath(path, os.path.abspath(output_dir))
+                        cls.write_files({relpath: content}, output_dir=output_dir, overwrite=True)
+                    else:
+                        cls._write_text(Path(path), content)
+                    repaired.append(path)
+
+        return {
+            "checked": len(paths),
+            "invalid": errors,
+            "repaired": repaired,
+            "errors": remaining
+        }
+
+    @classmethod
+    def generate_parallel_from_prompt(
+        cls,
+        prompt: str,
+        output_dir: Union[str, Path] = '.',
+        client=None,
+        template: Optional[Union[str, TemplateType]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        max_workers: int = 6,
+        max_files: int = 20,
+        validate: bool = False,
+        **generation_kwargs
+    ) -> Dict[str, Any]:
+        """
+        Generate files in two phases: a cheap planning call, then one call per
+        planned file issued concurrently. Wall-clock time scales with the
+        largest file rather than the whole project.
         
-        # Extract and write files
-        files = cls.extract_code_blocks(response)
+        Falls back to generate_from_prompt when no usable plan is returned.
+        
+        Args:
+            prompt: The prompt to generate code from
+            output_dir: Directory to write files to
+            client: OpenRouterClient instance
+            template: Optional template to use
+            context: Additional context for template rendering
+            max_workers: Maximum number of concurrent file generations
+            max_files: Upper bound on the number of planned files
+            validate: Check the written files and repair any that fail to parse
+            **generation_kwargs: Additional arguments for generate_code
+            
+        Returns:
+            Dict in the same shape as generate_from_prompt, with the plan and
+            per-file errors added to the metadata
+        """
+        if client is None:
+            from openrouter_client import OpenRouterClient
+            client = OpenRouterClient()
+        
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        
+        user_prompt = prompt
+        prompt = "\n\n".join(part for part in cls.template_prompt(prompt, template, context) if part)
+        
+        plan_kwargs = {k: v for k, v in generation_kwargs.items() if k != "max_tokens"}
+        try:
+            plan = cls.plan_files(prompt, client, max_files=max_files, **plan_kwargs)
+        except Exception as e:
+            print(f"Warning: Failed to plan files, falling back to single call: {e}")
+            plan = []
+        
+        if not plan:
+            return cls.generate_from_prompt(
+                prompt=user_prompt,
+                output_dir=output_dir,
+                client=client,
+                template=template,
+                context=context,
+                validate=validate,
+                **generation_kwargs
+            )
+        
+        # Generate every planned file concurrently
+        files = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(plan)))) as executor:
+            futures = {
+                entry["path"]: executor.submit(
+                    cls.generate_planned_file, prompt, entry, plan, client, **generation_kwargs
+                )
+                for entry in plan
+            }
+            # Collect in plan order so the output is deterministic
+            for path, future in futures.items():
+                try:
+                    files[path] = future.result()
+                except Exception as e:
+                    errors[path] = str(e)
         
-        # Create from template first if specified
         if template:
             try:
-                template_files = cls.create_from_template(
+                cls.create_from_template(
                     template_type=template,
                     output_dir=output_dir,
                     context=context,
@@ -275,7 +828,14 @@ class FileGenerator:
             except Exception as e:
                 print(f"Warning: Failed to create from template: {e}")
         
-        # Write generated files
+        metadata = {
+            "template": str(template) if template else None,
+            "mode": "parallel",
+            "plan": plan,
+            "errors": errors,
+            "generation_params": generation_kwargs
+        }
+        
         try:
             created_files = cls.write_files(
                 files=files,
@@ -287,36 +847,106 @@ class FileGenerator:
                 "success": False,
                 "error": str(e),
                 "files": [],
-                "metadata": {"template": str(template) if template else None},
+                "metadata": metadata,
+                "raw_response": files
+            }
+        
+        metadata["file_count"] = len(created_files)
+        if validate:
+            metadata["validation"] = cls.validate_and_repair(
+                created_files, client, output_dir=output_dir, **generation_kwargs
+            )
+        return {
+            "success": bool(created_files),
+            "files": created_files,
+            "metadata": metadata,
+            "raw_response": files
+        }
+
+    @classmethod
+    def refine_from_prompt(
+        cls,
+        prompt: str,
+        project_dir: Optional[Union[str, Path]] = None,
+        output_dir: Optional[Union[str, Path]] = None,
+        client=None,
+        token_budget: int = 6000,
+        index=None,
+        validate: bool = False,
+        **generation_kwargs
+    ) -> Dict[str, Any]:
+        """
+        Apply a change request to an existing project
+        
+        Only the files most relevant to the request are sent upstream, packed
+        into a token budget; the model returns just the files it changes.
+        
+        Args:
+            prompt: The change request
+            project_dir: Directory containing the existing project
+            output_dir: Directory to write changed files to (defaults to project_dir)
+            client: OpenRouterClient instance
+            token_budget: Estimated tokens available for project context
+            index: Prebuilt ProjectIndex to use instead of indexing project_dir
+            validate: Check the changed files and repair any that fail to parse
+            **generation_kwargs: Additional arguments for generate_code
+            
+        Returns:
+            Dict in the same shape as generate_from_prompt, with packing
+            statistics added to the metadata
+        """
+        from context_packer import ProjectIndex, build_refine_prompt
+        
+        if client is None:
+            from openrouter_client import OpenRouterClient
+            client = OpenRouterClient()
+        
+        if output_dir is None and project_dir is None:
+            raise ValueError("output_dir is required when no project_dir is given")
+        output_dir = Path(output_dir or project_dir)
+        
+        if index is None:
+            index = ProjectIndex.from_directory(project_dir)
+        packed = index.pack(prompt, token_budget=token_budget)
+        
+        response = client.generate_code(
+            prompt=build_refine_prompt(prompt, packed),
+            system_prompt=cls.SYSTEM_PROMPT,
+            **generation_kwargs
+        )
+        files = cls.extract_code_blocks(response)
+        
+        metadata = {
+            "mode": "refine",
+            "indexed_files": len(index.files),
+            "context_files": list(packed["files"]),
+            "context_tokens": packed["tokens"],
+            "generation_params": generation_kwargs
+        }
+        
+        try:
+            created_files = cls.write_files(
+                files=files,
+                output_dir=output_dir,
+                overwrite=True
+            )
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "files": [],
+                "metadata": metadata,
                 "raw_response": response
             }
         
+        metadata["file_count"] = len(created_files)
+        if validate:
+            metadata["validation"] = cls.validate_and_repair(
+                created_files, client, output_dir=output_dir, **generation_kwargs
+            )
         return {
             "success": True,
             "files": created_files,
-            "metadata": {
-                "template": str(template) if template else None,
-                "file_count": len(created_files),
-                "generation_params": generation_kwargs
-            },
+            "metadata": metadata,
             "raw_response": response
         }
-
-if __name__ == "__main__":
-    # Example usage
-    import sys
-    from openrouter_client import OpenRouterClient
-    
-    if len(sys.argv) < 2:
-        print("Usage: python generate_files.py <prompt> [output_dir]")
-        sys.exit(1)
-        
-    prompt = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else '.'
-    
-    client = OpenRouterClient()
-    created_files = FileGenerator.generate_from_prompt(prompt, output_dir, client)
-    
-    print(f"Created {len(created_files)} files:")
-    for file in created_files:
-        print(f"- {file}")
@@ -0,0 +1,118 @@
+import time
+import tkinter as tk
+from tkinter import font as tkfont
+from typing import Callable, Dict, Hashable, Optional
+
+
+class IdleScheduler:
+    """
+    Coalesce UI work: each key runs at most once per frame, at idle time
+
+    Scheduling the same key again before it runs just replaces its callback,
+    so a burst of scroll or key events costs one call per frame instead of
+    one per event.
+    """
+
+    def __init__(self, widget: tk.Misc, frame_ms: int = 16):
+        self.widget = widget
+        self.frame_ms = frame_ms
+        self._pending: Dict[Hashable, Callable[[], None]] = {}
+        self._job = None
+        self._last_run = 0.0
+
+    def schedule(self, key: Hashable, callback: Callable[[], None]) -> None:
+        self._pending[key] = callback
+        if self._job is None:
+            wait = self.frame_ms - (time.monotonic() - self._last_run) * 1000
+            if wait > 0:
+                self._job = self.widget.after(int(wait) + 1, self._run)
+            else:
+                self._job = self.widget.after_idle(self._run)
+
+    def _run(self) -> None:
+        self._job = None
+        self._last_run = time.monotonic()
+        pending, self._pending = self._pending, {}
+        for callback in pending.values():
+            callback()
+
+    def cancel(self) -> None:
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+        self._pending.clear()
+
+
+class LineNumberGutter(tk.Canvas):
+    """
+    Line numbers for a Text widget, drawn only for the lines on screen
+
+    Positions come from the text widget's own display lines (dlineinfo), so
+    wrapped lines and mixed line heights are numbered correctly. Redraws are
+    coalesced through an IdleScheduler and skipped entirely unless the
+    visible range, the line count or the geometry changed.
+
+    Scrolling and resizing are picked up automatically; the owner calls
+    schedule_redraw() after edits (the widget's Modified flag is left to
+    the application, e.g. for unsaved-changes tracking).
+    """
+
+    def __init__(self, master: tk.Misc, text: tk.Text, scheduler: Optional[IdleScheduler] = None, **kwargs):
+        kwargs.setdefault('background', '#f0f0f0')
+        kwargs.setdefault('highlightthickness', 0)
+        kwargs.setdefault('borderwidth', 0)
+        kwargs.setdefault('takefocus', 0)
+        self.foreground = kwargs.pop('foreground', '#666666')
+        super().__init__(master, **kwargs)
+        self.text = text
+        self.scheduler = scheduler or IdleScheduler(self)
+        self.font = tkfont.Font(font=text.cget('font'))
+        self._signature = None
+        self._digits = 0
+
+        for widget in (self, text):
+            widget.bind('<Configure>', self.schedule_redraw, add='+')
+
+    def schedule_redraw(self, event=None) -> None:
+        """Request a redraw; call from scroll callbacks and after edits"""
+        self.scheduler.schedule(self, self.redraw)
+
+    def redraw(self) -> None:
+        text = self.text
+        height = text.winfo_height()
+        first = text.index('@0,0')
+        first_info = text.dlineinfo(first)
+        line_count = int(text.index('end-1c').split('.')[0])
+        signature = (
+            first,
+            text.index(f'@0,{height}'),
+            line_count,
+            first_info[1] if first_info else None,
+            text.winfo_width(),
+            height
+        )
+        if signature == self._signature:
+            return
+        self._signature = signature
+
+        digits = max(2, len(str(line_count)))
+        if digits != self._digits:
+            self._digits = digits
+            self.configure(width=self.font.measure('9' * digits) + 10)
+
+        self.delete('all')
+        x = int(self.cget('width')) - 5
+        index = text.index(f'{first} linestart')
+        while True:
+            info = text.dlineinfo(index)
+            if info is not None:
+                self.create_text(
+                    x, info[1], anchor='ne', text=index.split('.')[0],
+                    font=self.font, fill=self.foreground
+                )
+            elif text.compare(index, '>', first):
+                break  # below the bottom of the view
+            following = text.index(f'{index} +1line')
+            if following == index or int(following.split('.')[0]) > line_count:
+                break
+            index = following
@@ -0,0 +1,333 @@
+"""
+Concurrent load-test harness for the Flask app
+
+Plays scripted user sessions (open the form, generate a project, download
+it, preview its files) at a configurable concurrency and ramp rate, and
+reports throughput, latency percentiles, error rate and worker RSS.
+
+Generation goes through a stub transport that answers instantly with a
+canned project, so the numbers reflect our own overhead rather than model
+latency.
+
+Usage:
+    python load_test.py --users 20 --sessions 5 --ramp 2
+    python load_test.py --url http://127.0.0.1:8000 --pid 1234 --pid 1235
+
+In --url mode the target server must itself be started with a stubbed
+upstream, e.g. OPENROUTER_CASSETTE=<file> OPENROUTER_CASSETTE_SPEED=0.
+"""
+import os
+import sys
+import math
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# A small multi-file project in the markdown convention extract_code_blocks expects
+STUB_FILES = {
+    "app.py": "from flask import Flask, jsonify\n\napp = Flask(__name__)\n\n"
+              "@app.route('/tasks')\ndef list_tasks():\n    return jsonify([])\n" * 20,
+    "models.py": "class Task:\n    def __init__(self, title):\n        self.title = title\n" * 20,
+    "requirements.txt": "Flask>=2.3.3\nSQLAlchemy>=2.0\n",
+    "README.md": "# Task API\n\nGenerated for load testing.\n" * 10
+}
+STUB_RESPONSE = "\n\n".join(f"```\n{path}:\n{content}```" for path, content in STUB_FILES.items())
+
+
+class StubResponse:
+    """Streamed response shaped like OpenRouter's server-sent events"""
+
+    status_code = 200
+    encoding = "utf-8"
+
+    def __init__(self, content: str, chunk_size: int = 400):
+        self._chunks = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+
+    def raise_for_status(self) -> None:
+        pass
+
+    def iter_lines(self, decode_unicode: bool = False):
+        for chunk in self._chunks:
+            yield "data: " + json.dumps({"choices": [{"delta": {"content": chunk}, "finish_reason": None}]})
+            yield ""
+        yield "data: " + json.dumps({"choices": [{"delta": {}, "finish_reason": "stop"}]})
+        yield "data: [DONE]"
+
+    def close(self) -> None:
+        pass
+
+
+def stub_transport(url: str, headers: Dict[str, str], json: Dict[str, Any], **kwargs) -> StubResponse:
+    """Drop-in for requests.post that answers instantly with STUB_RESPONSE"""
+    return StubResponse(STUB_RESPONSE)
+
+
+def read_rss(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size of a process in bytes (Linux /proc), or None if unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if pid is None:
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux; the best we can do elsewhere
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank method
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class Recorder:
+    """Thread-safe collection of per-route latencies and errors"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.sessions = 0
+
+    def add(self, route: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def session_done(self) -> None:
+        with self._lock:
+            self.sessions += 1
+
+
+class InProcessUser:
+    """A virtual user driving the app through Flask's test client (one cookie jar each)"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path: str) -> Tuple[int, bytes]:
+        response = self.client.get(path)
+        return response.status_code, response.data
+
+    def post(self, path: str, data: Dict[str, str]) -> Tuple[int, bytes]:
+        response = self.client.post(path, data=data)
+        return response.status_code, response.data
+
+
+class HttpUser:
+    """A virtual user driving a running server over HTTP"""
+
+    def __init__(self, base_url: str):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def get(self, path: str) -> Tuple[int, bytes]:
+        response = self.session.get(self.base_url + path, allow_redirects=False)
+        return response.status_code, response.content
+
+    def post(self, path: str, data: Dict[str, str]) -> Tuple[int, bytes]:
+        response = self.session.post(self.base_url + path, data=data, allow_redirects=False)
+        return response.status_code, response.content
+
+
+def run_session(user, recorder: Recorder, user_id: int, session_id: int, same_prompt: bool,
+                shared_key: Optional[str] = None) -> None:
+    """One scripted session: form, generate, download, preview every file"""
+
+    def timed(route: str, call: Callable[[], Tuple[int, bytes]]) -> Tuple[int, bytes]:
+        start = time.perf_counter()
+        try:
+            status, body = call()
+        except Exception:
+            recorder.add(route, time.perf_counter() - start, False)
+            return 0, b""
+        recorder.add(route, time.perf_counter() - start, status == 200)
+        return status, body
+
+    timed("GET /", lambda: user.get("/"))
+
+    prompt = "Create a task API with Flask and SQLAlchemy"
+    if not same_prompt:
+        # Distinct prompts so single-flight coalescing does not hide per-request cost
+        prompt += f" (user {user_id}, session {session_id})"
+    status, _ = timed("POST /", lambda: user.post("/", {
+        "prompt": prompt,
+        "model": "openai/gpt-4",
+        # One key per user, as with real students; the scheduler limits each key
+        "api_key": shared_key or f"load-test-{user_id}",
+        "template": "custom"
+    }))
+    if status != 200:
+        recorder.session_done()
+        return
+
+    timed("GET /download", lambda: user.get("/download"))
+    for path in STUB_FILES:
+        timed("GET /preview/<path>", lambda: user.get(f"/preview/{path}"))
+    recorder.session_done()
+
+
+def run_load(
+    user_factory: Callable[[], Any],
+    users: int,
+    sessions: int,
+    ramp: float,
+    same_prompt: bool = False,
+    pids: Optional[List[int]] = None,
+    shared_key: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run `users` concurrent virtual users, each playing `sessions` sessions
+
+    Args:
+        user_factory: Returns a new virtual user (InProcessUser or HttpUser)
+        users: Number of concurrent virtual users
+        sessions: Sessions each user plays back to back
+        ramp: Users started per second (0 = all at once)
+        same_prompt: Give every session the same prompt
+        pids: Worker processes whose RSS to sample (default: this process)
+        shared_key: Send every request with this API key instead of one key
+            per user, subjecting all users to a single key's fair-share limits
+
+    Returns:
+        Report dict (see format_report)
+    """
+    recorder = Recorder()
+    pids = pids or [None]
+    rss_samples: Dict[Any, List[int]] = defaultdict(list)
+    stop = threading.Event()
+
+    def sample_rss():
+        while not stop.is_set():
+            for pid in pids:
+                rss = read_rss(pid)
+                if rss is not None:
+                    rss_samples[pid].append(rss)
+            stop.wait(0.25)
+
+    def play(user_id: int):
+        user = user_factory()
+        for session_id in range(sessions):
+            run_session(user, recorder, user_id, session_id, same_prompt, shared_key)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        futures = []
+        for user_id in range(users):
+            futures.append(executor.submit(play, user_id))
+            if ramp > 0 and user_id < users - 1:
+                time.sleep(1.0 / ramp)
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+
+    routes = {}
+    total_requests = 0
+    total_errors = 0
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        errors = recorder.errors.get(route, 0)
+        total_requests += len(values)
+        total_errors += errors
+        routes[route] = {
+            "requests": len(values),
+            "error_rate": errors / len(values),
+            "p50_ms": percentile(values, 50) * 1000,
+            "p90_ms": percentile(values, 90) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": values[-1] * 1000
+        }
+
+    return {
+        "users": users,
+        "sessions": recorder.sessions,
+        "elapsed_s": elapsed,
+        "requests": total_requests,
+        "throughput_rps": total_requests / elapsed if elapsed else 0.0,
+        "sessions_per_s": recorder.sessions / elapsed if elapsed else 0.0,
+        "error_rate": total_errors / total_requests if total_requests else 0.0,
+        "routes": routes,
+        "rss": {
+            str(pid or os.getpid()): {
+                "start_mb": samples[0] / 2**20,
+                "peak_mb": max(samples) / 2**20,
+                "end_mb": samples[-1] / 2**20
+            }
+            for pid, samples in rss_samples.items() if samples
+        }
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"{report['users']} users, {report['sessions']} sessions in {report['elapsed_s']:.2f}s",
+        f"throughput: {report['throughput_rps']:.1f} req/s, {report['sessions_per_s']:.2f} sessions/s, "
+        f"error rate: {report['error_rate']:.2%}",
+        "",
+        f"{'route':<22}{'reqs':>7}{'err%':>8}{'p50ms':>9}{'p90ms':>9}{'p99ms':>9}{'maxms':>9}"
+    ]
+    for route, r in report["routes"].items():
+        lines.append(
+            f"{route:<22}{r['requests']:>7}{r['error_rate']:>8.1%}{r['p50_ms']:>9.1f}"
+            f"{r['p90_ms']:>9.1f}{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}"
+        )
+    lines.append("")
+    for pid, rss in report["rss"].items():
+        lines.append(
+            f"worker {pid}: RSS start {rss['start_mb']:.1f} MB, "
+            f"peak {rss['peak_mb']:.1f} MB, end {rss['end_mb']:.1f} MB"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the AI Code Generator web app")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=3, help="sessions per user")
+    parser.add_argument("--ramp", type=float, default=0.0, help="users started per second (0 = all at once)")
+    parser.add_argument("--same-prompt", action="store_true", help="use one prompt for every session")
+    parser.add_argument("--shared-key", metavar="KEY",
+                        help="send every request with one API key (per-key limits and coalescing apply to all users)")
+    parser.add_argument("--url", help="test a running server instead of the app in-process")
+    parser.add_argument("--pid", type=int, action="append", help="worker PID to sample RSS for (repeatable)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        user_factory = lambda: HttpUser(args.url)
+    else:
+        from app import app
+        app.config['OPENROUTER_TRANSPORT'] = stub_transport
+        user_factory = lambda: InProcessUser(app)
+
+    report = run_load(
+        user_factory,
+        users=args.users,
+        sessions=args.sessions,
+        ramp=args.ramp,
+        same_prompt=args.same_prompt,
+        pids=args.pid,
+        shared_key=args.shared_key
+    )
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0 if report["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,16 @@ from tkinter import ttk, scrolledtext, messagebox, filedialog
 from tkinter import font as tkfont
 import os
 import json
-from openrouter_client import OpenRouterClient
+import queue
+import zipfile
+import itertools
+import threading
+from datetime import datetime
+from openrouter_client import OpenRouterClient, CancelToken, GenerationCancelled
 from generate_files import FileGenerator
+from enhanced_editor import insert_chunked
+from line_gutter import LineNumberGutter
+from project_browser import BufferCache, ProjectTree
 
 class CodeGeneratorApp:
     def __init__(self, root):
@@ -25,6 +33,28 @@ class CodeGeneratorApp:
             "anthropic/claude-2"
         ]
         
+        # Cancels a chunked preview insert still in progress
+        self.cancel_preview_load = None
+        
+        # Generation runs on a worker thread: prompts go in through job_queue,
+        # progress comes back through event_queue, polled with after()
+        self.job_queue = queue.Queue()
+        self.event_queue = queue.Queue()
+        self.job_ids = itertools.count(1)
+        self.active_job = None
+        self.pending_jobs = 0
+        # Background tasks (generations and zips) whose final event is still due
+        self.outstanding = 0
+        self.worker = None
+        self.polling = False
+        self.poll_interval_ms = 50
+        
+        # Generated project shown in the file tree; contents load on selection
+        self.generated_files = []
+        self.project_dir = None
+        self.buffers = BufferCache()
+        self.zip_in_progress = False
+        
         # Load settings
         self.settings_file = "settings.json"
         self.settings = self.load_settings()
@@ -95,6 +125,9 @@ class CodeGeneratorApp:
         self.generate_btn = ttk.Button(btn_frame, text="Generate Code", command=self.generate_code)
         self.generate_btn.pack(side=tk.LEFT, padx=5)
         
+        self.cancel_btn = ttk.Button(btn_frame, text="Cancel", command=self.cancel_generation, state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        
         self.download_btn = ttk.Button(btn_frame, text="Download Project", command=self.download_project, state=tk.DISABLED)
         self.download_btn.pack(side=tk.LEFT, padx=5)
         
@@ -102,8 +135,16 @@ class CodeGeneratorApp:
         preview_frame = ttk.LabelFrame(main_frame, text="Code Preview", padding="5")
         preview_frame.pack(fill=tk.BOTH, expand=True)
         
+        # File tree on the left, the selected file on the right
+        paned = ttk.PanedWindow(preview_frame, orient=tk.HORIZONTAL)
+        paned.pack(fill=tk.BOTH, expand=True)
+        self.project_tree = ProjectTree(paned, on_select=self.open_file, width=180)
+        text_frame = ttk.Frame(paned)
+        paned.add(self.project_tree, weight=1)
+        paned.add(text_frame, weight=4)
+        
         self.preview_text = scrolledtext.ScrolledText(
-            preview_frame, 
+            text_frame, 
             wrap=tk.NONE, 
             font=('Consolas', 10),
             bg='#f5f5f5',
@@ -115,21 +156,19 @@ class CodeGeneratorApp:
         )
         
         # Add line numbers
-        self.line_numbers = tk.Text(preview_frame, width=4, padx=3, takefocus=0, border=0,
-                                   background='#e0e0e0', state='disabled', wrap='none')
+        self.line_numbers = LineNumberGutter(text_frame, self.preview_text, background='#e0e0e0')
         self.line_numbers.pack(side=tk.LEFT, fill=tk.Y)
         
         # Add scrollbars
-        y_scroll = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=self.preview_text.yview)
-        x_scroll = ttk.Scrollbar(preview_frame, orient=tk.HORIZONTAL, command=self.preview_text.xview)
+        self.y_scroll = ttk.Scrollbar(text_frame, orient=tk.VERTICAL, command=self.preview_text.yview)
+        x_scroll = ttk.Scrollbar(text_frame, orient=tk.HORIZONTAL, command=self.preview_text.xview)
         self.preview_text.configure(yscrollcommand=self.update_scrollbars, xscrollcommand=x_scroll.set)
         
-        y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.y_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         x_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         self.preview_text.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
         
         # Bind events
-        self.preview_text.bind('<KeyRelease>', self.on_text_change)
         self.preview_text.bind('<MouseWheel>', self.on_mousewheel)
         self.preview_text.bind('<Button-4>', self.on_mousewheel)
         self.preview_text.bind('<Button-5>', self.on_mousewheel)
@@ -139,9 +178,11 @@ class CodeGeneratorApp:
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Zip progress, shown only while a zip is being written
+        self.progress = ttk.Progressbar(self.root, mode='determinate', maximum=1.0)
+        
         # Initialize
         self.update_status("Ready")
-        self.update_line_numbers()
     
     def browse_output_dir(self):
         """Open a directory selection dialog"""
@@ -149,19 +190,24 @@ class CodeGeneratorApp:
         if directory:
             self.output_dir_var.set(directory)
     
+    def show_preview(self, content):
+        """Replace the preview, inserting large content in chunks so the UI stays responsive"""
+        if self.cancel_preview_load:
+            self.cancel_preview_load()
+        self.preview_text.delete(1.0, tk.END)
+        self.cancel_preview_load = insert_chunked(self.preview_text, content)
+        self.line_numbers.schedule_redraw()
+    
     def update_status(self, message):
         """Update status bar"""
         self.status_var.set(message)
         self.root.update_idletasks()
     
-    def update_scrollbars(self, *args):
+    def update_scrollbars(self, first, last):
         """Update scrollbars and line numbers"""
-        self.preview_text.yview_moveto(args[0])
-        self.update_line_numbers()
-    
-    def on_text_change(self, event=None):
-        """Handle text changes in the preview"""
-        self.update_line_numbers()
+        self.y_scroll.set(first, last)
+        self.preview_text.vbar.set(first, last)
+        self.line_numbers.schedule_redraw()
     
     def on_mousewheel(self, event):
         """Handle mousewheel events for scrolling"""
@@ -169,29 +215,10 @@ class CodeGeneratorApp:
             self.preview_text.yview_scroll(-1, "units")
         elif event.num == 5 or event.delta < 0:
             self.preview_text.yview_scroll(1, "units")
-        self.update_line_numbers()
         return "break"
     
-    def update_line_numbers(self, event=None):
-        """Update line numbers in the preview"""
-        # Get current scroll position
-        first_visible_line = int(self.preview_text.index("@0,0").split('.')[0])
-        last_visible_line = int(self.preview_text.index(f"@0,{self.preview_text.winfo_height()}").split('.')[0])
-        
-        # Get total lines
-        line_count = int(self.preview_text.index('end-1c').split('.')[0]) if self.preview_text.get('1.0', 'end-1c') else 0
-        
-        # Update line numbers
-        self.line_numbers.config(state=tk.NORMAL)
-        self.line_numbers.delete(1.0, tk.END)
-        
-        for i in range(first_visible_line, min(last_visible_line + 2, line_count + 1)):
-            self.line_numbers.insert(tk.END, f"{i}\n")
-        
-        self.line_numbers.config(state=tk.DISABLED)
-    
     def generate_code(self):
-        """Generate code based on the prompt"""
+        """Queue generation of the prompt; the UI stays responsive while it runs"""
         prompt = self.prompt_text.get("1.0", tk.END).strip()
         if not prompt:
             messagebox.showerror("Error", "Please enter a prompt")
@@ -208,62 +235,209 @@ class CodeGeneratorApp:
         self.settings["output_dir"] = self.output_dir_var.get()
         self.save_settings()
         
-        # Set up client
-        try:
-            client = OpenRouterClient(api_key)
-            self.update_status("Generating code...")
-            self.generate_btn.config(state=tk.DISABLED)
-            self.root.update()
-            
-            # Generate code
-            self.generated_files = FileGenerator.generate_from_prompt(
-                prompt=prompt,
-                output_dir=self.settings["output_dir"],
-                client=client
-            )
-            
-            # Display first file in preview
-            if self.generated_files:
-                with open(self.generated_files[0], 'r', encoding='utf-8') as f:
-                    self.preview_text.delete(1.0, tk.END)
-                    self.preview_text.insert(tk.END, f.read())
+        job = {
+            "id": next(self.job_ids),
+            "prompt": prompt,
+            "api_key": api_key,
+            "model": self.settings["last_model"],
+            "output_dir": self.settings["output_dir"],
+            "cancel": CancelToken()
+        }
+        self.job_queue.put(job)
+        self.pending_jobs += 1
+        self.outstanding += 1
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.generation_worker, daemon=True)
+            self.worker.start()
+        
+        if self.pending_jobs > 1:
+            self.update_status(f"Prompt queued ({self.pending_jobs - 1} waiting)")
+        self.poll_events()
+    
+    def cancel_generation(self):
+        """Abort the generation in progress (queued prompts still run)"""
+        job = self.active_job
+        if job is not None:
+            job["cancel"].cancel()
+            self.update_status("Cancelling...")
+    
+    def generation_worker(self):
+        """Run queued jobs one at a time (worker thread; never touches Tk)"""
+        post = self.event_queue.put
+        while True:
+            job = self.job_queue.get()
+            self.active_job = job
+            post(("started", job, None))
+            try:
+                client = OpenRouterClient(job["api_key"])
+                result = FileGenerator.generate_from_prompt(
+                    prompt=job["prompt"],
+                    output_dir=job["output_dir"],
+                    client=client,
+                    model=job["model"],
+                    on_token=lambda text, job=job: post(("token", job, text)),
+                    cancel=job["cancel"]
+                )
+                post(("done", job, result))
+            except GenerationCancelled:
+                post(("cancelled", job, None))
+            except Exception as e:
+                post(("error", job, str(e)))
+            finally:
+                self.active_job = None
+    
+    def poll_events(self):
+        """Apply worker events on the Tk thread; reschedules itself while work is pending"""
+        if self.polling:
+            return
+        self.polling = True
+        self._poll()
+    
+    def _poll(self):
+        tokens = []
+        while True:
+            try:
+                kind, job, payload = self.event_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "token":
+                tokens.append(payload)
+                continue
+            # Flush streamed text before handling a state change
+            self.append_preview("".join(tokens))
+            tokens = []
+            self.handle_event(kind, job, payload)
+        # One insert for every token that arrived since the last poll
+        self.append_preview("".join(tokens))
+        
+        if self.outstanding == 0:
+            self.polling = False
+            self.cancel_btn.config(state=tk.DISABLED)
+        else:
+            self.root.after(self.poll_interval_ms, self._poll)
+    
+    def handle_event(self, kind, job, payload):
+        if kind.startswith("zip_"):
+            self.handle_zip_event(kind, payload)
+            return
+        if kind != "started":
+            self.pending_jobs -= 1
+            self.outstanding -= 1
+        waiting = self.pending_jobs - (kind == "started")
+        queued = f" ({waiting} queued)" if waiting else ""
+        if kind == "started":
+            if self.cancel_preview_load:
+                self.cancel_preview_load()
+                self.cancel_preview_load = None
+            self.preview_text.delete(1.0, tk.END)
+            self.line_numbers.schedule_redraw()
+            self.cancel_btn.config(state=tk.NORMAL)
+            self.update_status(f"Generating code for prompt #{job['id']}...{queued}")
+        elif kind == "cancelled":
+            self.cancel_btn.config(state=tk.DISABLED)
+            self.update_status(f"Prompt #{job['id']} cancelled{queued}")
+        elif kind == "error":
+            messagebox.showerror("Error", f"Failed to generate code: {payload}")
+            self.update_status("Error generating code")
+        elif kind == "done":
+            files = payload.get("files", [])
+            if not payload.get("success", True):
+                messagebox.showerror("Error", f"Failed to write files: {payload.get('error')}")
+                self.update_status("Error generating code")
+            elif files:
+                self.generated_files = files
+                self.project_dir = os.path.abspath(job["output_dir"])
+                # Files may have been overwritten; drop buffers read before
+                self.buffers.clear()
+                self.project_tree.set_project(self.project_dir, files)
+                # Selecting the row opens the file through open_file
+                self.project_tree.select_path(files[0])
                 
-                self.download_btn.config(state=tk.NORMAL)
-                self.update_status(f"Generated {len(self.generated_files)} files. First file: {os.path.basename(self.generated_files[0])}")
+                if not self.zip_in_progress:
+                    self.download_btn.config(state=tk.NORMAL)
+                self.update_status(f"Generated {len(files)} files. First file: {os.path.basename(files[0])}{queued}")
             else:
-                self.update_status("No files were generated")
-                
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate code: {str(e)}")
-            self.update_status("Error generating code")
-        finally:
-            self.generate_btn.config(state=tk.NORMAL)
+                self.update_status(f"No files were generated{queued}")
+    
+    def open_file(self, path):
+        """Show a project file in the preview, reading it from disk only on first use"""
+        try:
+            content = self.buffers.get(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to open {os.path.basename(path)}: {str(e)}")
+            return
+        self.show_preview(content)
+    
+    def append_preview(self, text):
+        """Append streamed text to the preview, following it if scrolled to the end"""
+        if not text:
+            return
+        at_end = self.preview_text.yview()[1] >= 1.0
+        self.preview_text.insert(tk.END, text)
+        self.line_numbers.schedule_redraw()
+        if at_end:
+            self.preview_text.see(tk.END)
     
     def download_project(self):
-        """Create a zip file of the generated project"""
-        if not hasattr(self, 'generated_files') or not self.generated_files:
+        """Create a zip file of the generated project on a background thread"""
+        if not self.generated_files:
             messagebox.showerror("Error", "No files to download")
             return
+        if self.zip_in_progress:
+            return
         
+        # Create zip filename with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        zip_filename = os.path.join(self.project_dir, f"generated_project_{timestamp}.zip")
+        
+        self.zip_in_progress = True
+        self.download_btn.config(state=tk.DISABLED)
+        self.progress['value'] = 0
+        self.progress.pack(side=tk.BOTTOM, fill=tk.X)
+        self.update_status("Creating zip file...")
+        
+        self.outstanding += 1
+        threading.Thread(
+            target=self.zip_worker,
+            args=(list(self.generated_files), self.project_dir, zip_filename),
+            daemon=True
+        ).start()
+        self.poll_events()
+    
+    def zip_worker(self, files, base_dir, zip_filename):
+        """Write the project zip, posting progress by bytes (worker thread; never touches Tk)"""
+        post = self.event_queue.put
         try:
-            import zipfile
-            from datetime import datetime
-            
-            # Create zip filename with timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            zip_filename = os.path.join(os.path.dirname(self.generated_files[0]), f"generated_project_{timestamp}.zip")
-            
+            sizes = [os.path.getsize(file) for file in files]
+            total = sum(sizes) or 1
+            written = 0
+            reported = 0.0
             with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for file in self.generated_files:
-                    # Calculate the relative path for the zip file
-                    rel_path = os.path.relpath(file, os.path.dirname(self.generated_files[0]))
-                    zipf.write(file, rel_path)
-            
-            messagebox.showinfo("Success", f"Project saved as {zip_filename}")
-            self.update_status(f"Project saved as {os.path.basename(zip_filename)}")
-            
+                for file, size in zip(files, sizes):
+                    # Store paths relative to the project directory
+                    zipf.write(file, os.path.relpath(file, base_dir))
+                    written += size
+                    # At most ~100 progress events, however many files there are
+                    if written / total - reported >= 0.01:
+                        reported = written / total
+                        post(("zip_progress", None, reported))
+            post(("zip_done", None, zip_filename))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to create zip file: {str(e)}")
+            post(("zip_error", None, str(e)))
+    
+    def handle_zip_event(self, kind, payload):
+        if kind == "zip_progress":
+            self.progress['value'] = payload
+            return
+        self.outstanding -= 1
+        self.zip_in_progress = False
+        self.progress.pack_forget()
+        self.download_btn.config(state=tk.NORMAL)
+        if kind == "zip_done":
+            messagebox.showinfo("Success", f"Project saved as {payload}")
+            self.update_status(f"Project saved as {os.path.basename(payload)}")
+        else:
+            messagebox.showerror("Error", f"Failed to create zip file: {payload}")
             self.update_status("Error creating zip file")
 
 def main():
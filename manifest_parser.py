@@ -0,0 +1,217 @@
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# Schema for the structured file-manifest output mode
+MANIFEST_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "files": {
+            "type": "object",
+            "description": "Map of file path (forward slashes) to complete file content",
+            "additionalProperties": {"type": "string"}
+        }
+    },
+    "required": ["files"]
+}
+
+MANIFEST_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "file_manifest", "schema": MANIFEST_SCHEMA}
+}
+
+# Extensionless names that are still obviously files
+_BARE_FILENAMES = {'Dockerfile', 'Makefile', 'Procfile', 'LICENSE', '.env', '.gitignore'}
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+Path = Tuple[Union[str, int], ...]
+
+
+class StreamingJSONParser:
+    """
+    Incremental JSON parser that reports each scalar value as soon as it is complete
+
+    Text can be fed in arbitrary chunks (e.g. streamed tokens). Anything before
+    the first '{' or '[' (prose, a ```json fence) is ignored, as is anything
+    after the root value closes.
+    """
+
+    def __init__(self):
+        # Each frame: [container, key_or_index, awaiting_key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._unicode: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._chars: List[str] = []
+        self._literal: List[str] = []
+        self.started = False
+        self.done = False
+
+    def _path(self) -> Path:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _value(self, value: Any, events: List[Tuple[Path, Any]]) -> None:
+        if not self._stack:
+            self.done = True
+            return
+        frame = self._stack[-1]
+        if frame[0] == 'obj' and frame[2]:
+            frame[1] = value
+            return
+        events.append((self._path(), value))
+
+    def _end_literal(self, events: List[Tuple[Path, Any]]) -> None:
+        if not self._literal:
+            return
+        text = ''.join(self._literal)
+        self._literal = []
+        if text in ('true', 'false', 'null'):
+            value = {'true': True, 'false': False, 'null': None}[text]
+        else:
+            try:
+                value = float(text) if any(c in text for c in '.eE') else int(text)
+            except ValueError:
+                raise ValueError(f"Invalid JSON literal: {text!r}")
+        self._value(value, events)
+
+    def _string_char(self, char: str) -> None:
+        code = ord(char)
+        if self._high_surrogate is not None:
+            high, self._high_surrogate = self._high_surrogate, None
+            if 0xDC00 <= code <= 0xDFFF:
+                self._chars.append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+                return
+            self._chars.append(chr(high))
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return
+        self._chars.append(char)
+
+    def feed(self, text: str) -> List[Tuple[Path, Any]]:
+        """
+        Consume a chunk of text
+
+        Returns:
+            List of (path, value) for scalar values completed in this chunk,
+            where path is the tuple of object keys / array indexes leading to it
+        """
+        events: List[Tuple[Path, Any]] = []
+        for char in text:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._unicode is not None:
+                    self._unicode += char
+                    if len(self._unicode) == 4:
+                        self._string_char(chr(int(self._unicode, 16)))
+                        self._unicode = None
+                elif self._escape:
+                    self._escape = False
+                    if char == 'u':
+                        self._unicode = ''
+                    else:
+                        self._string_char(_ESCAPES.get(char, char))
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._high_surrogate is not None:
+                        self._chars.append(chr(self._high_surrogate))
+                        self._high_surrogate = None
+                    value = ''.join(self._chars)
+                    self._chars = []
+                    self._value(value, events)
+                else:
+                    self._string_char(char)
+                continue
+
+            if not self.started:
+                if char not in '{[':
+                    continue
+                self.started = True
+
+            if char in ' \t\r\n':
+                self._end_literal(events)
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._stack.append(['obj', None, True])
+            elif char == '[':
+                self._stack.append(['arr', 0, False])
+            elif char == ':':
+                self._stack[-1][2] = False
+            elif char == ',':
+                self._end_literal(events)
+                frame = self._stack[-1]
+                if frame[0] == 'obj':
+                    frame[2] = True
+                else:
+                    frame[1] += 1
+            elif char in '}]':
+                self._end_literal(events)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            else:
+                self._literal.append(char)
+        return events
+
+
+class ManifestParser:
+    """
+    Assemble a {path: content} manifest from a streamed JSON response
+
+    Accepts {"files": {path: content}}, {"files": [{"path": ..., "content": ...}]}
+    and a bare top-level {path: content} object. Files become available as
+    soon as their content string closes, so a truncated response still yields
+    every file completed before the cut.
+    """
+
+    def __init__(self):
+        self._parser = StreamingJSONParser()
+        self._items: Dict[int, Dict[str, Any]] = {}
+        self.files: Dict[str, str] = {}
+        self.error: Optional[str] = None
+
+    def feed(self, text: str) -> List[str]:
+        """Consume a chunk; returns the paths of files completed by it"""
+        if self.error:
+            return []
+        try:
+            events = self._parser.feed(text)
+        except (ValueError, IndexError, TypeError) as e:
+            self.error = str(e) or "Malformed JSON"
+            return []
+
+        completed = []
+        for path, value in events:
+            if not isinstance(value, str):
+                continue
+            if len(path) == 2 and path[0] == 'files' and isinstance(path[1], str):
+                self.files[path[1]] = value
+                completed.append(path[1])
+            elif len(path) == 3 and path[0] == 'files' and isinstance(path[1], int):
+                item = self._items.setdefault(path[1], {})
+                item[path[2]] = value
+                if 'path' in item and 'content' in item:
+                    self.files[item['path']] = item['content']
+                    completed.append(item['path'])
+            elif len(path) == 1 and isinstance(path[0], str) and (
+                '.' in path[0] or '/' in path[0] or path[0] in _BARE_FILENAMES
+            ):
+                self.files[path[0]] = value
+                completed.append(path[0])
+        return completed
+
+    @property
+    def complete(self) -> bool:
+        """True once the root JSON value has closed without errors"""
+        return self._parser.done and not self.error
+
+    @classmethod
+    def parse(cls, text: str) -> 'ManifestParser':
+        """Parse a whole response at once"""
+        parser = cls()
+        parser.feed(text)
+        return parser
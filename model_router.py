@@ -0,0 +1,194 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+AUTO_MODEL = "auto"
+
+
+class ModelStats:
+    """Exponentially weighted moving averages of one model's observed performance"""
+
+    def __init__(self, alpha: float, ttft: float, tokens_per_second: float):
+        self.alpha = alpha
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = 0.0
+        self.samples = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.routed = 0
+
+    def _ewma(self, current: float, value: float) -> float:
+        # The first real observation replaces the prior outright
+        return value if self.samples == 0 else current + self.alpha * (value - current)
+
+    def record_success(self, ttft: float, tokens_per_second: Optional[float]) -> None:
+        self.ttft = self._ewma(self.ttft, ttft)
+        if tokens_per_second:
+            self.tokens_per_second = self._ewma(self.tokens_per_second, tokens_per_second)
+        self.error_rate += self.alpha * (0.0 - self.error_rate)
+        self.samples += 1
+
+    def record_error(self) -> None:
+        self.error_rate += self.alpha * (1.0 - self.error_rate)
+        self.errors += 1
+
+    def expected_latency(self, expected_tokens: int) -> float:
+        """Expected seconds to a complete response, inflated by the retry cost of errors"""
+        latency = self.ttft + expected_tokens / max(self.tokens_per_second, 1e-3)
+        return latency / max(1.0 - self.error_rate, 0.05)
+
+
+class ModelRouter:
+    """
+    Route "auto" requests to the fastest model that meets a capability tier
+
+    Performance is learned from our own traffic: every completion reports its
+    time-to-first-token, throughput and outcome, which feed per-model EWMAs.
+    Each model also has a concurrency cap; a capped model is skipped, and if
+    every eligible model is capped the caller waits for a slot.
+    """
+
+    def __init__(
+        self,
+        models: List[Dict[str, Any]],
+        alpha: float = 0.2,
+        expected_tokens: int = 1500,
+        default_ttft: float = 2.0,
+        default_tokens_per_second: float = 40.0,
+        default_max_concurrency: int = 8
+    ):
+        """
+        Args:
+            models: Dicts with "id", optional "tier" (higher is more capable)
+                and optional "max_concurrency"
+            alpha: EWMA smoothing factor (weight of the newest observation)
+            expected_tokens: Completion length assumed when comparing models
+            default_ttft: Prior time-to-first-token for unobserved models
+            default_tokens_per_second: Prior throughput for unobserved models
+            default_max_concurrency: Cap for models that do not set one
+        """
+        self.expected_tokens = expected_tokens
+        self._condition = threading.Condition()
+        self._tiers = {m["id"]: m.get("tier", 1) for m in models}
+        self._caps = {m["id"]: m.get("max_concurrency", default_max_concurrency) for m in models}
+        self._stats = {
+            m["id"]: ModelStats(alpha, default_ttft, default_tokens_per_second)
+            for m in models
+        }
+        self._decisions = 0
+        self._waits = 0
+
+    def choose(self, min_tier: int = 1, exclude: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Return the fastest eligible model with a free slot, or None if all are busy"""
+        with self._condition:
+            return self._choose(min_tier, exclude)
+
+    def _choose(self, min_tier: int, exclude: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        candidates = [
+            model for model, tier in self._tiers.items()
+            if tier >= min_tier and self._stats[model].in_flight < self._caps[model]
+        ]
+        if exclude is not None:
+            # Never exclude everything; a degraded model beats no model at all
+            candidates = [m for m in candidates if not exclude(m)] or candidates
+        if not candidates:
+            return None
+        return min(candidates, key=lambda m: self._stats[m].expected_latency(self.expected_tokens))
+
+    @contextmanager
+    def route(
+        self,
+        min_tier: int = 1,
+        timeout: float = 30.0,
+        exclude: Optional[Callable[[str], bool]] = None
+    ) -> Iterator[str]:
+        """
+        Reserve a slot on the best model for the duration of a request
+
+        Args:
+            min_tier: Minimum capability tier
+            timeout: Seconds to wait for a free slot
+            exclude: Predicate for models to avoid (e.g. open circuits)
+
+        Raises:
+            ValueError: If no configured model meets the tier
+            TimeoutError: If every eligible model stays at its cap for `timeout`
+        """
+        if not any(tier >= min_tier for tier in self._tiers.values()):
+            raise ValueError(f"No model configured for capability tier {min_tier}")
+
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            model = self._choose(min_tier, exclude)
+            while model is None:
+                self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("All eligible models are at their concurrency cap")
+                self._condition.wait(remaining)
+                model = self._choose(min_tier, exclude)
+            stats = self._stats[model]
+            stats.in_flight += 1
+            stats.routed += 1
+            self._decisions += 1
+        try:
+            yield model
+        finally:
+            with self._condition:
+                stats.in_flight -= 1
+                self._condition.notify()
+
+    def record(
+        self,
+        model: str,
+        ttft: Optional[float] = None,
+        tokens: Optional[int] = None,
+        duration: Optional[float] = None,
+        error: bool = False
+    ) -> None:
+        """
+        Record the outcome of one upstream completion
+
+        Args:
+            model: Model id the request went to
+            ttft: Seconds until the first token arrived
+            tokens: Completion tokens received
+            duration: Total seconds for the request
+            error: Whether the request failed
+        """
+        with self._condition:
+            stats = self._stats.get(model)
+            if stats is None:
+                return
+            if error:
+                stats.record_error()
+                return
+            tokens_per_second = None
+            if tokens and duration and ttft is not None and duration > ttft:
+                tokens_per_second = tokens / (duration - ttft)
+            stats.record_success(ttft if ttft is not None else (duration or 0.0), tokens_per_second)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model EWMAs, load and routing counters"""
+        with self._condition:
+            return {
+                "decisions": self._decisions,
+                "waits": self._waits,
+                "models": {
+                    model: {
+                        "tier": self._tiers[model],
+                        "ttft": round(s.ttft, 3),
+                        "tokens_per_second": round(s.tokens_per_second, 1),
+                        "error_rate": round(s.error_rate, 3),
+                        "expected_latency": round(s.expected_latency(self.expected_tokens), 3),
+                        "samples": s.samples,
+                        "errors": s.errors,
+                        "in_flight": s.in_flight,
+                        "max_concurrency": self._caps[model],
+                        "routed": s.routed
+                    }
+                    for model, s in self._stats.items()
+                }
+            }
@@ -1,14 +1,157 @@
 import os
+import re
+import json
+import time
+import socket
+import hashlib
+import threading
 import requests
-from typing import Dict, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from singleflight import SingleFlight
+from model_router import AUTO_MODEL
+from circuit_breaker import CircuitBreakerRegistry
+from cassette import transport_from_env
+from prompt_cache import PromptCacheStats, add_cache_hints
+
+class OpenRouterError(Exception):
+    """Raised when a completion fails; status_code is None for network errors and timeouts"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+    
+    @property
+    def upstream_fault(self) -> bool:
+        """Whether the failure reflects the model's health rather than the request itself"""
+        return self.status_code is None or self.status_code >= 500 or self.status_code in (408, 429)
+
+class GenerationCancelled(OpenRouterError):
+    """Raised when a generation is aborted through its CancelToken"""
+    
+    def __init__(self, message: str = "Generation cancelled"):
+        super().__init__(message, 499)
+
+class CancelToken:
+    """
+    Aborts an in-flight generation from another thread
+    
+    Pass one to generate_code(cancel=...). cancel() shuts down the socket
+    of the streaming response, so a worker blocked waiting for the next
+    chunk fails immediately with GenerationCancelled instead of waiting
+    for the read timeout. A request still waiting for its response
+    headers is aborted as soon as they arrive.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._response = None
+    
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+    
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            response = self._response
+        if response is not None:
+            self._abort(response)
+    
+    def attach(self, response) -> None:
+        """Register the response currently being streamed (called by the client)"""
+        with self._lock:
+            self._response = response
+            cancelled = self._cancelled
+        if cancelled:
+            self._abort(response)
+    
+    def detach(self) -> None:
+        with self._lock:
+            self._response = None
+    
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled:
+            raise GenerationCancelled()
+    
+    @staticmethod
+    def _abort(response) -> None:
+        # Closing the response alone does not wake a thread blocked in recv()
+        sock = getattr(getattr(getattr(response, "raw", None), "connection", None), "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            response.close()
+        except Exception:
+            pass
 
 class OpenRouterClient:
     BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+    CONTINUATION_PROMPT = (
+        "Your previous response was cut off. Continue exactly where it stopped, "
+        "mid-line if necessary. Do not repeat anything or add any commentary."
+    )
+    
+    # Shared by every client in the process so identical prompts submitted at
+    # the same moment with the same API key (e.g. a whole class on the
+    # instructor's key picking the same template) coalesce into one upstream call
+    _single_flight = SingleFlight()
+    
+    # Model health is shared across clients for the same reason
+    _breakers = CircuitBreakerRegistry()
+    
+    # Cached prompt tokens reported back by providers, per model
+    _prompt_cache = PromptCacheStats()
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        coalesce: bool = True,
+        router=None,
+        fallbacks: Optional[Dict[str, List[str]]] = None,
+        timeout: Tuple[float, float] = (10.0, 60.0),
+        transport: Optional[Callable] = None
+    ):
+        """
+        Args:
+            api_key: OpenRouter API key (defaults to OPENROUTER_API_KEY)
+            coalesce: Share one upstream call between identical concurrent requests
+            router: Optional ModelRouter; resolves model="auto" and receives
+                latency/throughput/error observations for every completion
+            fallbacks: Models to try, in order, when a model fails or its
+                circuit is open (e.g. {"openai/gpt-4": ["google/gemini-pro"]})
+            timeout: (connect, read) timeouts in seconds; the read timeout
+                applies to each gap between streamed chunks
+            transport: Callable with the signature of requests.post used to
+                send requests (e.g. Cassette.post); defaults to the cassette
+                configured by OPENROUTER_CASSETTE, else requests.post
+        """
         self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OpenRouter API key not provided and not found in environment variables")
+        self.coalesce = coalesce
+        self.router = router
+        self.fallbacks = fallbacks or {}
+        self.timeout = timeout
+        self.transport = transport or transport_from_env()
+    
+    @classmethod
+    def coalescing_stats(cls) -> Dict[str, int]:
+        """Return single-flight counters (executed, coalesced, in-flight calls)"""
+        return cls._single_flight.stats()
+    
+    @classmethod
+    def circuit_stats(cls) -> Dict[str, Dict]:
+        """Return per-model circuit breaker state and transition counts"""
+        return cls._breakers.stats()
+    
+    @classmethod
+    def prompt_cache_stats(cls) -> Dict[str, Dict]:
+        """Return per-model cached prompt tokens and time to first token with and without a cache hit"""
+        return cls._prompt_cache.stats()
     
     def generate_code(
         self, 
@@ -20,7 +163,13 @@ class OpenRouterClient:
         top_p: float = 1.0,
         frequency_penalty: float = 0.0,
         presence_penalty: float = 0.0,
-        stop: list = None
+        stop: list = None,
+        max_continuations: int = 3,
+        min_tier: int = 1,
+        response_format: Optional[Dict] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None,
+        prompt_prefix: Optional[str] = None
     ) -> str:
         """
         Generate code using the specified model with advanced parameters
@@ -35,9 +184,25 @@ class OpenRouterClient:
             frequency_penalty: Penalize new tokens based on frequency (-2.0 to 2.0)
             presence_penalty: Penalize new tokens based on presence (-2.0 to 2.0)
             stop: List of strings that stop generation when encountered
+            max_continuations: How many follow-up requests to issue when the
+                completion is cut off by max_tokens (0 disables continuation)
+            min_tier: Minimum capability tier when model is "auto"
+            response_format: Optional structured output spec passed through
+                to the API (e.g. {"type": "json_object"} or a json_schema)
+            on_token: Called with each piece of text as it streams in; such
+                requests are never coalesced, as only one caller could
+                receive the stream
+            cancel: Optional CancelToken to abort the request from another
+                thread; such requests are never coalesced either
+            prompt_prefix: Optional text shared by many requests (e.g. template
+                instructions), sent before prompt so that, with the system
+                prompt, it forms a cacheable prefix
             
         Returns:
             str: The generated code
+            
+        Raises:
+            GenerationCancelled: If cancel was triggered
         """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
@@ -49,7 +214,14 @@ class OpenRouterClient:
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
-        messages.append({"role": "user", "content": prompt})
+        if prompt_prefix:
+            # Separate parts so the prefix can carry its own cache breakpoint
+            messages.append({"role": "user", "content": [
+                {"type": "text", "text": prompt_prefix},
+                {"type": "text", "text": prompt}
+            ]})
+        else:
+            messages.append({"role": "user", "content": prompt})
         
         data = {
             "model": model,
@@ -59,21 +231,251 @@ class OpenRouterClient:
             "top_p": max(0.1, min(1.0, top_p)),
             "frequency_penalty": max(-2.0, min(2.0, frequency_penalty)),
             "presence_penalty": max(-2.0, min(2.0, presence_penalty)),
+            # Have the final stream chunk report (cached) token counts and cost
+            "usage": {"include": True}
         }
         
         if stop:
             data["stop"] = stop[:4]  # Limit to 4 stop sequences
         
+        if response_format:
+            data["response_format"] = response_format
+        
+        if model == AUTO_MODEL and self.router is None:
+            raise ValueError("model='auto' requires a client created with a router")
+        
+        def run():
+            if model != AUTO_MODEL:
+                return self._generate_with_fallback(headers, data, max_continuations, on_token, cancel)
+            with self.router.route(min_tier, exclude=self._breakers.is_open) as routed_model:
+                return self._generate_with_fallback(
+                    headers, dict(data, model=routed_model), max_continuations, on_token, cancel
+                )
+        
+        if not self.coalesce or on_token is not None or cancel is not None:
+            return run()
+        
+        # The API key is part of the key: a caller must neither inherit another
+        # key's auth or quota error nor be served a completion billed to it
+        key = hashlib.sha256(
+            json.dumps([self.api_key, data, max_continuations, min_tier], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        return self._single_flight.do(key, run)
+    
+    def _generate_with_fallback(
+        self,
+        headers: Dict[str, str],
+        data: Dict,
+        max_continuations: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> str:
+        """
+        Try the requested model, then its fallback chain
+        
+        Models whose circuit is open are skipped without a request, so a
+        degraded model fails over immediately instead of holding a worker
+        until the timeout. Once text has been streamed to on_token a failure
+        is raised instead, since the caller has already consumed part of it.
+        """
+        chain = [data["model"]] + [m for m in self.fallbacks.get(data["model"], []) if m != data["model"]]
+        streamed = []
+        if on_token is not None:
+            def emit(text: str) -> None:
+                streamed.append(True)
+                on_token(text)
+        else:
+            emit = None
+        last_error = None
+        for model in chain:
+            breaker = self._breakers.get(model)
+            if not breaker.allow_request():
+                last_error = OpenRouterError(f"Error generating code: circuit open for {model}", 503)
+                continue
+            recorded = False
+            try:
+                content = self._generate(headers, dict(data, model=model), max_continuations, emit, cancel)
+            except GenerationCancelled:
+                raise
+            except OpenRouterError as e:
+                recorded = True
+                if not e.upstream_fault:
+                    # The request itself is bad (auth, validation); another model won't help
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if streamed:
+                    raise
+                last_error = e
+                continue
+            else:
+                recorded = True
+                breaker.record_success()
+                return content
+            finally:
+                if not recorded:
+                    # Cancelled or failed locally: no verdict on the model
+                    breaker.release_probe()
+        raise last_error
+    
+    def _generate(
+        self,
+        headers: Dict[str, str],
+        data: Dict,
+        max_continuations: int,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> str:
+        """Run a completion, resuming it while it is truncated by max_tokens"""
+        messages = data["messages"]
+        content, finish_reason = self._complete(headers, data, on_token, cancel)
+        
+        # Resume truncated completions instead of returning a partial response
+        continuations = 0
+        while finish_reason == "length" and continuations < max_continuations:
+            continuations += 1
+            tail, finish_reason = self._complete(headers, dict(data, messages=messages + [
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": self.CONTINUATION_PROMPT}
+            ]), cancel=cancel)
+            if not tail:
+                break
+            stitched = self.stitch_continuation(content, tail)
+            if on_token is not None and len(stitched) > len(content):
+                # Emit only the de-duplicated tail so streamed text matches the result
+                on_token(stitched[len(content):])
+            content = stitched
+        
+        return content
+    
+    def _complete(
+        self,
+        headers: Dict[str, str],
+        data: Dict,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Send one streamed chat completion request and return (content, finish_reason)
+        
+        The response is consumed as server-sent events so time-to-first-token
+        and throughput can be measured and reported to the router.
+        """
+        if cancel is not None:
+            cancel.raise_if_cancelled()
+        start = time.monotonic()
+        ttft = None
+        parts = []
+        finish_reason = None
+        usage = None
+        response = None
         try:
-            response = requests.post(
+            response = (self.transport or requests.post)(
                 self.BASE_URL,
                 headers=headers,
-                json=data
+                json=dict(data, messages=add_cache_hints(data["messages"], data["model"]), stream=True),
+                stream=True,
+                timeout=self.timeout
             )
+            if cancel is not None:
+                cancel.attach(response)
             response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"Error generating code: {str(e)}")
+            response.encoding = "utf-8"
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank keep-alives and ": OPENROUTER PROCESSING" comments
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[5:].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    error = chunk["error"]
+                    raise OpenRouterError(
+                        f"Error generating code: {error.get('message', error)}",
+                        error.get("code") if isinstance(error.get("code"), int) else 502
+                    )
+                usage = chunk.get("usage") or usage
+                if not chunk.get("choices"):
+                    continue
+                choice = chunk["choices"][0]
+                delta = (choice.get("delta") or {}).get("content")
+                if delta:
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    parts.append(delta)
+                    if on_token is not None:
+                        on_token(delta)
+                finish_reason = choice.get("finish_reason") or finish_reason
+            if cancel is not None:
+                # An aborted stream can also just end early
+                cancel.raise_if_cancelled()
+        except (requests.exceptions.RequestException, ValueError, OpenRouterError) as e:
+            if cancel is not None and cancel.cancelled:
+                # Not the model's fault: no error is recorded against it
+                raise GenerationCancelled() from e
+            if self.router:
+                self.router.record(data["model"], error=True)
+            if isinstance(e, OpenRouterError):
+                raise
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is None and isinstance(e, ValueError):
+                status = 502  # Malformed stream from upstream
+            raise OpenRouterError(f"Error generating code: {str(e)}", status)
+        finally:
+            if cancel is not None:
+                cancel.detach()
+            if response is not None:
+                # We stop reading at [DONE]; closing returns the connection to the pool
+                response.close()
+        
+        content = "".join(parts)
+        self._prompt_cache.record(data["model"], usage, ttft)
+        if self.router:
+            tokens = (usage or {}).get("completion_tokens") or len(content) // 4
+            self.router.record(
+                data["model"],
+                ttft=ttft,
+                tokens=tokens,
+                duration=time.monotonic() - start
+            )
+        return content, finish_reason
+    
+    @staticmethod
+    def stitch_continuation(
+        content: str,
+        tail: str,
+        min_overlap: int = 16,
+        max_overlap: int = 500
+    ) -> str:
+        """
+        Join a continuation onto a truncated completion
+        
+        Models resuming mid-block sometimes reopen the code fence or repeat the
+        last few characters they already produced; both are trimmed so the
+        result reads as one uninterrupted response.
+        
+        Args:
+            content: The truncated completion so far
+            tail: The continuation response
+            min_overlap: Shortest repeated prefix treated as a repeat (shorter
+                matches are usually coincidence)
+            max_overlap: Longest repeated prefix to look for
+            
+        Returns:
+            str: The stitched completion
+        """
+        # Inside an unterminated code block: drop a reopened fence
+        if content.count("```") % 2 == 1:
+            tail = re.sub(r'^\s*```[a-zA-Z0-9_+-]*[ \t]*\n', '', tail, count=1)
+        
+        # Drop text the model repeated from the end of the previous chunk
+        for size in range(min(max_overlap, len(content), len(tail)), min_overlap - 1, -1):
+            if content.endswith(tail[:size]):
+                tail = tail[size:]
+                break
+        
+        return content + tail
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,187 @@
+import os
+import tkinter as tk
+from tkinter import ttk
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+
+class BufferCache:
+    """
+    LRU of file contents, bounded by entry count and total characters
+
+    Files are read from disk the first time they are requested and served
+    from memory afterwards, so flipping between recently opened files costs
+    no I/O. The least recently used buffers are evicted first.
+    """
+
+    def __init__(self, max_buffers: int = 32, max_chars: int = 8_000_000):
+        self.max_buffers = max_buffers
+        self.max_chars = max_chars
+        self._buffers: "OrderedDict[str, str]" = OrderedDict()
+        self._chars = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: str) -> str:
+        """
+        Contents of a file, read on first use
+
+        Raises:
+            OSError: If the file cannot be read
+        """
+        content = self._buffers.get(path)
+        if content is not None:
+            self.hits += 1
+            self._buffers.move_to_end(path)
+            return content
+        self.misses += 1
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            content = f.read()
+        self.put(path, content)
+        return content
+
+    def put(self, path: str, content: str) -> None:
+        previous = self._buffers.pop(path, None)
+        if previous is not None:
+            self._chars -= len(previous)
+        self._buffers[path] = content
+        self._chars += len(content)
+        # Always keep the newest buffer, even if it alone exceeds max_chars
+        while len(self._buffers) > 1 and (
+            len(self._buffers) > self.max_buffers or self._chars > self.max_chars
+        ):
+            _, evicted = self._buffers.popitem(last=False)
+            self._chars -= len(evicted)
+
+    def clear(self) -> None:
+        self._buffers.clear()
+        self._chars = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffers": len(self._buffers),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class ProjectTree(ttk.Treeview):
+    """
+    File tree over a generated project
+
+    The directory structure is built from the list of generated files (no
+    disk scan), and a directory's rows are only inserted when it is first
+    expanded. Selecting a file calls on_select with its absolute path; the
+    tree itself never reads file contents.
+    """
+
+    # Suffix of the dummy row under an unexpanded directory; never part of a real path
+    _PLACEHOLDER = "//"
+
+    def __init__(self, master: tk.Misc, on_select: Optional[Callable[[str], None]] = None, **kwargs):
+        kwargs.setdefault('show', 'tree')
+        kwargs.setdefault('selectmode', 'browse')
+        super().__init__(master, **kwargs)
+        self.on_select = on_select
+        self.root_dir = ""
+        self._children: Dict[str, Dict[str, bool]] = {}
+
+        self.bind('<<TreeviewOpen>>', self._on_open)
+        self.bind('<<TreeviewSelect>>', self._on_select)
+
+    def set_project(self, root_dir: str, files: Iterable[str]) -> None:
+        """
+        Show a project
+
+        Args:
+            root_dir: Project directory; rows are labelled relative to it
+            files: Absolute paths of the project's files
+        """
+        self.root_dir = os.path.abspath(root_dir)
+        self.delete(*self.get_children())
+
+        # {directory relpath: {child relpath: is_directory}}
+        children: Dict[str, Dict[str, bool]] = {"": {}}
+        for path in files:
+            rel = os.path.relpath(os.path.abspath(path), self.root_dir).replace(os.sep, '/')
+            parts = rel.split('/')
+            parent = ""
+            for depth, part in enumerate(parts):
+                node = f"{parent}/{part}" if parent else part
+                is_dir = depth < len(parts) - 1
+                children[parent].setdefault(node, is_dir)
+                if is_dir:
+                    children.setdefault(node, {})
+                parent = node
+        self._children = children
+        self._populate("")
+
+    def _populate(self, parent: str) -> None:
+        if parent and self.exists(parent + self._PLACEHOLDER):
+            self.delete(parent + self._PLACEHOLDER)
+        # Directories first, then files, each alphabetically
+        entries = sorted(self._children.get(parent, {}).items(), key=lambda e: (not e[1], e[0].lower()))
+        for node, is_dir in entries:
+            self.insert(parent, 'end', iid=node, text=node.rsplit('/', 1)[-1], open=False)
+            if is_dir:
+                # Makes the row expandable without inserting its contents
+                self.insert(node, 'end', iid=node + self._PLACEHOLDER, text="")
+
+    def _on_open(self, event=None) -> None:
+        node = self.focus()
+        if node and self.exists(node + self._PLACEHOLDER):
+            self._populate(node)
+
+    def _on_select(self, event=None) -> None:
+        selection = self.selection()
+        if not selection or self.on_select is None:
+            return
+        node = selection[0]
+        if node in self._children or node.endswith(self._PLACEHOLDER):
+            return  # a directory
+        self.on_select(os.path.join(self.root_dir, *node.split('/')))
+
+    def select_path(self, path: str) -> None:
+        """Reveal and select a file, expanding its parent directories"""
+        node = os.path.relpath(os.path.abspath(path), self.root_dir).replace(os.sep, '/')
+        parts = node.split('/')
+        for depth in range(1, len(parts)):
+            parent = '/'.join(parts[:depth])
+            if self.exists(parent + self._PLACEHOLDER):
+                self._populate(parent)
+            self.item(parent, open=True)
+        if self.exists(node):
+            self.see(node)
+            self.selection_set(node)
+
+
+class SymbolOutline(ttk.Treeview):
+    """
+    Outline of the classes, functions and routes in an EnhancedTextEditor
+
+    Refreshed from the editor's <<SymbolsChanged>> event, so it only changes
+    when a background parse finishes; selecting a row jumps to the symbol.
+    """
+
+    def __init__(self, master: tk.Misc, editor, **kwargs):
+        kwargs.setdefault('show', 'tree')
+        kwargs.setdefault('selectmode', 'browse')
+        super().__init__(master, **kwargs)
+        self.editor = editor
+        editor.bind('<<SymbolsChanged>>', self.refresh, add='+')
+        self.bind('<<TreeviewSelect>>', self._on_select)
+
+    def refresh(self, event=None) -> None:
+        self.delete(*self.get_children())
+        rows: Dict[str, str] = {}
+        for i, symbol in enumerate(self.editor.symbols):
+            parent = rows.get(symbol.qualname.rpartition('.')[0], "")
+            label = f"{symbol.detail}  ({symbol.name})" if symbol.kind == "route" else symbol.name
+            iid = self.insert(parent, 'end', iid=str(i), text=label, open=symbol.kind == "class")
+            rows.setdefault(symbol.qualname, iid)
+
+    def _on_select(self, event=None) -> None:
+        selection = self.selection()
+        if selection:
+            self.editor.goto_symbol(int(selection[0]))
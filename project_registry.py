@@ -0,0 +1,166 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    project_dir TEXT NOT NULL,
+    zip_path TEXT,
+    file_count INTEGER NOT NULL,
+    total_size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_by_session ON projects (session_id, created_at);
+CREATE TABLE IF NOT EXISTS files (
+    project_id TEXT NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (project_id, path)
+) WITHOUT ROWID;
+"""
+
+
+def file_sha256(path: Union[str, Path], chunk_size: int = 1 << 16) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ProjectRegistry:
+    """
+    Server-side record of which projects belong to which browser session
+
+    Backed by SQLite in WAL mode so several worker processes can share one
+    database file: readers never block the writer, and every lookup the web
+    routes make (latest project for a session, one file of a project) is an
+    indexed point query. Each thread gets its own connection.
+    """
+
+    def __init__(self, path: Union[str, Path], busy_timeout: float = 5.0):
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        with conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def register(
+        self,
+        session_id: str,
+        project_id: str,
+        project_dir: Union[str, Path],
+        files: List[str],
+        zip_path: Optional[Union[str, Path]] = None
+    ) -> Dict[str, Any]:
+        """
+        Record a generated project and its file manifest
+
+        Args:
+            session_id: Browser session the project belongs to
+            project_id: Unique project id (the project directory name)
+            project_dir: Directory the files were written to
+            files: Absolute paths of the project's files
+            zip_path: Downloadable archive of the project, if any
+
+        Returns:
+            The stored project row as a dict
+        """
+        project_dir = os.path.abspath(project_dir)
+        manifest = []
+        for path in files:
+            relpath = os.path.relpath(path, project_dir).replace(os.sep, '/')
+            manifest.append((project_id, relpath, os.path.getsize(path), file_sha256(path)))
+
+        row = {
+            "id": project_id,
+            "session_id": session_id,
+            "project_dir": project_dir,
+            "zip_path": str(zip_path) if zip_path else None,
+            "file_count": len(manifest),
+            "total_size": sum(m[2] for m in manifest),
+            "created_at": time.time()
+        }
+
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front instead of failing mid-transaction
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO projects VALUES "
+                "(:id, :session_id, :project_dir, :zip_path, :file_count, :total_size, :created_at)",
+                row
+            )
+            conn.execute("DELETE FROM files WHERE project_id = ?", (project_id,))
+            conn.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", manifest)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return row
+
+    def latest(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The most recent project registered for a session, or None"""
+        row = self._connect().execute(
+            "SELECT * FROM projects WHERE session_id = ? ORDER BY created_at DESC LIMIT 1",
+            (session_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def project_ids(self, session_id: str) -> List[str]:
+        """Ids of every project registered for a session"""
+        rows = self._connect().execute("SELECT id FROM projects WHERE session_id = ?", (session_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM projects WHERE id = ?", (project_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_file(self, project_id: str, path: str) -> Optional[Dict[str, Any]]:
+        """Manifest entry for one file of a project, or None if it is not part of it"""
+        row = self._connect().execute(
+            "SELECT path, size, sha256 FROM files WHERE project_id = ? AND path = ?",
+            (project_id, path)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def files(self, project_id: str) -> List[Dict[str, Any]]:
+        """The full manifest of a project, ordered by path"""
+        rows = self._connect().execute(
+            "SELECT path, size, sha256 FROM files WHERE project_id = ? ORDER BY path",
+            (project_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        projects, sessions, total_size = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT session_id), COALESCE(SUM(total_size), 0) FROM projects"
+        ).fetchone()
+        return {
+            "path": self.path,
+            "projects": projects,
+            "sessions": sessions,
+            "files": conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "total_size": total_size
+        }
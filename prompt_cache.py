@@ -0,0 +1,92 @@
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Explicit cache breakpoints; OpenAI-style providers cache prefixes automatically
+CACHE_CONTROL = {"type": "ephemeral"}
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+
+# Anthropic accepts at most this many breakpoints per request
+MAX_BREAKPOINTS = 4
+
+
+def supports_cache_control(model: str) -> bool:
+    return model.startswith(CACHE_CONTROL_PREFIXES)
+
+
+def add_cache_hints(messages: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    """
+    Mark the stable prefix of a conversation as cacheable
+
+    Every message but the final user turn is stable, as is every content
+    part of the final turn but its last (see generate_code's prompt_prefix).
+    A cache_control breakpoint goes at the end of each stable segment,
+    keeping the last MAX_BREAKPOINTS. Messages are returned unchanged for
+    models that cache automatically or not at all.
+    """
+    if not supports_cache_control(model):
+        return messages
+
+    hinted = []
+    breakpoints = []
+    for i, message in enumerate(messages):
+        content = message["content"]
+        parts = [{"type": "text", "text": content}] if isinstance(content, str) else [dict(p) for p in content]
+        stable = len(parts) - 1 if i == len(messages) - 1 else len(parts)
+        if stable > 0:
+            breakpoints.append((i, stable - 1))
+        hinted.append(dict(message, content=parts))
+
+    for i, j in breakpoints[-MAX_BREAKPOINTS:]:
+        hinted[i]["content"][j]["cache_control"] = CACHE_CONTROL
+    return hinted
+
+
+class PromptCacheStats:
+    """
+    Per-model prompt caching outcomes, from the usage block of each completion
+
+    Time to first token is tracked separately for requests that did and did
+    not hit the cache, so the latency benefit can be read off directly.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, float]] = defaultdict(lambda: {
+            "requests": 0, "cache_hits": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "cost": 0.0, "ttft_hit_total": 0.0, "ttft_hit_count": 0,
+            "ttft_miss_total": 0.0, "ttft_miss_count": 0
+        })
+
+    def record(self, model: str, usage: Optional[Dict[str, Any]], ttft: Optional[float]) -> None:
+        if not usage:
+            return
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        with self._lock:
+            stats = self._models[model]
+            stats["requests"] += 1
+            stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            stats["cached_tokens"] += cached
+            stats["cost"] += usage.get("cost") or 0.0
+            outcome = "hit" if cached else "miss"
+            if cached:
+                stats["cache_hits"] += 1
+            if ttft is not None:
+                stats[f"ttft_{outcome}_total"] += ttft
+                stats[f"ttft_{outcome}_count"] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for model, s in self._models.items():
+                result[model] = {
+                    "requests": s["requests"],
+                    "cache_hits": s["cache_hits"],
+                    "prompt_tokens": s["prompt_tokens"],
+                    "cached_tokens": s["cached_tokens"],
+                    "cached_ratio": round(s["cached_tokens"] / s["prompt_tokens"], 3) if s["prompt_tokens"] else 0.0,
+                    "cost": round(s["cost"], 6),
+                    "avg_ttft_hit_ms": round(s["ttft_hit_total"] / s["ttft_hit_count"] * 1000, 1) if s["ttft_hit_count"] else None,
+                    "avg_ttft_miss_ms": round(s["ttft_miss_total"] / s["ttft_miss_count"] * 1000, 1) if s["ttft_miss_count"] else None
+                }
+            return result
@@ -0,0 +1,283 @@
+"""
+Full-text search over generated projects
+
+Usage:
+    python search_index.py rebuild [output_dir] [--db path]
+    python search_index.py query "jwt refresh token" [--db path]
+"""
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from context_packer import TEXT_EXTENSIONS, SKIP_DIRS
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    project_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    UNIQUE (project_id, path)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    content,
+    tokenize = "unicode61 tokenchars '_'"
+);
+"""
+
+_TERM_RE = re.compile(r'\w+')
+
+
+def _match_expression(query: str) -> Tuple[str, List[str]]:
+    """Turn free text into an FTS5 query: every term required, the last one as a prefix"""
+    terms = [t.lower() for t in _TERM_RE.findall(query)]
+    if not terms:
+        return "", []
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += '*'
+    return " AND ".join(quoted), terms
+
+
+class SearchIndex:
+    """
+    Incremental inverted index (SQLite FTS5) over generated project files
+
+    Files are indexed as they are written (see index_files) and the whole
+    output folder can be re-synced from disk with rebuild(), which only
+    re-reads files whose size or mtime changed. WAL mode lets every worker
+    process share the database.
+    """
+
+    def __init__(self, path: Union[str, Path], max_file_size: int = 200_000, busy_timeout: float = 5.0):
+        self.path = str(path)
+        self.max_file_size = max_file_size
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _indexable(path: str) -> bool:
+        parts = path.split('/')
+        return (
+            os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS
+            and not any(part in SKIP_DIRS for part in parts[:-1])
+        )
+
+    def _upsert(self, conn: sqlite3.Connection, project_id: str, path: str,
+                content: str, mtime: float, size: int) -> None:
+        row = conn.execute(
+            "SELECT id FROM documents WHERE project_id = ? AND path = ?", (project_id, path)
+        ).fetchone()
+        if row:
+            doc_id = row[0]
+            conn.execute("UPDATE documents SET mtime = ?, size = ? WHERE id = ?", (mtime, size, doc_id))
+            conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+        else:
+            doc_id = conn.execute(
+                "INSERT INTO documents (project_id, path, mtime, size) VALUES (?, ?, ?, ?)",
+                (project_id, path, mtime, size)
+            ).lastrowid
+        conn.execute("INSERT INTO documents_fts (rowid, content) VALUES (?, ?)", (doc_id, content))
+
+    def index_files(self, project_id: str, project_dir: Union[str, Path], files: Dict[str, str]) -> int:
+        """
+        Index (or re-index) files of one project
+
+        Args:
+            project_id: Project the files belong to
+            project_dir: Directory the files were written to (for mtimes)
+            files: {relative path: content}
+
+        Returns:
+            Number of files indexed
+        """
+        project_dir = Path(project_dir)
+        conn = self._connect()
+        indexed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for path, content in files.items():
+                path = path.replace(os.sep, '/')
+                if not self._indexable(path) or len(content) > self.max_file_size:
+                    continue
+                try:
+                    stat = (project_dir / path).stat()
+                    mtime, size = stat.st_mtime, stat.st_size
+                except OSError:
+                    mtime, size = time.time(), len(content.encode('utf-8'))
+                self._upsert(conn, project_id, path, content, mtime, size)
+                indexed += 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return indexed
+
+    def remove_project(self, project_id: str) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "DELETE FROM documents_fts WHERE rowid IN (SELECT id FROM documents WHERE project_id = ?)",
+            (project_id,)
+        )
+        conn.execute("DELETE FROM documents WHERE project_id = ?", (project_id,))
+        conn.execute("COMMIT")
+
+    def rebuild(self, root: Union[str, Path]) -> Dict[str, int]:
+        """
+        Sync the index with the project directories under `root`
+
+        New and modified files are (re)indexed, unchanged ones are skipped by
+        size and mtime, and entries for deleted files or projects are dropped.
+
+        Returns:
+            Counts of indexed, unchanged and removed files
+        """
+        root = Path(root)
+        conn = self._connect()
+        known = {
+            (project_id, path): (doc_id, mtime, size)
+            for doc_id, project_id, path, mtime, size in conn.execute(
+                "SELECT id, project_id, path, mtime, size FROM documents"
+            )
+        }
+        seen = set()
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0}
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            projects = [p for p in root.iterdir() if p.is_dir()] if root.is_dir() else []
+            for project_dir in projects:
+                for dirpath, dirnames, filenames in os.walk(project_dir):
+                    dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
+                    for filename in filenames:
+                        filepath = Path(dirpath) / filename
+                        path = filepath.relative_to(project_dir).as_posix()
+                        if not self._indexable(path):
+                            continue
+                        stat = filepath.stat()
+                        if stat.st_size > self.max_file_size:
+                            continue
+                        key = (project_dir.name, path)
+                        seen.add(key)
+                        previous = known.get(key)
+                        if previous and previous[1] == stat.st_mtime and previous[2] == stat.st_size:
+                            counts["unchanged"] += 1
+                            continue
+                        try:
+                            content = filepath.read_text(encoding='utf-8')
+                        except UnicodeDecodeError:
+                            continue
+                        self._upsert(conn, project_dir.name, path, content, stat.st_mtime, stat.st_size)
+                        counts["indexed"] += 1
+
+            for key, (doc_id, _, _) in known.items():
+                if key not in seen:
+                    conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+                    conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+                    counts["removed"] += 1
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return counts
+
+    def search(self, query: str, limit: int = 20, lines_per_file: int = 3,
+               project_ids: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Find files matching every term of a free-text query, best first
+
+        Args:
+            query: Free text; the last term also matches as a prefix
+            limit: Maximum number of files to return
+            lines_per_file: Maximum matching lines to return per file
+            project_ids: Only search these projects (default: all of them)
+
+        Returns:
+            List of dicts with project_id, path, score and lines, where lines
+            are (line number, text) pairs containing a query term
+        """
+        expression, terms = _match_expression(query)
+        if not expression:
+            return []
+        sql = ("SELECT d.project_id, d.path, bm25(documents_fts) AS score, f.content "
+               "FROM documents_fts f JOIN documents d ON d.id = f.rowid "
+               "WHERE documents_fts MATCH ?")
+        params: List[Any] = [expression]
+        if project_ids is not None:
+            # One JSON parameter, however many projects there are
+            sql += " AND d.project_id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(list(project_ids)))
+        rows = self._connect().execute(sql + " ORDER BY score LIMIT ?", params + [limit]).fetchall()
+
+        term_re = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+        results = []
+        for project_id, path, score, content in rows:
+            lines = []
+            for number, line in enumerate(content.splitlines(), 1):
+                if term_re.search(line):
+                    lines.append({"line": number, "text": line.strip()[:200]})
+                    if len(lines) >= lines_per_file:
+                        break
+            results.append({
+                "project_id": project_id,
+                "path": path,
+                "score": round(-score, 3),
+                "lines": lines
+            })
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        files, projects = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT project_id) FROM documents"
+        ).fetchone()
+        return {"path": self.path, "projects": projects, "files": files}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Search generated projects")
+    parser.add_argument("--db", help="index database (default: <output_dir>/search.sqlite3)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="sync the index with the projects on disk")
+    rebuild.add_argument("output_dir", nargs="?", default="generated_projects")
+    query = sub.add_parser("query", help="run a search")
+    query.add_argument("text")
+    query.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    db = args.db or os.path.join(getattr(args, "output_dir", "generated_projects"), "search.sqlite3")
+    index = SearchIndex(db)
+    if args.command == "rebuild":
+        start = time.perf_counter()
+        counts = index.rebuild(args.output_dir)
+        print(f"indexed {counts['indexed']}, unchanged {counts['unchanged']}, "
+              f"removed {counts['removed']} in {time.perf_counter() - start:.2f}s")
+    else:
+        for result in index.search(args.text, limit=args.limit):
+            print(f"{result['project_id']}/{result['path']}  ({result['score']})")
+            for line in result["lines"]:
+                print(f"    {line['line']}: {line['text']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """A single in-flight call and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is still running block until it finishes and receive
+    the same result (or exception). Nothing is cached once the call returns.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._executed = 0
+        self._coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn, or wait for an identical in-flight call to finish
+
+        Args:
+            key: Identifies calls that are interchangeable
+            fn: Zero-argument callable doing the actual work
+
+        Returns:
+            The result of fn (shared with any coalesced callers)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for executed, coalesced and currently in-flight calls"""
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "coalesced": self._coalesced,
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values())
+            }
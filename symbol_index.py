@@ -0,0 +1,181 @@
+import re
+import ast
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Decorator attributes that register a view (Flask, FastAPI, Blueprint, APIRouter)
+ROUTE_DECORATORS = {"route", "get", "post", "put", "patch", "delete"}
+
+# A top-level statement that can be parsed on its own starts a new block
+_BLOCK_START_RE = re.compile(r'@|(?:async\s+)?def\s|class\s')
+
+
+@dataclass(frozen=True)
+class Symbol:
+    qualname: str
+    name: str
+    kind: str  # "class", "function", "method" or "route"
+    line: int
+    col: int  # in characters, not bytes as in ast
+    end_line: int
+    detail: str = ""  # e.g. "GET /users" for routes
+
+
+def _route(node: ast.AST) -> str:
+    """"METHODS /path" if the function is registered as a route, else ''"""
+    for decorator in node.decorator_list:
+        if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)):
+            continue
+        attr = decorator.func.attr
+        if attr not in ROUTE_DECORATORS or not decorator.args:
+            continue
+        path = decorator.args[0]
+        if not (isinstance(path, ast.Constant) and isinstance(path.value, str)):
+            continue
+        methods = [attr.upper()] if attr != "route" else []
+        for keyword in decorator.keywords:
+            if keyword.arg == "methods" and isinstance(keyword.value, (ast.List, ast.Tuple)):
+                methods = [
+                    m.value.upper() for m in keyword.value.elts
+                    if isinstance(m, ast.Constant) and isinstance(m.value, str)
+                ]
+        return f"{','.join(methods) or 'GET'} {path.value}"
+    return ""
+
+
+def _collect(body: List[ast.stmt], lines: List[str], prefix: str, in_class: bool, symbols: List[Symbol]) -> None:
+    for node in body:
+        if isinstance(node, ast.ClassDef):
+            kind, detail = "class", ""
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            detail = _route(node)
+            kind = "route" if detail else ("method" if in_class else "function")
+        else:
+            continue
+        line = lines[node.lineno - 1] if node.lineno <= len(lines) else ""
+        col = node.col_offset
+        if not line.isascii():
+            col = len(line.encode('utf-8')[:col].decode('utf-8', 'ignore'))
+        qualname = prefix + node.name
+        symbols.append(Symbol(qualname, node.name, kind, node.lineno, col, node.end_lineno or node.lineno, detail))
+        _collect(node.body, lines, qualname + ".", isinstance(node, ast.ClassDef), symbols)
+
+
+def extract_symbols(source: str) -> List[Symbol]:
+    """
+    Classes, functions, methods and routes defined in Python source, in order
+
+    Raises:
+        SyntaxError: If the source does not parse
+    """
+    symbols: List[Symbol] = []
+    _collect(ast.parse(source).body, source.split("\n"), "", False, symbols)
+    return symbols
+
+
+def _split_blocks(lines: List[str]) -> List[int]:
+    """Start offsets of top-level def/class blocks (decorators stay with their def)"""
+    starts = [0]
+    for i in range(1, len(lines)):
+        if _BLOCK_START_RE.match(lines[i]) and not lines[i - 1].startswith('@'):
+            starts.append(i)
+    return starts
+
+
+class SymbolIndex:
+    """
+    Incremental symbol extraction for one buffer
+
+    The source is cut into top-level def/class blocks and each block is
+    parsed on its own, with results cached by block text. After an edit,
+    only the blocks whose text changed are parsed again; blocks that merely
+    moved are reused with their line numbers shifted. If any block fails to
+    parse on its own (e.g. a block boundary fell inside a multi-line
+    string), the whole source is parsed instead.
+    """
+
+    def __init__(self, cache_size: int = 5000):
+        self.cache_size = cache_size
+        self._cache: Dict[str, Optional[List[Symbol]]] = {}
+        self.blocks_parsed = 0
+        self.blocks_reused = 0
+
+    def update(self, source: str) -> List[Symbol]:
+        """
+        Symbols of the current source
+
+        Raises:
+            SyntaxError: If the source does not parse
+        """
+        lines = source.split("\n")
+        starts = _split_blocks(lines)
+        symbols: List[Symbol] = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(lines)
+            block = "\n".join(lines[start:end])
+            if block in self._cache:
+                self.blocks_reused += 1
+                parsed = self._cache[block]
+            else:
+                self.blocks_parsed += 1
+                try:
+                    parsed = extract_symbols(block)
+                except SyntaxError:
+                    parsed = None
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[block] = parsed
+            if parsed is None:
+                return extract_symbols(source)
+            symbols.extend(
+                Symbol(s.qualname, s.name, s.kind, s.line + start, s.col, s.end_line + start, s.detail)
+                for s in parsed
+            )
+        return symbols
+
+
+class BackgroundSymbolIndexer:
+    """
+    Runs a SymbolIndex on a worker thread
+
+    submit() never blocks: it replaces any source still waiting to be
+    parsed, so a burst of edits costs one parse of the latest text.
+    on_result(version, symbols, error) is called on the worker thread;
+    symbols is None when the source did not parse.
+    """
+
+    def __init__(self, on_result: Callable[[int, Optional[List[Symbol]], Optional[str]], None],
+                 index: Optional[SymbolIndex] = None):
+        self.on_result = on_result
+        self.index = index or SymbolIndex()
+        self._cond = threading.Condition()
+        self._pending: Optional[Tuple[int, str]] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="symbol-indexer", daemon=True)
+        self._thread.start()
+
+    def submit(self, version: int, source: str) -> None:
+        with self._cond:
+            self._pending = (version, source)
+            self._cond.notify()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                version, source = self._pending
+                self._pending = None
+            try:
+                self.on_result(version, self.index.update(source), None)
+            except SyntaxError as e:
+                self.on_result(version, None, f"line {e.lineno}: {e.msg}")
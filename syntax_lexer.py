@@ -0,0 +1,141 @@
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+KEYWORDS = (
+    "and", "as", "assert", "async", "await", "break", "class", "continue", "def", "del",
+    "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in",
+    "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while",
+    "with", "yield", "True", "False", "None"
+)
+
+TOKEN_TAGS = ("keyword", "string", "number", "comment", "function", "class", "operator")
+
+# One combined pattern; alternatives are tried left to right at each position,
+# so a keyword inside a string or comment is never reported.
+_TOKEN_RE = re.compile(r"""
+    (?P<comment>\#.*)
+  | (?P<triple>(?:\b[rRbBuUfF]{1,2})?(?:\"\"\"|'''))
+  | (?P<string>(?:\b[rRbBuUfF]{1,2})?(?:"(?:[^"\\]|\\.)*(?:"|\\?$)|'(?:[^'\\]|\\.)*(?:'|\\?$)))
+  | \b(?P<defkw>def|class)\s+(?P<name>\w+)
+  | \b(?P<keyword>""" + "|".join(KEYWORDS) + r""")\b
+  | (?P<number>\b(?:0[xXoObB][0-9a-fA-F_]+|\d[\d_]*(?:\.\d*)?(?:[eE][-+]?\d+)?j?)\b)
+  | (?P<operator>\*\*=?|//=?|>>=|<<=|->|[-+*/%&|^=<>!]=?)
+  | (?P<identifier>[^\W\d]\w*)
+""", re.VERBOSE)
+
+Token = Tuple[str, int, int]
+
+
+def _find_close(line: str, delimiter: str, pos: int) -> int:
+    """End offset of the first unescaped `delimiter` at or after pos, or -1"""
+    i = line.find(delimiter, pos)
+    while i >= 0:
+        backslashes = 0
+        while i - backslashes > 0 and line[i - backslashes - 1] == '\\':
+            backslashes += 1
+        if backslashes % 2 == 0:
+            return i + len(delimiter)
+        i = line.find(delimiter, i + 1)
+    return -1
+
+
+class PythonLexer:
+    """
+    Single-pass, line-oriented Python tokenizer for syntax highlighting
+
+    Each line is lexed given the state left by the previous line (None, or
+    the delimiter of an open triple-quoted string) and returns its tokens as
+    (tag, start column, end column) plus the state at its end. Results are
+    cached by (state, line text), so lines that did not change are never
+    re-scanned, even after they move. No Tk dependency.
+    """
+
+    def __init__(self, cache_size: int = 50_000):
+        self.cache_size = cache_size
+        self._cache: Dict[Tuple[Optional[str], str], Tuple[List[Token], Optional[str]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def lex_line(self, line: str, state: Optional[str] = None) -> Tuple[List[Token], Optional[str]]:
+        """
+        Tokenize one line
+
+        Args:
+            line: Line text without its newline
+            state: State at the end of the previous line
+
+        Returns:
+            (tokens, state at the end of this line)
+        """
+        key = (state, line)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+
+        tokens: List[Token] = []
+        pos = 0
+        if state:
+            end = _find_close(line, state, 0)
+            if end < 0:
+                tokens.append(("string", 0, len(line)))
+                return self._store(key, tokens, state)
+            tokens.append(("string", 0, end))
+            pos = end
+            state = None
+
+        search = _TOKEN_RE.search
+        while True:
+            m = search(line, pos)
+            if m is None:
+                break
+            kind = m.lastgroup
+            pos = m.end()
+            if kind == "identifier":
+                continue
+            if kind == "triple":
+                delimiter = m.group()[-3:]
+                end = _find_close(line, delimiter, pos)
+                if end < 0:
+                    tokens.append(("string", m.start(), len(line)))
+                    state = delimiter
+                    break
+                tokens.append(("string", m.start(), end))
+                pos = end
+            elif kind == "name":
+                tokens.append(("keyword", m.start("defkw"), m.end("defkw")))
+                tokens.append(("class" if m.group("defkw") == "class" else "function", m.start("name"), pos))
+            else:
+                tokens.append((kind, m.start(), pos))
+        return self._store(key, tokens, state)
+
+    def _store(self, key, tokens: List[Token], state: Optional[str]) -> Tuple[List[Token], Optional[str]]:
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        result = (tokens, state)
+        self._cache[key] = result
+        return result
+
+    def tokenize(self, text: str, state: Optional[str] = None) -> Iterable[Tuple[int, List[Token], Optional[str]]]:
+        """Yield (line number from 1, tokens, end state) for every line of text"""
+        for number, line in enumerate(text.split("\n"), 1):
+            tokens, state = self.lex_line(line, state)
+            yield number, tokens, state
+
+    def tag_ranges(self, text: str, first_line: int = 1, state: Optional[str] = None) -> Dict[str, List[str]]:
+        """
+        Tk index ranges per tag, flattened for one `tag_add(tag, *ranges)` call each
+
+        Args:
+            text: Text starting at the beginning of line `first_line`
+            first_line: Line number of the first line of text
+            state: State at the end of the line before it
+        """
+        ranges: Dict[str, List[str]] = defaultdict(list)
+        for number, tokens, state in self.tokenize(text, state):
+            line = first_line + number - 1
+            for tag, start, end in tokens:
+                ranges[tag].extend((f"{line}.{start}", f"{line}.{end}"))
+        return ranges
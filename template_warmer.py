@@ -0,0 +1,149 @@
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from generate_files import FileGenerator
+
+
+class TemplateWarmer:
+    """
+    Pre-generate fixed template prompts in the background
+
+    Every template x model pair is generated ahead of time and kept in memory
+    as a {filename: content} dict, so a user picking a template can be served
+    without waiting on the API. Entries are refreshed once they are older than
+    refresh_interval, spending at most `budget` generations per interval.
+    """
+
+    def __init__(
+        self,
+        templates: List[Dict[str, str]],
+        models: List[str],
+        client_factory: Callable[[], Any],
+        budget: int = 8,
+        refresh_interval: float = 6 * 3600,
+        **generation_kwargs
+    ):
+        """
+        Args:
+            templates: Template dicts with at least "id" and "prompt"
+            models: Model ids to warm each template for
+            client_factory: Returns the client used for background generations
+            budget: Maximum number of generations per refresh_interval
+            refresh_interval: Seconds before a warm entry is regenerated
+            **generation_kwargs: Additional arguments for generate_code
+        """
+        self.templates = templates
+        self.models = models
+        self.client_factory = client_factory
+        self.budget = budget
+        self.refresh_interval = refresh_interval
+        self.generation_kwargs = generation_kwargs
+
+        self._lock = threading.Lock()
+        self._pool: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spent = deque()
+        self._hits = 0
+        self._misses = 0
+        self._failures = 0
+
+    def get(self, template_id: str, model: str) -> Optional[Dict[str, str]]:
+        """Return the warm files for a template/model pair, or None if not warm yet"""
+        with self._lock:
+            entry = self._pool.get((template_id, model))
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry["files"]
+
+    def warm_once(self) -> int:
+        """
+        Generate missing or stale entries within the remaining budget
+
+        Returns:
+            int: Number of entries generated
+        """
+        now = time.time()
+        while self._spent and now - self._spent[0] >= self.refresh_interval:
+            self._spent.popleft()
+        remaining = self.budget - len(self._spent)
+        if remaining <= 0:
+            return 0
+
+        with self._lock:
+            ages = {key: now - entry["created_at"] for key, entry in self._pool.items()}
+
+        # Missing entries first, then the stalest ones
+        pending = [
+            (template, model)
+            for template in self.templates
+            for model in self.models
+            if ages.get((template["id"], model), float("inf")) >= self.refresh_interval
+        ]
+        pending.sort(key=lambda pair: -ages.get((pair[0]["id"], pair[1]), float("inf")))
+
+        generated = 0
+        client = None
+        for template, model in pending[:remaining]:
+            if self._stop.is_set():
+                break
+            self._spent.append(time.time())
+            try:
+                if client is None:
+                    client = self.client_factory()
+                response = client.generate_code(
+                    prompt=template["prompt"],
+                    model=model,
+                    system_prompt=FileGenerator.SYSTEM_PROMPT,
+                    **self.generation_kwargs
+                )
+                files = FileGenerator.extract_code_blocks(response)
+            except Exception as e:
+                self._failures += 1
+                print(f"Warning: Failed to pre-warm {template['id']} on {model}: {e}")
+                continue
+
+            if files:
+                with self._lock:
+                    self._pool[(template["id"], model)] = {
+                        "files": files,
+                        "created_at": time.time()
+                    }
+                generated += 1
+        return generated
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.warm_once()
+            # Wake up often enough to retry failures and top up after budget cuts
+            self._stop.wait(min(self.refresh_interval, 300))
+
+    def start(self) -> None:
+        """Start the background refresh thread"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="template-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background refresh thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool size and hit/miss counters"""
+        now = time.time()
+        with self._lock:
+            return {
+                "warm": len(self._pool),
+                "capacity": len(self.templates) * len(self.models),
+                "hits": self._hits,
+                "misses": self._misses,
+                "failures": self._failures,
+                "oldest_age": max((now - e["created_at"] for e in self._pool.values()), default=None)
+            }
@@ -0,0 +1,44 @@
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from openrouter_client import CancelToken, GenerationCancelled, OpenRouterClient
+from test_openrouter_client import FakeResponse
+
+
+def half_open_breaker(model: str) -> CircuitBreaker:
+    breaker = OpenRouterClient._breakers.get(model)
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+
+def ok_transport(url, headers, json, **kwargs):
+    return FakeResponse("ok")
+
+
+def test_cancelled_probe_releases_its_slot():
+    breaker = half_open_breaker("test/probe-cancel")
+    client = OpenRouterClient("key", transport=ok_transport)
+    cancel = CancelToken()
+    cancel.cancel()
+    with pytest.raises(GenerationCancelled):
+        client.generate_code("prompt", model="test/probe-cancel", cancel=cancel)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    # The next request is let through as the probe and closes the circuit
+    assert client.generate_code("prompt", model="test/probe-cancel", max_continuations=0) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.rejected == 0
+
+
+def test_probe_failing_locally_releases_its_slot():
+    breaker = half_open_breaker("test/probe-local")
+
+    def broken_transport(url, headers, json, **kwargs):
+        raise RuntimeError("bug in the transport")
+
+    with pytest.raises(RuntimeError):
+        OpenRouterClient("key", transport=broken_transport).generate_code("prompt", model="test/probe-local")
+    assert breaker.allow_request()
@@ -0,0 +1,9 @@
+from file_validator import validate_source
+
+
+def test_optional_end_tags_are_not_errors():
+    assert validate_source("index.html", "<!DOCTYPE html><html><head><title>x</title><body><p>hi") is None
+
+
+def test_unclosed_element_is_reported():
+    assert "<div>" in validate_source("index.html", "<html><body><div></body></html>")
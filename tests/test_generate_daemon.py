@@ -0,0 +1,78 @@
+import socket
+import threading
+
+import pytest
+
+import generate_daemon
+
+
+@pytest.fixture
+def in_process_jobs(monkeypatch):
+    jobs = []
+
+    def run_job(job, client=None):
+        jobs.append(job)
+        return {"success": True, "error": None, "files": [], "metadata": {}}
+
+    monkeypatch.setattr(generate_daemon, "run_job", run_job)
+    return jobs
+
+
+def test_runs_in_process_without_a_daemon(tmp_path, in_process_jobs):
+    result = generate_daemon.generate("prompt", str(tmp_path), socket_path=str(tmp_path / "none.sock"))
+    assert result["via"] == "in-process"
+    assert len(in_process_jobs) == 1
+
+
+def test_mid_job_disconnect_is_not_retried_in_process(tmp_path, in_process_jobs):
+    path = str(tmp_path / "daemon.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    received = []
+
+    def accept_and_drop():
+        conn, _ = server.accept()
+        with conn, conn.makefile("rb") as lines:
+            received.append(lines.readline())  # took the job, then died
+
+    thread = threading.Thread(target=accept_and_drop)
+    thread.start()
+    try:
+        with pytest.raises(ConnectionError):
+            generate_daemon.generate("prompt", str(tmp_path), socket_path=path)
+    finally:
+        thread.join(5)
+        server.close()
+    assert received and in_process_jobs == []
+
+
+def test_socket_owned_by_another_user_is_not_sent_the_job(tmp_path, monkeypatch, in_process_jobs):
+    path = str(tmp_path / "daemon.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    server.settimeout(0.1)
+    owner = generate_daemon.os.getuid()
+    monkeypatch.setattr(generate_daemon.os, "getuid", lambda: owner + 1)
+    try:
+        result = generate_daemon.generate("prompt", str(tmp_path), socket_path=path)
+        with pytest.raises(socket.timeout):
+            server.accept()
+    finally:
+        server.close()
+    assert result["via"] == "in-process"
+    assert len(in_process_jobs) == 1
+
+
+def test_permission_denied_on_connect_runs_in_process(tmp_path, monkeypatch, in_process_jobs):
+    path = str(tmp_path / "daemon.sock")
+    open(path, "w").close()
+
+    def connect(self, address):
+        raise PermissionError(13, "Permission denied", address)
+
+    monkeypatch.setattr(generate_daemon.socket.socket, "connect", connect)
+    result = generate_daemon.generate("prompt", str(tmp_path), socket_path=path)
+    assert result["via"] == "in-process"
+    assert len(in_process_jobs) == 1
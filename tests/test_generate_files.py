@@ -0,0 +1,17 @@
+import pytest
+
+from generate_files import FileGenerator
+
+
+def test_file_plan_drops_paths_outside_the_project():
+    plan = FileGenerator.parse_file_plan(
+        '[{"path": "../../x.py"}, {"path": "src/../../y.py"}, {"path": "/app/./main.py"}]'
+    )
+    assert [entry["path"] for entry in plan] == ["app/main.py"]
+
+
+def test_write_files_rejects_traversal(tmp_path):
+    with pytest.raises(ValueError):
+        FileGenerator.write_files({"ok.py": "", "../escape.py": "x"}, tmp_path / "out")
+    assert not (tmp_path / "escape.py").exists()
+    assert not (tmp_path / "out" / "ok.py").exists()
@@ -0,0 +1,121 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+
+from openrouter_client import OpenRouterClient, OpenRouterError
+
+BAD_KEY = "bad-key"
+
+
+class FakeResponse:
+    """Streamed completion, or an HTTP error if status_code is not 200"""
+
+    encoding = "utf-8"
+    closed = False
+
+    def __init__(self, content: str, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+
+    def raise_for_status(self) -> None:
+        if self.status_code != 200:
+            raise requests.HTTPError(f"{self.status_code} Client Error", response=self)
+
+    def iter_lines(self, decode_unicode: bool = False):
+        yield "data: " + json.dumps({"choices": [{"delta": {"content": self.content}, "finish_reason": "stop"}]})
+        yield "data: [DONE]"
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class GatedTransport:
+    """Holds every request until release(); BAD_KEY is answered with a 401"""
+
+    def __init__(self):
+        self.keys = []
+        self.gate = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, url, headers, json, **kwargs):
+        key = headers["Authorization"].split()[-1]
+        with self._lock:
+            self.keys.append(key)
+        self.gate.wait(5)
+        if key == BAD_KEY:
+            return FakeResponse("", 401)
+        return FakeResponse(f"billed to {key}")
+
+    def wait_for_calls(self, n: int, timeout: float = 1.0) -> None:
+        deadline = time.monotonic() + timeout
+        while len(self.keys) < n and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def run_concurrently(transport, leader_key, follower_key, model):
+    """Start the leader, then an identical request from the follower while it is in flight"""
+    results = {}
+
+    def call(name, key):
+        client = OpenRouterClient(key, transport=transport)
+        try:
+            results[name] = client.generate_code("same prompt", model=model, max_continuations=0)
+        except OpenRouterError as e:
+            results[name] = e
+
+    leader = threading.Thread(target=call, args=("leader", leader_key))
+    leader.start()
+    transport.wait_for_calls(1)
+    follower = threading.Thread(target=call, args=("follower", follower_key))
+    follower.start()
+    if leader_key == follower_key:
+        deadline = time.monotonic() + 1.0
+        while OpenRouterClient.coalescing_stats()["waiting"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    else:
+        transport.wait_for_calls(2)
+    transport.gate.set()
+    leader.join(5)
+    follower.join(5)
+    return results
+
+
+def test_same_key_is_coalesced():
+    transport = GatedTransport()
+    results = run_concurrently(transport, "key-a", "key-a", "test/coalesce-same")
+    assert transport.keys == ["key-a"]
+    assert results == {"leader": "billed to key-a", "follower": "billed to key-a"}
+
+
+def test_follower_does_not_inherit_leader_auth_error():
+    transport = GatedTransport()
+    results = run_concurrently(transport, BAD_KEY, "key-b", "test/coalesce-auth")
+    assert sorted(transport.keys) == sorted([BAD_KEY, "key-b"])
+    assert isinstance(results["leader"], OpenRouterError)
+    assert results["leader"].status_code == 401
+    assert results["follower"] == "billed to key-b"
+
+
+def test_invalid_key_is_not_served_another_keys_result():
+    transport = GatedTransport()
+    results = run_concurrently(transport, "key-a", BAD_KEY, "test/coalesce-billing")
+    assert results["leader"] == "billed to key-a"
+    assert isinstance(results["follower"], OpenRouterError)
+    assert results["follower"].status_code == 401
+
+
+def test_streamed_response_is_closed():
+    responses = []
+
+    def transport(url, headers, json, **kwargs):
+        responses.append(FakeResponse("ok", 401 if len(responses) else 200))
+        return responses[-1]
+
+    client = OpenRouterClient("key-c", coalesce=False, transport=transport)
+    assert client.generate_code("prompt", model="test/close", max_continuations=0) == "ok"
+    with pytest.raises(OpenRouterError):
+        client.generate_code("prompt", model="test/close", max_continuations=0)
+    assert [r.closed for r in responses] == [True, True]
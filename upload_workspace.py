@@ -0,0 +1,298 @@
+import os
+import re
+import uuid
+import shutil
+import zipfile
+import posixpath
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+CHUNK_SIZE = 64 * 1024
+
+# Defaults; the Flask app overrides them from its configuration
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+MAX_ZIP_ENTRIES = 2000
+MAX_UNCOMPRESSED_SIZE = 200 * 1024 * 1024
+MAX_COMPRESSION_RATIO = 100
+
+PROJECT_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Raised when an upload is rejected; carries the HTTP status to answer with"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class CappedFile:
+    """
+    Write-only file wrapper that refuses to grow past a size limit
+
+    Used as the target for streamed uploads so an oversized body is rejected
+    as soon as the limit is crossed instead of after it has been written out.
+    """
+
+    def __init__(self, path: Union[str, Path], max_size: int):
+        self.name = str(path)
+        self.max_size = max_size
+        self.size = 0
+        self._file = open(path, 'wb')
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise UploadError(f"Upload exceeds the size limit ({self.max_size} bytes)", 413)
+        return self._file.write(data)
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def discard(self) -> None:
+        """Close and delete the partially written file"""
+        self._file.close()
+        try:
+            os.remove(self.name)
+        except OSError:
+            pass
+
+
+def stream_to_disk(
+    stream: BinaryIO,
+    path: Union[str, Path],
+    max_size: int = MAX_UPLOAD_SIZE,
+    chunk_size: int = CHUNK_SIZE
+) -> int:
+    """
+    Copy a stream to disk in fixed-size chunks, enforcing a size limit
+
+    Args:
+        stream: Readable binary stream (e.g. the WSGI input)
+        path: Destination file
+        max_size: Maximum number of bytes accepted
+        chunk_size: Bytes read per iteration
+
+    Returns:
+        int: Number of bytes written
+    """
+    target = CappedFile(path, max_size)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            target.write(chunk)
+    except BaseException:
+        target.discard()
+        raise
+    target.close()
+    return target.size
+
+
+class ZipWorkspace:
+    """
+    A per-project workspace backed by an uploaded zip
+
+    Only the central directory is read up front; entry contents are read or
+    extracted on demand, so memory use does not depend on the archive size.
+
+    Layout:
+        <root>/<project_id>/upload.zip   the archive as uploaded
+        <root>/<project_id>/files/...    entries extracted on demand
+    """
+
+    def __init__(self, root: Union[str, Path], project_id: str):
+        if not PROJECT_ID_RE.match(project_id):
+            raise UploadError("Invalid project id", 404)
+        self.project_id = project_id
+        self.path = Path(root) / project_id
+        self.archive_path = self.path / 'upload.zip'
+        self.files_path = self.path / 'files'
+        if not self.archive_path.exists():
+            raise UploadError("Project not found", 404)
+        self._entries: Optional[Dict[str, zipfile.ZipInfo]] = None
+
+    @classmethod
+    def create(
+        cls,
+        root: Union[str, Path],
+        source: Union[BinaryIO, str, Path],
+        max_size: int = MAX_UPLOAD_SIZE,
+        max_entries: int = MAX_ZIP_ENTRIES,
+        max_uncompressed_size: int = MAX_UNCOMPRESSED_SIZE,
+        max_ratio: int = MAX_COMPRESSION_RATIO
+    ) -> 'ZipWorkspace':
+        """
+        Create a workspace from an upload
+
+        Args:
+            root: Directory holding all workspaces
+            source: Stream to copy in chunks, or a file already on disk to move in
+            max_size: Maximum archive size in bytes
+            max_entries: Maximum number of entries in the archive
+            max_uncompressed_size: Maximum total uncompressed size in bytes
+            max_ratio: Maximum compression ratio of any single entry
+
+        Returns:
+            ZipWorkspace for the new project
+        """
+        project_id = uuid.uuid4().hex
+        workspace_dir = Path(root) / project_id
+        workspace_dir.mkdir(parents=True)
+        archive_path = workspace_dir / 'upload.zip'
+
+        try:
+            if isinstance(source, (str, Path)):
+                if os.path.getsize(source) > max_size:
+                    raise UploadError(f"Upload exceeds the size limit ({max_size} bytes)", 413)
+                shutil.move(str(source), archive_path)
+            else:
+                stream_to_disk(source, archive_path, max_size=max_size)
+
+            cls.validate_archive(archive_path, max_entries, max_uncompressed_size, max_ratio)
+        except BaseException:
+            shutil.rmtree(workspace_dir, ignore_errors=True)
+            raise
+
+        return cls(root, project_id)
+
+    @staticmethod
+    def validate_archive(
+        archive_path: Union[str, Path],
+        max_entries: int = MAX_ZIP_ENTRIES,
+        max_uncompressed_size: int = MAX_UNCOMPRESSED_SIZE,
+        max_ratio: int = MAX_COMPRESSION_RATIO
+    ) -> None:
+        """
+        Reject zip bombs and unsafe paths using only the central directory
+
+        Raises:
+            UploadError: If the archive is invalid or exceeds a limit
+        """
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                infos = archive.infolist()
+        except zipfile.BadZipFile:
+            raise UploadError("Upload is not a valid zip file")
+
+        if len(infos) > max_entries:
+            raise UploadError(f"Archive has more than {max_entries} entries", 413)
+
+        total = 0
+        for info in infos:
+            name = info.filename
+            if name.startswith('/') or '\\' in name or '..' in name.split('/'):
+                raise UploadError(f"Unsafe path in archive: {name}")
+            if info.compress_size and info.file_size / info.compress_size > max_ratio:
+                raise UploadError(f"Suspicious compression ratio for {name}", 413)
+            total += info.file_size
+            if total > max_uncompressed_size:
+                raise UploadError("Archive expands beyond the allowed size", 413)
+
+    @property
+    def entries(self) -> Dict[str, zipfile.ZipInfo]:
+        """Index of file entries by normalized path (directories excluded)"""
+        if self._entries is None:
+            with zipfile.ZipFile(self.archive_path) as archive:
+                infos = [info for info in archive.infolist() if not info.is_dir()]
+            # Strip a single top-level folder, as most zipped projects have one
+            names = [info.filename for info in infos]
+            prefix = ''
+            if names and all('/' in n for n in names):
+                first = names[0].split('/', 1)[0] + '/'
+                if all(n.startswith(first) for n in names):
+                    prefix = first
+            self._entries = {
+                posixpath.normpath(info.filename[len(prefix):]): info
+                for info in infos
+            }
+        return self._entries
+
+    def list_files(self) -> List[Tuple[str, int]]:
+        """Return (path, size) for every file in the project"""
+        return [(path, info.file_size) for path, info in sorted(self.entries.items())]
+
+    def open(self, path: str) -> BinaryIO:
+        """Open an entry for streaming reads (caller closes it)"""
+        info = self.entries.get(path)
+        if info is None:
+            raise KeyError(path)
+        # The entry handle holds its own reference to the underlying file, so
+        # closing the archive here leaves it readable until the handle closes
+        with zipfile.ZipFile(self.archive_path) as archive:
+            return archive.open(info)
+
+    def read_text(self, path: str, max_size: Optional[int] = None) -> Optional[str]:
+        """
+        Read an entry as UTF-8 text
+
+        Returns:
+            The decoded text, or None if the entry is binary or larger than max_size
+        """
+        info = self.entries.get(path)
+        if info is None:
+            raise KeyError(path)
+        if max_size is not None and info.file_size > max_size:
+            return None
+        with self.open(path) as handle:
+            data = handle.read()
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return None
+
+    def iter_text_files(
+        self,
+        extensions: Optional[set] = None,
+        max_size: int = 200_000
+    ) -> Iterator[Tuple[str, str]]:
+        """Yield (path, text) for text entries, one at a time"""
+        for path, info in sorted(self.entries.items()):
+            if extensions is not None and posixpath.splitext(path)[1].lower() not in extensions:
+                continue
+            text = self.read_text(path, max_size=max_size)
+            if text is not None:
+                yield path, text
+
+    def extract(self, path: str) -> Path:
+        """Extract a single entry into the workspace (once) and return its path"""
+        target = self.files_path / path
+        if target.exists():
+            return target
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with self.open(path) as source, open(target, 'wb') as out:
+            shutil.copyfileobj(source, out, CHUNK_SIZE)
+        return target
+
+    def copy_to(self, dest: Union[str, Path], skip: Iterable[str] = ()) -> List[Path]:
+        """
+        Write the project's files under dest, streaming each entry
+
+        Args:
+            dest: Directory to write to
+            skip: Entry paths to leave out (e.g. files already written there)
+
+        Returns:
+            Paths of the files written
+        """
+        skip = set(skip)
+        written = []
+        for path in sorted(self.entries):
+            if path in skip:
+                continue
+            target = Path(dest) / path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with self.open(path) as source, open(target, 'wb') as out:
+                shutil.copyfileobj(source, out, CHUNK_SIZE)
+            written.append(target)
+        return written